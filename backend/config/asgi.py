@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# В ASGI-режиме горячие GET-эндпоинты обслуживаются асинхронно.
+os.environ.setdefault("DJANGO_ROOT_URLCONF", "config.urls_asgi")
+# Под ASGI соединения привязаны к потокам запросов и не переиспользуются;
+# для пула соединений используйте pgbouncer (DB_POOL_MODE=pgbouncer).
+os.environ.setdefault("DB_CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
@@ -0,0 +1,106 @@
+import copy
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.http import Http404, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+# Несколько GET-запросов к API за один HTTP-запрос. Подзапросы
+# разрешаются через config.urls и вызывают те же вьюсеты напрямую, в том
+# же потоке и с тем же соединением с БД; пользователь определяется один
+# раз для всего пакета и передаётся вьюсетам через _force_auth_user.
+
+API_PREFIX = "/api/"
+
+
+def _max_requests():
+    return getattr(settings, "BATCH_MAX_REQUESTS", 20)
+
+
+def _sub_request(request, path, query):
+    parent = request._request
+    sub = copy.copy(parent)
+    sub.method = "GET"
+    sub.path = sub.path_info = path
+    sub.GET = QueryDict(query)
+    sub.META = {
+        key: value
+        for key, value in parent.META.items()
+        if key not in ("CONTENT_LENGTH", "CONTENT_TYPE")
+    }
+    sub.META.update(
+        REQUEST_METHOD="GET", PATH_INFO=path, QUERY_STRING=query
+    )
+    for attr in ("_post", "_files", "resolver_match"):
+        sub.__dict__.pop(attr, None)
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def _error(status_code, detail):
+    return {"status": status_code, "body": {"detail": detail}}
+
+
+class BatchView(APIView):
+    """POST {"requests": [{"path": "/api/recipes/1/"}, ...]}.
+
+    Возвращает {"responses": [{"status": ..., "body": ...}, ...]} в том
+    же порядке. Поддерживаются только GET к /api/; вложенные пакеты
+    запрещены.
+    """
+
+    def post(self, request):
+        items = request.data.get("requests")
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"requests": "Передайте непустой список подзапросов."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > _max_requests():
+            return Response(
+                {
+                    "requests": (
+                        f"Не больше {_max_requests()} подзапросов "
+                        "за один пакет."
+                    )
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {"responses": [self.dispatch_item(request, i) for i in items]}
+        )
+
+    def dispatch_item(self, request, item):
+        if not isinstance(item, dict) or not item.get("path"):
+            return _error(400, "У подзапроса должно быть поле 'path'.")
+        if str(item.get("method", "GET")).upper() != "GET":
+            return _error(405, "В пакете разрешены только GET-запросы.")
+
+        url = urlsplit(item["path"])
+        if not url.path.startswith(API_PREFIX):
+            return _error(400, "Подзапрос должен обращаться к /api/.")
+        try:
+            match = resolve(url.path, urlconf="config.urls")
+        except Resolver404:
+            return _error(404, "Не найдено.")
+        if getattr(match.func, "cls", None) is BatchView:
+            return _error(400, "Вложенные пакеты не поддерживаются.")
+
+        sub = _sub_request(request, url.path, url.query)
+        sub.resolver_match = match
+        try:
+            response = match.func(sub, *match.args, **match.kwargs)
+        except Http404:
+            return _error(404, "Не найдено.")
+
+        if hasattr(response, "data"):
+            body = response.data
+        elif response.get("Content-Type", "").startswith("text/"):
+            body = response.content.decode(response.charset)
+        else:
+            return _error(406, "Этот ответ нельзя вернуть в пакете.")
+        return {"status": response.status_code, "body": body}
@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import resource
+import time
+import urllib.error
+import urllib.request
+
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+# Общие части нагрузочных замеров: прогон эндпоинтов через тестовый
+# клиент Django или по HTTP и расчёт перцентилей.
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = fraction * (len(ordered) - 1)
+    lower = int(index)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (
+        index - lower
+    )
+
+
+def summarize(durations):
+    """Статистика по списку длительностей в секундах, в миллисекундах."""
+    if not durations:
+        return {"p50_ms": None, "p95_ms": None, "mean_ms": None}
+    return {
+        "p50_ms": round(percentile(durations, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(durations, 0.95) * 1000, 3),
+        "mean_ms": round(sum(durations) / len(durations) * 1000, 3),
+    }
+
+
+def current_rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def quiet_sql_logging():
+    # При DEBUG=True каждый запрос пишется в консоль и искажает замеры.
+    logging.getLogger("django.db.backends").setLevel(logging.WARNING)
+
+
+class InProcessRunner:
+    """Выполняет запросы в текущем процессе через django.test.Client."""
+
+    mode = "in-process"
+
+    def __init__(self, token=None):
+        headers = {"HTTP_HOST": "localhost"}
+        if token:
+            headers["HTTP_AUTHORIZATION"] = f"Token {token}"
+        self.client = Client(**headers)
+
+    def request(self, method, path, data=None, headers=None):
+        extra = {
+            f"HTTP_{name.upper().replace('-', '_')}": value
+            for name, value in (headers or {}).items()
+        }
+        kwargs = {}
+        if data is not None:
+            kwargs = {
+                "data": json.dumps(data),
+                "content_type": "application/json",
+            }
+        with CaptureQueriesContext(connections["default"]) as queries:
+            start = time.perf_counter()
+            response = self.client.generic(method, path, **kwargs, **extra)
+            duration = time.perf_counter() - start
+        return response.status_code, duration, len(queries)
+
+
+class HttpRunner:
+    """Выполняет запросы к запущенному серверу (gunicorn, runserver)."""
+
+    mode = "http"
+
+    def __init__(self, base_url, token=None, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def request(self, method, path, data=None, headers=None):
+        request = urllib.request.Request(
+            self.base_url + path, method=method
+        )
+        if self.token:
+            request.add_header("Authorization", f"Token {self.token}")
+        for name, value in (headers or {}).items():
+            request.add_header(name, value)
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            request.add_header("Content-Type", "application/json")
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(
+                request, body, timeout=self.timeout
+            ) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            status = exc.code
+        return status, time.perf_counter() - start, None
+
+
+def run_scenario(runner, path, iterations, warmup=0, method="GET"):
+    for _ in range(warmup):
+        runner.request(method, path)
+    durations = []
+    queries = []
+    statuses = set()
+    for _ in range(iterations):
+        status, duration, query_count = runner.request(method, path)
+        statuses.add(status)
+        durations.append(duration)
+        if query_count is not None:
+            queries.append(query_count)
+    result = {
+        "path": path,
+        "method": method,
+        "iterations": iterations,
+        "statuses": sorted(statuses),
+        **summarize(durations),
+        "queries_per_request": (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+    }
+    if runner.mode == "in-process":
+        result["rss_kb"] = current_rss_kb()
+    return result
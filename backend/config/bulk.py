@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from config import sync
+from config.pagination import bump_count_generation
+
+# Пакетное добавление и удаление связей пользователя (избранное,
+# корзина, подписки): проверка id одним in_bulk, вставка одним
+# bulk_create, удаление одним DELETE ... WHERE ... IN. bulk_create не шлёт
+# сигналов, а обработчики post_delete пропускают удаления, помеченные
+# is_bulk_delete: счётчики страниц, журнал синхронизации и популярность
+# обновляются здесь одним запросом на пачку.
+
+
+def is_bulk_delete(origin):
+    """Удаление из bulk_relation — его связи учтены пачкой."""
+    return getattr(origin, "bulk_relation", False)
+
+
+def parse_ids(request):
+    data = request.data
+    ids = data.get("ids") if hasattr(data, "get") else data
+    if not isinstance(ids, list) or not ids:
+        raise ValidationError({"ids": "Передайте непустой список id."})
+    limit = getattr(settings, "BULK_MAX_IDS", 100)
+    if len(ids) > limit:
+        raise ValidationError(
+            {"ids": f"Не больше {limit} id за один запрос."}
+        )
+    parsed = []
+    for value in ids:
+        # int() пропустил бы 1.9, True и " 7 ": принимаем только целые
+        # числа и строки из цифр.
+        if isinstance(value, int) and not isinstance(value, bool):
+            parsed.append(value)
+        elif isinstance(value, str) and value.isascii() and value.isdigit():
+            parsed.append(int(value))
+        else:
+            raise ValidationError({"ids": "Все id должны быть числами."})
+    return list(dict.fromkeys(parsed))
+
+
+def bulk_relation(
+    request, model, target_model, field, forbidden=(), on_create=None,
+    on_delete=None,
+):
+    """Обрабатывает POST/DELETE со списком id целевых объектов.
+
+    field — имя внешнего ключа модели связи на целевой объект
+    («recipe», «author»); forbidden — id, которые нельзя добавить
+    (например, подписка на самого себя). Счётчики страниц и журнал
+    синхронизации обновляются здесь, а остальное, что делают обработчики
+    post_save и post_delete, передаётся в on_create и on_delete и
+    вызывается со списком созданных или удалённых связей.
+    """
+    ids = parse_ids(request)
+    column = f"{field}_id"
+    found = set(target_model.objects.only("pk").in_bulk(ids))
+    relations = model.objects.filter(user=request.user)
+    existing = {
+        getattr(relation, column): relation
+        for relation in relations.filter(
+            **{f"{column}__in": found}
+        ).only("pk", "user", field, "created_at")
+    }
+
+    results = []
+    if request.method == "POST":
+        new = []
+        for target_id in ids:
+            if target_id not in found:
+                state = "not_found"
+            elif target_id in forbidden:
+                state = "forbidden"
+            elif target_id in existing:
+                state = "exists"
+            else:
+                state = "created"
+                new.append(model(user=request.user, **{column: target_id}))
+            results.append({"id": target_id, "status": state})
+        if new:
+            # Строки, проигравшие гонку с параллельной вставкой, молча
+            # пропускаются: созданными считаем только строки с нашей
+            # отметкой времени.
+            created_at = timezone.now()
+            for relation in new:
+                relation.created_at = created_at
+            model.objects.bulk_create(new, ignore_conflicts=True)
+            targets = [getattr(relation, column) for relation in new]
+            new = list(
+                relations.filter(
+                    **{f"{column}__in": targets}, created_at=created_at
+                ).only("pk", "user", field, "created_at")
+            )
+            inserted = {getattr(relation, column) for relation in new}
+            for result in results:
+                if (
+                    result["status"] == "created"
+                    and result["id"] not in inserted
+                ):
+                    result["status"] = "exists"
+        if new:
+            bump_count_generation(model)
+            sync.record(model, new)
+            if on_create is not None:
+                on_create(new)
+        summary = {"created": len(new)}
+    else:
+        if existing:
+            removed = list(existing.values())
+            # Связи ни на что не ссылаются: коллектор выберет их и удалит
+            # одним DELETE, а обработчики post_delete по метке пропустят.
+            doomed = relations.filter(
+                pk__in=[relation.pk for relation in removed]
+            )
+            doomed.bulk_relation = True
+            doomed.delete()
+            bump_count_generation(model)
+            sync.record(model, removed, added=False)
+            if on_delete is not None:
+                on_delete(removed)
+        for target_id in ids:
+            if target_id not in found:
+                state = "not_found"
+            elif target_id in existing:
+                state = "deleted"
+            else:
+                state = "absent"
+            results.append({"id": target_id, "status": state})
+        summary = {"deleted": len(existing)}
+
+    return Response(
+        {**summary, "results": results}, status=status.HTTP_200_OK
+    )
@@ -0,0 +1,289 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from config import metrics
+
+# Двухуровневый кэш для CACHES["default"]: L1 — ограниченный LRU в памяти
+# процесса с коротким сроком жизни, L2 — общий бэкенд (CACHES[SHARED]).
+# В L1 попадают только ключи с префиксами из L1_PREFIXES: почти
+# неизменные данные вроде справочника ингредиентов, превью авторов и
+# токенов. Счётчики, аренды блокировок и прочее, что требует атомарности
+# (incr, add), всегда идут в L2.
+#
+# Записи одного процесса сразу видны ему самому. Другие процессы узнают о
+# них через канал инвалидации (CHANNEL, по умолчанию "auto" — "cache",
+# если L2 общий, иначе "local"):
+# - "local" — без сообщений между процессами; подходит, когда L2 сам
+#   локальный (locmem в тестах и разработке) или хватает L1_TIMEOUT;
+# - "cache" — журнал изменений в L2: каждая запись увеличивает
+#   порядковый номер и кладёт список ключей под ним, а процессы не чаще
+#   раза в CHECK_INTERVAL секунд читают номер и выбрасывают из L1
+#   перечисленные ключи. Если журнал отстал или записи вытеснены,
+#   L1 очищается целиком.
+#
+# Доли попаданий по уровням — в stats() и метриках кэша "l1" и "l2".
+
+SEQUENCE_KEY = "tiered:sequence"
+LOG_PREFIX = "tiered:log:"
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class LocalStore:
+    """LRU «ключ → pickle значения» со сроком жизни и статистикой."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = {"l1": 0, "l2": 0}
+        self.misses = {"l1": 0, "l2": 0}
+        self.sequence = None
+        self.checked_at = 0.0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                data, expires = entry
+                if expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    return data
+                del self.entries[key]
+            return None
+
+    def set(self, key, data, timeout):
+        with self.lock:
+            self.entries[key] = (data, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def count(self, tier, hit):
+        counters = self.hits if hit else self.misses
+        with self.lock:
+            counters[tier] += 1
+        metrics.record_cache(hit, cache=tier)
+
+
+def is_shared(alias="default"):
+    """Виден ли кэш alias всем воркерам, а не только этому процессу."""
+    backend = caches[alias]
+    # У двухуровневого кэша общий для воркеров — только L2.
+    backend = getattr(backend, "shared", backend)
+    return not isinstance(backend, LocMemCache)
+
+
+def _store(location, max_entries):
+    with _stores_lock:
+        if location not in _stores:
+            _stores[location] = LocalStore(max_entries)
+        return _stores[location]
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.shared_alias = options.get("SHARED", "shared")
+        self.l1_timeout = options.get("L1_TIMEOUT", 5)
+        self.prefixes = tuple(options.get("L1_PREFIXES", ()))
+        self._channel = options.get("CHANNEL", "auto")
+        self.check_interval = options.get("CHECK_INTERVAL", 0.5)
+        self.log_timeout = options.get("LOG_TIMEOUT", 60)
+        self.max_lag = options.get("MAX_LAG", 100)
+        # Экземпляры бэкенда создаются на каждый поток, а L1 общий для
+        # процесса — как у LocMemCache.
+        self.local = _store(
+            location or "default", options.get("L1_MAX_ENTRIES", 5000)
+        )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    @property
+    def channel(self):
+        # С общим L2 без журнала чужие L1 держали бы отозванные токены и
+        # устаревшие превью до L1_TIMEOUT.
+        if self._channel == "auto":
+            shared = not isinstance(self.shared, LocMemCache)
+            self._channel = "cache" if shared else "local"
+        return self._channel
+
+    def _local_key(self, key, version):
+        if not self.prefixes or not key.startswith(self.prefixes):
+            return None
+        return self.shared.make_and_validate_key(key, version=version)
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        if timeout is None:
+            return self.l1_timeout
+        return min(self.l1_timeout, timeout)
+
+    def _remember(self, local_key, value, timeout):
+        if local_key is not None and timeout > 0:
+            self.local.set(
+                local_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                timeout,
+            )
+
+    # Канал инвалидации.
+
+    def _publish(self, keys, version=None):
+        local_keys = [
+            local_key for local_key in (
+                self._local_key(key, version) for key in keys
+            )
+            if local_key is not None
+        ]
+        if not local_keys:
+            return
+        self.local.discard(local_keys)
+        if self.channel != "cache":
+            return
+        shared = self.shared
+        shared.add(SEQUENCE_KEY, 0, None)
+        sequence = shared.incr(SEQUENCE_KEY)
+        shared.set(f"{LOG_PREFIX}{sequence}", local_keys, self.log_timeout)
+
+    def _receive(self):
+        if self.channel != "cache":
+            return
+        local = self.local
+        now = time.monotonic()
+        if now - local.checked_at < self.check_interval:
+            return
+        local.checked_at = now
+        sequence = self.shared.get(SEQUENCE_KEY, 0)
+        if local.sequence is None or sequence - local.sequence > self.max_lag:
+            local.clear()
+        elif sequence > local.sequence:
+            wanted = [
+                f"{LOG_PREFIX}{number}"
+                for number in range(local.sequence + 1, sequence + 1)
+            ]
+            entries = self.shared.get_many(wanted)
+            if len(entries) < len(wanted):
+                local.clear()
+            else:
+                for keys in entries.values():
+                    local.discard(keys)
+        local.sequence = sequence
+
+    # Интерфейс BaseCache.
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = self.get_many([key], version=version).get(key, sentinel)
+        return default if value is sentinel else value
+
+    def get_many(self, keys, version=None):
+        self._receive()
+        found = {}
+        remote = []
+        local_keys = {}
+        for key in keys:
+            local_key = self._local_key(key, version)
+            if local_key is not None:
+                data = self.local.get(local_key)
+                self.local.count("l1", data is not None)
+                if data is not None:
+                    found[key] = pickle.loads(data)
+                    continue
+                local_keys[key] = local_key
+            remote.append(key)
+        if remote:
+            fetched = self.shared.get_many(remote, version=version)
+            for key in remote:
+                self.local.count("l2", key in fetched)
+            for key, value in fetched.items():
+                # Срок в L2 неизвестен, поэтому в L1 — не дольше
+                # L1_TIMEOUT.
+                self._remember(local_keys.get(key), value, self.l1_timeout)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._publish([key], version)
+        self._remember(
+            self._local_key(key, version), value, self._l1_timeout(timeout)
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._publish([key], version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        deleted = self.shared.delete(key, version=version)
+        self._publish([key], version)
+        return deleted
+
+    def has_key(self, key, version=None):
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self._receive()
+            if self.local.get(local_key) is not None:
+                return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._publish([key], version)
+        return value
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self._publish(list(data), version)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        self._publish(list(keys), version)
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+        self.local.sequence = None
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+    def stats(self):
+        local = self.local
+        tiers = {}
+        with local.lock:
+            for tier in ("l1", "l2"):
+                hits, misses = local.hits[tier], local.misses[tier]
+                total = hits + misses
+                tiers[tier] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / total if total else None,
+                }
+            tiers["l1"]["entries"] = len(local.entries)
+        return tiers
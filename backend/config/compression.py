@@ -0,0 +1,126 @@
+import gzip
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, тогда отдаём только gzip
+    brotli = None
+
+# Сжатие ответов по Accept-Encoding. Ответы меньше COMPRESSION_MIN_SIZE
+# и уже сжатые не трогаем. Если у ответа есть атрибут precompressed
+# ({"gzip": bytes, "br": bytes}), берём готовые байты — так кэшированные
+# полезные нагрузки (см. precompress) не сжимаются на каждом попадании.
+#
+# HTML (админка, browsable API) не сжимается: в нём CSRF-токен рядом с
+# данными из запроса, и размер сжатого ответа выдаёт его (BREACH).
+
+COMPRESSIBLE_TYPES = ("application/json", "text/plain")
+_ACCEPT_RE = re.compile(r"\s*([^\s;,]+)\s*(?:;\s*q=([0-9.]+))?")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def accepted_encodings(header):
+    accepted = {}
+    for part in header.split(","):
+        match = _ACCEPT_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2) or 1)
+        except ValueError:
+            continue
+        accepted[match.group(1).lower()] = quality
+    return accepted
+
+
+def choose_encoding(header, available=("br", "gzip")):
+    accepted = accepted_encodings(header or "")
+    for encoding in available:
+        if encoding == "br" and brotli is None:
+            continue
+        quality = accepted.get(encoding, accepted.get("*", 0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, best=False):
+    if encoding == "br":
+        quality = 11 if best else _setting("COMPRESSION_BROTLI_QUALITY", 4)
+        return brotli.compress(data, quality=quality)
+    level = 9 if best else _setting("COMPRESSION_GZIP_LEVEL", 6)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def precompress(data):
+    """Все поддерживаемые кодировки data с максимальным сжатием.
+
+    Для полезных нагрузок, которые кэшируются и отдаются много раз.
+    """
+    encoded = {"gzip": compress(data, "gzip", best=True)}
+    if brotli is not None:
+        encoded["br"] = compress(data, "br", best=True)
+    return encoded
+
+
+def _compressible(response):
+    if response.streaming or response.has_header("Content-Encoding"):
+        return False
+    content_type = response.get("Content-Type", "")
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process(request, await self.get_response(request))
+
+    def process(self, request, response):
+        if not _compressible(response):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < _setting("COMPRESSION_MIN_SIZE", 1024):
+            return response
+
+        precompressed = getattr(response, "precompressed", None) or {}
+        encoding = choose_encoding(
+            request.headers.get("Accept-Encoding"),
+            available=[e for e in ("br", "gzip") if e in precompressed]
+            or ("br", "gzip"),
+        )
+        if encoding is None:
+            return response
+        body = precompressed.get(encoding)
+        if body is None:
+            body = compress(response.content, encoding)
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response["Content-Length"] = str(len(body))
+        response["Content-Encoding"] = encoding
+        # Как и GZipMiddleware: сжатое представление — уже не та же
+        # последовательность байт, поэтому ETag становится слабым.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
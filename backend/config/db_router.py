@@ -0,0 +1,122 @@
+import hashlib
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+# Чтение безопасных запросов (GET/HEAD/OPTIONS) идёт на реплику, запись
+# и всё в рамках небезопасных запросов — на основную БД. После записи
+# пользователь на REPLICA_PIN_SECONDS «прилипает» к основной БД, чтобы
+# видеть свои изменения, пока реплика догоняет.
+
+REPLICA_ALIAS = "replica"
+PIN_COOKIE = "replica_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RoutingState:
+    __slots__ = ("use_replica", "wrote")
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+_state = ContextVar("db_routing_state", default=None)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.use_replica and not state.wrote:
+            return REPLICA_ALIAS
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+def _pin_seconds():
+    return getattr(settings, "REPLICA_PIN_SECONDS", 5)
+
+
+def _pin_key(request):
+    credential = request.headers.get("Authorization") or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if not credential:
+        return None
+    digest = hashlib.sha256(credential.encode()).hexdigest()
+    return f"replica:pin:{digest}"
+
+
+def _is_pinned(request, key):
+    try:
+        if float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    return bool(key and cache.get(key))
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key, token, state = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, key, state)
+
+    async def __acall__(self, request):
+        key, token, state = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, key, state)
+
+    def _start(self, request):
+        key = _pin_key(request)
+        use_replica = (
+            request.method in SAFE_METHODS and not _is_pinned(request, key)
+        )
+        state = RoutingState(use_replica)
+        return key, _state.set(state), state
+
+    def _finish(self, response, key, state):
+        if state.wrote:
+            seconds = _pin_seconds()
+            # Кэш закрепляет клиентов с токеном, cookie — браузер даже
+            # при локальном для воркера кэше.
+            if key:
+                cache.set(key, True, seconds)
+            response.set_cookie(
+                PIN_COOKIE,
+                str(time.time() + seconds),
+                max_age=seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,385 @@
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+# Метрики в текстовом формате Prometheus без внешних зависимостей.
+# Каждый процесс gunicorn пишет свои значения в собственный mmap-файл
+# в METRICS_DIR, а /metrics суммирует файлы всех воркеров.
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+METRICS = {
+    "foodgram_http_requests_total": (
+        "counter", "Количество HTTP-запросов."
+    ),
+    "foodgram_http_errors_total": (
+        "counter", "Количество ответов с кодом 5xx."
+    ),
+    "foodgram_http_request_duration_seconds": (
+        "histogram", "Время обработки запроса в секундах."
+    ),
+    "foodgram_db_queries_total": (
+        "counter", "Количество SQL-запросов."
+    ),
+    "foodgram_cache_hits_total": (
+        "counter", "Количество попаданий в кэш."
+    ),
+    "foodgram_cache_misses_total": (
+        "counter", "Количество промахов кэша."
+    ),
+    "foodgram_cache_singleflight_total": (
+        "counter", "Исходы пересчёта записей кэша (config.singleflight)."
+    ),
+}
+
+_HEADER_SIZE = 8
+_INITIAL_SIZE = 64 * 1024
+
+
+class MmapStore:
+    """Словарь «ключ → float», хранящийся в mmap-файле одного процесса.
+
+    Формат: 4 байта — занятый объём, далее записи вида
+    <длина ключа: uint32><ключ, выровненный до 8 байт><значение: double>.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        exists = os.path.exists(path)
+        self._file = open(path, "a+b")
+        if not exists or os.path.getsize(path) == 0:
+            self._file.truncate(_INITIAL_SIZE)
+        self._capacity = os.path.getsize(path)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = struct.unpack_from("i", self._map, 0)[0]
+        if not self._used:
+            self._used = _HEADER_SIZE
+            struct.pack_into("i", self._map, 0, self._used)
+        for key, value, position in _iter_entries(self._map, self._used):
+            self._positions[key] = position
+
+    def inc(self, key, amount=1.0):
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value = struct.unpack_from("d", self._map, position)[0]
+            struct.pack_into("d", self._map, position, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode("utf-8")
+        padding = 8 - (4 + len(encoded)) % 8
+        entry = struct.pack(
+            f"i{len(encoded)}s{padding}xd", len(encoded), encoded, 0.0
+        )
+        while self._used + len(entry) > self._capacity:
+            self._capacity *= 2
+            self._map.close()
+            self._file.truncate(self._capacity)
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._map[self._used:self._used + len(entry)] = entry
+        position = self._used + len(entry) - 8
+        self._used += len(entry)
+        # Сначала запись, потом счётчик занятого места: читатели из
+        # других процессов никогда не увидят недописанный ключ.
+        struct.pack_into("i", self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class LocalStore:
+    """Хранилище в памяти процесса, если METRICS_DIR не задан."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, key, amount=1.0):
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+
+def _iter_entries(data, used):
+    position = _HEADER_SIZE
+    while position < used:
+        length = struct.unpack_from("i", data, position)[0]
+        start = position + 4
+        key = bytes(data[start:start + length]).decode("utf-8")
+        position = start + length + (8 - (4 + length) % 8)
+        value = struct.unpack_from("d", data, position)[0]
+        yield key, value, position
+        position += 8
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store, _store_pid
+    pid = os.getpid()
+    if _store is None or _store_pid != pid:
+        with _store_lock:
+            if _store is None or _store_pid != pid:
+                directory = getattr(settings, "METRICS_DIR", None)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                    _store = MmapStore(
+                        os.path.join(directory, f"metrics_{pid}.db")
+                    )
+                else:
+                    _store = LocalStore()
+                _store_pid = pid
+    return _store
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def inc(name, labels, amount=1.0):
+    get_store().inc(_key(name, labels), amount)
+
+
+def observe(name, labels, value, buckets=LATENCY_BUCKETS):
+    store = get_store()
+    for bound in buckets:
+        if value <= bound:
+            store.inc(_key(f"{name}_bucket", {**labels, "le": str(bound)}))
+    store.inc(_key(f"{name}_bucket", {**labels, "le": "+Inf"}))
+    store.inc(_key(f"{name}_sum", labels), value)
+    store.inc(_key(f"{name}_count", labels))
+
+
+def collect():
+    """Суммирует значения всех процессов."""
+    directory = getattr(settings, "METRICS_DIR", None)
+    if not directory:
+        return dict(get_store().values)
+    totals = {}
+    for path in glob.glob(os.path.join(directory, "metrics_*.db")):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        if len(data) < _HEADER_SIZE:
+            continue
+        used = struct.unpack_from("i", data, 0)[0]
+        for key, value, _ in _iter_entries(data, used):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _family(sample_name):
+    for suffix in ("_bucket", "_sum", "_count"):
+        base = sample_name[:-len(suffix)]
+        if sample_name.endswith(suffix) and base in METRICS:
+            return base
+    return sample_name
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def render():
+    families = {}
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        families.setdefault(_family(name), []).append((name, labels, value))
+
+    lines = []
+    for family in sorted(families):
+        kind, help_text = METRICS.get(family, ("untyped", ""))
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for name, labels, value in sorted(
+            families[family], key=lambda sample: _sort_key(*sample)
+        ):
+            label_text = ",".join(
+                f'{label}="{_escape(label_value)}"'
+                for label, label_value in labels
+            )
+            lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _sort_key(name, labels, value):
+    plain = [item for item in labels if item[0] != "le"]
+    bound = dict(labels).get("le")
+    if bound is None:
+        order = float("inf")
+    else:
+        order = float(bound)
+    return (plain, name, order)
+
+
+# Статистика текущего запроса: маршрут, число SQL-запросов и обращений
+# к кэшу. Хранится в ContextVar, поэтому видна из обёртки курсора и из
+# кода кэширования без передачи request.
+class RequestStats:
+    __slots__ = ("route", "queries", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.route = "unmatched"
+        self.queries = 0
+        self.cache_hits = {}
+        self.cache_misses = {}
+
+
+_current = ContextVar("foodgram_request_stats", default=None)
+
+
+def record_cache(hit, cache="default"):
+    stats = _current.get()
+    if stats is None:
+        name = (
+            "foodgram_cache_hits_total" if hit
+            else "foodgram_cache_misses_total"
+        )
+        inc(name, {"route": "background", "cache": cache})
+        return
+    counters = stats.cache_hits if hit else stats.cache_misses
+    counters[cache] = counters.get(cache, 0) + 1
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter():
+    for connection in connections.all():
+        if _count_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_count_query)
+
+
+@receiver(connection_created)
+def count_queries_on_new_connection(sender, connection, **kwargs):
+    # Соединения у каждого потока свои: ORM из sync_to_async в ASGI-режиме
+    # работает в другом потоке, чем middleware, и без этого его запросы
+    # не считались бы.
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def route_label(view_func, method):
+    """Имя маршрута вида «RecipeViewSet.list» для DRF-представлений."""
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f"{view_class.__name__}.{action}"
+
+
+def record_request(stats, method, status_code, duration):
+    labels = {"route": stats.route}
+    inc(
+        "foodgram_http_requests_total",
+        {**labels, "method": method, "status": str(status_code)},
+    )
+    if status_code >= 500:
+        inc("foodgram_http_errors_total", labels)
+    observe("foodgram_http_request_duration_seconds", labels, duration)
+    if stats.queries:
+        inc("foodgram_db_queries_total", labels, stats.queries)
+    for cache, count in stats.cache_hits.items():
+        inc("foodgram_cache_hits_total", {**labels, "cache": cache}, count)
+    for cache, count in stats.cache_misses.items():
+        inc(
+            "foodgram_cache_misses_total", {**labels, "cache": cache}, count
+        )
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path == "/metrics":
+            return self.get_response(request)
+
+        stats, token, start = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        if request.path == "/metrics":
+            return await self.get_response(request)
+
+        stats, token, start = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, stats, start)
+        return response
+
+    def _start(self):
+        install_query_counter()
+        stats = RequestStats()
+        return stats, _current.set(stats), time.perf_counter()
+
+    def _finish(self, request, response, stats, start):
+        match = getattr(request, "resolver_match", None)
+        if match is not None:
+            stats.route = route_label(match.func, request.method)
+        record_request(
+            stats,
+            request.method,
+            response.status_code,
+            time.perf_counter() - start,
+        )
+
+
+def metrics_view(request):
+    return HttpResponse(
+        render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
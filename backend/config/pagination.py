@@ -0,0 +1,179 @@
+import hashlib
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from config import metrics
+
+# Дешёвые COUNT(*) для пагинации:
+# - неотфильтрованные списки на PostgreSQL берут оценку из
+#   pg_class.reltuples, если таблица больше PAGINATION_ESTIMATE_THRESHOLD;
+# - остальные счётчики кэшируются по SQL запроса на
+#   PAGINATION_COUNT_TIMEOUT секунд. В ключ входят «поколения» таблиц из
+#   запроса: запись в таблицу (bump_count_generation) сразу делает
+#   старые счётчики по ней недействительными;
+# - с ?count=false точный счётчик не считается вовсе, вместо count
+#   ответ содержит has_next.
+
+GENERATION_PREFIX = "pagecount:gen:"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def bump_count_generation(model):
+    key = GENERATION_PREFIX + model._meta.db_table
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def table_generations(*models):
+    """Строка из поколений таблиц моделей — для ключей других кэшей."""
+    keys = [GENERATION_PREFIX + model._meta.db_table for model in models]
+    generations = cache.get_many(keys)
+    return ":".join(str(generations.get(key, 0)) for key in keys)
+
+
+def _is_unfiltered(queryset):
+    query = queryset.query
+    return (
+        not query.where
+        and not query.distinct
+        and not query.is_sliced
+        and len(query.alias_map) <= 1
+    )
+
+
+def estimated_count(queryset):
+    """Оценка числа строк по статистике планировщика PostgreSQL."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql" or not _is_unfiltered(queryset):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    threshold = _setting("PAGINATION_ESTIMATE_THRESHOLD", 10000)
+    if row is None or row[0] < threshold:
+        # Маленькие таблицы считаем точно: это дёшево, а статистика
+        # у них часто устаревшая (или -1 до первого ANALYZE).
+        return None
+    return row[0]
+
+
+def _count_key(queryset):
+    # Без сортировки и лишних аннотаций (флаги избранного и т. п.):
+    # на число строк они не влияют, а ключ делали бы персональным.
+    sql = str(queryset.order_by().values("pk").query)
+    quote = connections[queryset.db].ops.quote_name
+    # Таблицы ищем в тексте SQL: так видны и подзапросы (exclude по
+    # связям), которых нет в alias_map.
+    tables = sorted(
+        model._meta.db_table
+        for model in apps.get_models()
+        if quote(model._meta.db_table) in sql
+    )
+    keys = [GENERATION_PREFIX + table for table in tables]
+    generations = cache.get_many(keys)
+    signature = "|".join(
+        [queryset.db, sql]
+        + [f"{key}={generations.get(key, 0)}" for key in keys]
+    )
+    return "pagecount:" + hashlib.sha256(signature.encode()).hexdigest()
+
+
+def count_queryset(queryset):
+    estimate = estimated_count(queryset)
+    if estimate is not None:
+        return estimate
+    key = _count_key(queryset)
+    count = cache.get(key)
+    metrics.record_cache(count is not None, cache="count")
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, _setting("PAGINATION_COUNT_TIMEOUT", 30))
+    return count
+
+
+async def acount_queryset(queryset):
+    # reltuples читается синхронным курсором, поэтому в async-версии
+    # только кэш и точный счётчик.
+    key = _count_key(queryset)
+    count = await cache.aget(key)
+    metrics.record_cache(count is not None, cache="count")
+    if count is None:
+        count = await queryset.acount()
+        await cache.aset(
+            key, count, _setting("PAGINATION_COUNT_TIMEOUT", 30)
+        )
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator Django для PageNumberPagination с дешёвым count."""
+
+    @cached_property
+    def count(self):
+        return count_queryset(self.object_list)
+
+
+class CachedCountPagination(LimitOffsetPagination):
+    count_query_param = "count"
+
+    def get_count(self, queryset):
+        return count_queryset(queryset)
+
+    def skip_count(self, request):
+        value = request.query_params.get(self.count_query_param, "")
+        return value.lower() in ("0", "false")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.skip_count(request):
+            self.has_next = None
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.count = None
+        # На одну строку больше, чтобы узнать, есть ли следующая страница.
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit
+        )
+
+    def get_paginated_response(self, data):
+        if self.count is not None:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "has_next": self.has_next,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
@@ -0,0 +1,29 @@
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from config.renderers import orjson
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser на orjson для тел в UTF-8.
+
+    Тела, которые orjson не принял, повторно разбирает stdlib: так
+    сообщения об ошибках и пограничные случаи (большие числа, NaN)
+    остаются такими же, как у JSONParser.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(
+                io.BytesIO(body), media_type, parser_context
+            )
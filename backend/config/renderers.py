@@ -0,0 +1,63 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен
+    orjson = None
+
+# При настройках DRF по умолчанию (UNICODE_JSON, COMPACT_JSON) вывод
+# совпадает с JSONRenderer побайтно, кроме чисел с плавающей точкой:
+# - экспонента пишется короче (1e16, а не 1e+16; 1e-7, а не 1e-07) —
+#   значение после разбора то же;
+# - NaN и бесконечности становятся null, тогда как JSONRenderer при
+#   STRICT_JSON падает с ValueError (а без него пишет невалидный NaN).
+# Всё, что orjson не умеет сам (даты, Decimal, ленивые строки), проходит
+# через encoder_class DRF; при ошибке orjson (например, int больше
+# 64 бит) рендерит stdlib.
+
+LINE_SEPARATORS = (
+    (b"\xe2\x80\xa8", b"\\u2028"),
+    (b"\xe2\x80\xa9", b"\\u2029"),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self._default,
+                option=(
+                    orjson.OPT_NON_STR_KEYS
+                    | orjson.OPT_PASSTHROUGH_DATETIME
+                    | orjson.OPT_PASSTHROUGH_DATACLASS
+                ),
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        # Как и JSONRenderer, экранируем разделители строк для JSONP/JS.
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+    def _default(self, obj):
+        if self.encoder_class is encoders.JSONEncoder:
+            return _encoder.default(obj)
+        return self.encoder_class().default(obj)
+
+
+_encoder = encoders.JSONEncoder()
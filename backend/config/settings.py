@@ -32,22 +32,159 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
+        "users.authentication.CachedTokenAuthentication",
     ),
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    "DEFAULT_PAGINATION_CLASS": "config.pagination.CachedCountPagination",
     "PAGE_SIZE": 6,
     "DEFAULT_FILTER_BACKENDS": (
         "django_filters.rest_framework.DjangoFilterBackend",
     ),
+    # orjson, если установлен; иначе те же классы работают на stdlib.
+    "DEFAULT_RENDERER_CLASSES": [
+        "config.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_PARSER_CLASSES": [
-        "rest_framework.parsers.JSONParser",
+        "config.parsers.FastJSONParser",
         "rest_framework.parsers.FormParser",
         "rest_framework.parsers.MultiPartParser",
     ],
 }
 
+# Кэш: в процессе LRU (L1) перед общим бэкендом "shared" (L2), см.
+# config.cache_backends. CACHE_BACKEND/CACHE_LOCATION задают общий кэш
+# (например, memcached); канал инвалидации "auto" тогда выбирает "cache".
+CACHES = {
+    "default": {
+        "BACKEND": "config.cache_backends.TieredCache",
+        "LOCATION": "default",
+        "OPTIONS": {
+            "SHARED": "shared",
+            "L1_MAX_ENTRIES": int(os.getenv("CACHE_L1_MAX_ENTRIES", 5000)),
+            "L1_TIMEOUT": float(os.getenv("CACHE_L1_TIMEOUT", 5)),
+            "L1_PREFIXES": [
+                "ingredients:",
+                "author_recipes:",
+                "auth:token:",
+            ],
+            "CHANNEL": os.getenv("CACHE_INVALIDATION_CHANNEL", "auto"),
+        },
+    },
+    "shared": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    },
+}
+
+# Кэш токенов для users.authentication.CachedTokenAuthentication:
+# TIMEOUT — в общем кэше, LOCAL_TIMEOUT — в памяти процесса, когда
+# общего кэша нет (выход в других воркерах виден с этой задержкой).
+TOKEN_CACHE = {
+    "MAX_ENTRIES": int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", 10000)),
+    "TIMEOUT": int(os.getenv("TOKEN_CACHE_TIMEOUT", 60)),
+    "LOCAL_TIMEOUT": int(os.getenv("TOKEN_CACHE_LOCAL_TIMEOUT", 5)),
+    "SHARED": os.getenv("TOKEN_CACHE_SHARED", "1") == "1",
+}
+
+# Максимум id в одном запросе к пакетным эндпоинтам (config.bulk).
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", 100))
+
+# Сжатие ответов (config.compression): gzip, а при установленном brotli
+# ещё и br. Ответы меньше порога отдаются как есть.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+
+# Справочник ингредиентов (recipes.catalogue) пересобирается при
+# изменении ингредиентов; таймаут лишь ограничивает устаревание в других
+# воркерах, когда кэш локальный для процесса. Поиск по ?name= отдаёт не
+# больше INGREDIENT_SEARCH_LIMIT строк.
+INGREDIENT_CATALOGUE_TIMEOUT = int(
+    os.getenv("INGREDIENT_CATALOGUE_TIMEOUT", 300)
+)
+INGREDIENT_SEARCH_LIMIT = int(os.getenv("INGREDIENT_SEARCH_LIMIT", 50))
+# recipes.search: "auto" — pg_trgm на PostgreSQL, индекс в памяти на
+# остальных СУБД; "database" или "memory" — принудительно.
+INGREDIENT_SEARCH_BACKEND = os.getenv("INGREDIENT_SEARCH_BACKEND", "auto")
+INGREDIENT_SIMILARITY_THRESHOLD = float(
+    os.getenv("INGREDIENT_SIMILARITY_THRESHOLD", 0.3)
+)
+# Как часто индекс в памяти сверяется с пересобранным справочником.
+INGREDIENT_INDEX_CHECK_INTERVAL = float(
+    os.getenv("INGREDIENT_INDEX_CHECK_INTERVAL", 5)
+)
+
+# Счётчики пагинации (config.pagination): кэш по SQL запроса и оценка
+# по reltuples для неотфильтрованных таблиц PostgreSQL от порога.
+PAGINATION_COUNT_TIMEOUT = int(os.getenv("PAGINATION_COUNT_TIMEOUT", 30))
+PAGINATION_ESTIMATE_THRESHOLD = int(
+    os.getenv("PAGINATION_ESTIMATE_THRESHOLD", 10000)
+)
+
+# Популярность рецептов для ?ordering=popular (recipes.popularity).
+RECIPE_POPULARITY = {
+    "HALF_LIFE_DAYS": float(os.getenv("POPULARITY_HALF_LIFE_DAYS", 7)),
+    "FAVORITE_WEIGHT": 1.0,
+    "CART_WEIGHT": 0.5,
+    "VIEW_WEIGHT": float(os.getenv("POPULARITY_VIEW_WEIGHT", 0.05)),
+    "EPOCH": "2024-01-01",
+}
+
+# Буфер просмотров рецептов (recipes.views_counter): запись в БД раз в
+# FLUSH_INTERVAL секунд или при MAX_PENDING рецептах в буфере; окно
+# закрывает фоновый поток воркера (BACKGROUND_FLUSH), даже если новых
+# просмотров нет.
+RECIPE_VIEWS = {
+    "FLUSH_INTERVAL": float(os.getenv("RECIPE_VIEWS_FLUSH_INTERVAL", 10)),
+    "MAX_PENDING": int(os.getenv("RECIPE_VIEWS_MAX_PENDING", 1000)),
+    "BACKGROUND_FLUSH": os.getenv("RECIPE_VIEWS_BACKGROUND_FLUSH", "1") == "1",
+}
+
+# Дельта-синхронизация связей (config.sync): повторная отдача записей
+# журнала за OVERLAP секунд до токена, предел дельты и срок хранения
+# журнала (manage.py prune_relation_changes).
+SYNC = {
+    "OVERLAP": 5,
+    "MAX_CHANGES": int(os.getenv("SYNC_MAX_CHANGES", 1000)),
+    "RETENTION_DAYS": int(os.getenv("SYNC_RETENTION_DAYS", 30)),
+}
+
+# Пересчёт дорогих записей кэша одним воркером (config.singleflight):
+# окно отдачи устаревшего значения, ожидание чужого пересчёта, аренда
+# блокировки; LOCK — "cache" ("auto") или "db" (advisory lock PostgreSQL,
+# только при общем кэше).
+CACHE_SINGLE_FLIGHT = {
+    "STALE": int(os.getenv("CACHE_STALE_SECONDS", 60)),
+    "WAIT": 2.0,
+    "POLL_INTERVAL": 0.05,
+    "LOCK_TIMEOUT": 30,
+    "BETA": 1.0,
+    "LOCK": os.getenv("CACHE_SINGLE_FLIGHT_LOCK", "auto"),
+}
+SHOPPING_LIST_CACHE_TIMEOUT = int(
+    os.getenv("SHOPPING_LIST_CACHE_TIMEOUT", 300)
+)
+AUTHOR_RECIPES_CACHE_TIMEOUT = int(
+    os.getenv("AUTHOR_RECIPES_CACHE_TIMEOUT", 300)
+)
+
+# Поиск почти одинаковых рецептов по MinHash (recipes.duplicates).
+RECIPE_MINHASH = {
+    "PERMUTATIONS": 64,
+    "BANDS": 16,
+    "THRESHOLD": float(os.getenv("RECIPE_DUPLICATE_THRESHOLD", 0.8)),
+    "CHECK_ON_CREATE": os.getenv("RECIPE_DUPLICATE_CHECK", "0") == "1",
+    "MAX_BUCKET": 500,
+}
+
+# Максимум подзапросов в одном POST /api/batch/ (config.batch).
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", 20))
 
 MIDDLEWARE = [
+    "config.metrics.MetricsMiddleware",
+    "config.compression.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -57,7 +194,11 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "config.urls"
+ROOT_URLCONF = os.getenv("DJANGO_ROOT_URLCONF", "config.urls")
+
+# Каталог для файлов метрик воркеров gunicorn; без него метрики
+# собираются только в памяти текущего процесса.
+METRICS_DIR = os.getenv("METRICS_DIR")
 
 TEMPLATES = [
     {
@@ -91,9 +232,36 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", "your_password"),
         "HOST": os.getenv("DB_HOST", "db"),
         "PORT": os.getenv("DB_PORT", "5432"),
+        # Постоянные соединения: без них каждый запрос заново открывает
+        # соединение с Postgres. В ASGI-режиме по умолчанию 0 (см. asgi.py).
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "1") == "1",
+        "OPTIONS": {
+            "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", 5)),
+        },
     }
 }
 
+# DB_POOL_MODE=pgbouncer — подключение через pgbouncer в режиме
+# transaction pooling: серверные курсоры (.iterator()) и
+# подготовленные выражения между транзакциями не переживают смену
+# серверного соединения, поэтому отключаются.
+if os.getenv("DB_POOL_MODE") == "pgbouncer":
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+
+# Реплика для чтения: включается заданием DB_REPLICA_HOST. Безопасные
+# запросы читают с неё, запись и чтение после записи — с основной БД.
+if os.getenv("DB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("DB_REPLICA_HOST"),
+        "PORT": os.getenv("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS = ["config.db_router.PrimaryReplicaRouter"]
+    MIDDLEWARE.insert(1, "config.db_router.ReplicaRoutingMiddleware")
+    REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", 5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -0,0 +1,198 @@
+import hashlib
+import math
+import random
+import sys
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from config import metrics
+from config.cache_backends import is_shared
+
+# «Получить или вычислить» без лавины пересчётов. Когда дорогая запись
+# (справочник, список покупок, превью рецептов автора) устаревает,
+# пересчитывает её один воркер, а остальные:
+# - пока запись в окне STALE после срока жизни, отдают старое значение
+#   (stale-while-revalidate);
+# - если записи нет, ждут до WAIT секунд, пока её положит держатель
+#   блокировки, и только потом считают сами.
+# Вдобавок запись может быть пересчитана заранее с вероятностью, растущей
+# к концу срока жизни (XFetch: now - delta * beta * ln(rand) >= expiry,
+# где delta — время прошлого вычисления), так что к моменту истечения
+# она обычно уже обновлена.
+#
+# Блокировка — аренда в кэше (cache.add с таймаутом). С LocMemCache она
+# упорядочивает только потоки своего процесса: результат соседнего
+# воркера в этот кэш всё равно не попадёт, и ждать его бессмысленно,
+# поэтому воркеры считают каждый сам. pg_try_advisory_xact_lock
+# (LOCK="db", только PostgreSQL) берётся лишь при общем кэше; пересчёт
+# тогда идёт внутри транзакции, которая держит блокировку.
+#
+# Исходы считаются в foodgram_cache_singleflight_total{cache, outcome}:
+# computed — посчитал держатель блокировки, coalesced — дождались чужого
+# результата, stale — отдали старое значение, early — пересчитали заранее,
+# timeout — не дождались и посчитали без блокировки.
+#
+# Записи с shared_only=True (ключ из поколений таблиц config.pagination)
+# кэшируются только при общем L2: в LocMemCache поколения у каждого
+# процесса свои, и запись другого воркера или команды (import_recipes)
+# их не сдвинет — такие значения без общего кэша считаются каждый раз.
+
+DEFAULTS = {
+    "STALE": 60,
+    "WAIT": 2.0,
+    "POLL_INTERVAL": 0.05,
+    "LOCK_TIMEOUT": 30,
+    "BETA": 1.0,
+    "LOCK": "auto",
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "CACHE_SINGLE_FLIGHT", {})}
+
+
+def _record(name, outcome):
+    metrics.inc(
+        "foodgram_cache_singleflight_total",
+        {"cache": name, "outcome": outcome},
+    )
+
+
+class CacheLease:
+    def __init__(self, key, timeout):
+        self.key = f"singleflight:lock:{key}"
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+
+    def acquire(self):
+        return cache.add(self.key, self.token, self.timeout)
+
+    def release(self):
+        # Аренда могла истечь и достаться другому — чужую не снимаем.
+        if cache.get(self.key) == self.token:
+            cache.delete(self.key)
+
+
+class AdvisoryLock:
+    # Блокировка уровня транзакции: держится до её конца, поэтому
+    # захват, пересчёт и снятие идут в одной транзакции. Сессионные
+    # pg_advisory_lock/unlock за pgbouncer в режиме транзакций могли
+    # попасть на разные серверные соединения, и снятие терялось.
+    def __init__(self, key, using="default"):
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        self.lock_id = int.from_bytes(digest, "big", signed=True)
+        self.connection = connections[using]
+        self.atomic = transaction.atomic(using=using)
+
+    def acquire(self):
+        self.atomic.__enter__()
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_try_advisory_xact_lock(%s)", [self.lock_id]
+                )
+                locked = cursor.fetchone()[0]
+        except BaseException:
+            self.atomic.__exit__(*sys.exc_info())
+            raise
+        if not locked:
+            self.atomic.__exit__(None, None, None)
+        return locked
+
+    def release(self):
+        # Вызывается из finally: при ошибке пересчёта транзакция
+        # откатывается, блокировка снимается в обоих случаях.
+        self.atomic.__exit__(*sys.exc_info())
+
+
+def make_lock(key, config=None):
+    config = config or _config()
+    # Межпроцессная блокировка полезна, только если ожидающий увидит
+    # результат держателя, то есть кэш общий.
+    if (
+        config["LOCK"] == "db"
+        and is_shared()
+        and connections["default"].vendor == "postgresql"
+    ):
+        return AdvisoryLock(key)
+    return CacheLease(key, config["LOCK_TIMEOUT"])
+
+
+def _expired_early(expires, delta, beta, now):
+    # 1 - random() лежит в (0, 1], логарифм определён.
+    return now - delta * beta * math.log(1 - random.random()) >= expires
+
+
+def _store(key, compute, timeout, stale):
+    start = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - start
+    cache.set(key, (value, time.time() + timeout, delta), timeout + stale)
+    return value
+
+
+def get_or_compute(
+    key, compute, timeout, name="default", stale=None, shared_only=False
+):
+    """Значение из кэша по key или compute(), вычисленное одним воркером.
+
+    timeout — срок свежести; ещё stale секунд после него отдаётся старое
+    значение, пока его обновляет держатель блокировки. name — метка
+    кэша в метриках. С shared_only без общего кэша compute() вызывается
+    всегда.
+    """
+    if shared_only and not is_shared():
+        return compute()
+    config = _config()
+    if stale is None:
+        stale = config["STALE"]
+    now = time.time()
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        metrics.record_cache(True, cache=name)
+        expired = now >= expires
+        if not expired and not _expired_early(
+            expires, delta, config["BETA"], now
+        ):
+            return value
+        lock = make_lock(key, config)
+        if not lock.acquire():
+            if expired:
+                _record(name, "stale")
+            return value
+        try:
+            value = _store(key, compute, timeout, stale)
+        finally:
+            lock.release()
+        _record(name, "early" if not expired else "computed")
+        return value
+
+    metrics.record_cache(False, cache=name)
+    lock = make_lock(key, config)
+    deadline = time.monotonic() + config["WAIT"]
+    while not lock.acquire():
+        if time.monotonic() >= deadline:
+            _record(name, "timeout")
+            return _store(key, compute, timeout, stale)
+        time.sleep(config["POLL_INTERVAL"])
+        entry = cache.get(key)
+        if entry is not None:
+            _record(name, "coalesced")
+            return entry[0]
+    try:
+        # Пока ждали блокировку, значение мог положить её прежний
+        # держатель.
+        entry = cache.get(key)
+        if entry is not None:
+            _record(name, "coalesced")
+            return entry[0]
+        value = _store(key, compute, timeout, stale)
+    finally:
+        lock.release()
+    _record(name, "computed")
+    return value
@@ -0,0 +1,41 @@
+from rest_framework.permissions import SAFE_METHODS
+
+# Разреженные наборы полей: ?fields=id,name оставляет только
+# перечисленные поля, ?omit=text,author убирает перечисленные. Действует
+# только на чтение и только на сериализатор верхнего уровня, вложенные
+# (например, автор рецепта) отдаются целиком.
+
+
+def _split(value):
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def selected_fields(request, available):
+    """Поля из available, которые нужно отдать, или None — все поля."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    params = request.query_params
+    fields = params.get("fields")
+    omit = params.get("omit")
+    if not fields and not omit:
+        return None
+    selected = set(available)
+    if fields:
+        selected &= _split(fields)
+    if omit:
+        selected -= _split(omit)
+    return selected
+
+
+class SparseFieldsMixin:
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.root
+        if root is not self and getattr(root, "child", None) is not self:
+            return fields
+        selected = selected_fields(self.context.get("request"), fields)
+        if selected is None:
+            return fields
+        return {
+            name: field for name, field in fields.items() if name in selected
+        }
@@ -0,0 +1,165 @@
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from users.models import RelationChange, User
+
+# Дельта-синхронизация избранного, корзины и подписок. Каждое добавление
+# и удаление связи пишется в журнал RelationChange (удаление — как
+# «надгробие» added=False), и клиент по токену получает только id,
+# добавленные и удалённые с прошлой синхронизации: объём ответа зависит
+# от числа изменений, а не от размера коллекций.
+#
+# Токен — «<номер последней записи>.<время выдачи>». Номера записей
+# выдаются при вставке, а видны после коммита, поэтому записи последних
+# OVERLAP секунд до выдачи токена отдаются повторно: состояние id в
+# ответе итоговое, и повтор безвреден. Если токен старше RETENTION_DAYS
+# (журнал уже подрезан) или изменений больше MAX_CHANGES, вместо дельты
+# отдаётся полный снимок с "reset": true.
+
+DEFAULTS = {
+    "OVERLAP": 5,
+    "MAX_CHANGES": 1000,
+    "RETENTION_DAYS": 30,
+}
+
+# Вид связи в журнале и ответе → (модель, колонка id объекта).
+RELATIONS = {
+    "favorites": ("recipes.Favorite", "recipe_id"),
+    "shopping_cart": ("recipes.ShoppingCart", "recipe_id"),
+    "subscriptions": ("users.Subscription", "author_id"),
+}
+KINDS = {label: kind for kind, (label, _) in RELATIONS.items()}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "SYNC", {})}
+
+
+def record(model, relations, added=True):
+    """Пишет в журнал добавление (или удаление) связей model."""
+    kind = KINDS[model._meta.label]
+    column = RELATIONS[kind][1]
+    RelationChange.objects.bulk_create(
+        RelationChange(
+            user_id=relation.user_id,
+            kind=kind,
+            target_id=getattr(relation, column),
+            added=added,
+        )
+        for relation in relations
+    )
+
+
+def record_removed(model, relation, origin=None):
+    # Связи удаляемого пользователя уходят вместе с его журналом, а
+    # пакетное удаление пишет журнал само.
+    if isinstance(origin, User) and origin.pk == relation.user_id:
+        return
+    if getattr(origin, "bulk_relation", False):
+        return
+    record(model, [relation], added=False)
+
+
+def prune_changes(days=None):
+    """Удаляет записи журнала старше days (RETENTION_DAYS) дней."""
+    if days is None:
+        days = _config()["RETENTION_DAYS"]
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = RelationChange.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def make_token(change_id, issued):
+    return f"{change_id}.{int(issued)}"
+
+
+def parse_token(token):
+    try:
+        change_id, issued = (int(part) for part in token.split("."))
+    except ValueError:
+        raise ValidationError({"since": "Некорректный токен синхронизации."})
+    return change_id, issued
+
+
+def _collapse(changes):
+    state = {kind: {} for kind in RELATIONS}
+    for kind, target_id, added in changes:
+        if kind in state:
+            state[kind][target_id] = added
+    return {
+        kind: {
+            "added": sorted(t for t, added in targets.items() if added),
+            "removed": sorted(t for t, added in targets.items() if not added),
+        }
+        for kind, targets in state.items()
+    }
+
+
+def snapshot(user, issued):
+    last = RelationChange.objects.filter(user=user).aggregate(
+        last=Max("id")
+    )["last"]
+    data = {"token": make_token(last or 0, issued), "reset": True}
+    for kind, (label, column) in RELATIONS.items():
+        ids = apps.get_model(label).objects.filter(user=user).values_list(
+            column, flat=True
+        )
+        data[kind] = {"added": sorted(ids), "removed": []}
+    return data
+
+
+def changes_since(user, token=None):
+    """Изменения связей user после token или полный снимок."""
+    config = _config()
+    issued = time.time()
+    if not token:
+        return snapshot(user, issued)
+    since_id, since_issued = parse_token(token)
+    age = issued - since_issued
+    if age > config["RETENTION_DAYS"] * 86400:
+        return snapshot(user, issued)
+
+    overlap_from = timezone.now() - timedelta(
+        seconds=age + config["OVERLAP"]
+    )
+    limit = config["MAX_CHANGES"]
+    changes = list(
+        RelationChange.objects.filter(
+            Q(id__gt=since_id) | Q(created_at__gte=overlap_from), user=user
+        ).order_by("id").values_list("id", "kind", "target_id", "added")[
+            :limit + 1
+        ]
+    )
+    if len(changes) > limit:
+        return snapshot(user, issued)
+    last = max([since_id, *(change[0] for change in changes)])
+    return {
+        "token": make_token(last, issued),
+        "reset": False,
+        **_collapse(change[1:] for change in changes),
+    }
+
+
+class SyncView(APIView):
+    """GET /api/sync/?since=<token>.
+
+    Возвращает {"token": ..., "reset": ..., "favorites": {"added": [...],
+    "removed": [...]}, "shopping_cart": {...}, "subscriptions": {...}}.
+    Без since — полный снимок.
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        return Response(
+            changes_since(request.user, request.query_params.get("since"))
+        )
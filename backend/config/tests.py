@@ -0,0 +1,772 @@
+import datetime
+import decimal
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.cache import cache
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from config import metrics
+from config.cache_backends import TieredCache
+from config.db_router import PrimaryReplicaRouter, ReplicaRoutingMiddleware
+from config.parsers import FastJSONParser
+from config.renderers import FastJSONRenderer, orjson
+from config.singleflight import (
+    AdvisoryLock, CacheLease, get_or_compute, make_lock,
+)
+from config.sync import changes_since
+from config.toggle import add_relation, remove_relation
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        Ingredient.objects.create(name="Сахар", measurement_unit="г")
+
+    def test_metrics_labelled_by_viewset_action(self):
+        """Запрос попадает в метрики с именем действия вьюсета."""
+        self.client.get("/api/ingredients/")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'foodgram_http_requests_total{method="GET",'
+            'route="IngredientViewSet.list",status="200"}',
+            body,
+        )
+        self.assertIn(
+            'foodgram_db_queries_total{route="IngredientViewSet.list"}',
+            body,
+        )
+        self.assertIn(
+            "# TYPE foodgram_http_request_duration_seconds histogram", body
+        )
+
+
+class MmapStoreTestCase(TestCase):
+    def test_values_are_summed_across_processes(self):
+        """Значения из файлов разных воркеров суммируются."""
+        with tempfile.TemporaryDirectory() as directory:
+            first = metrics.MmapStore(os.path.join(directory, "metrics_1.db"))
+            second = metrics.MmapStore(
+                os.path.join(directory, "metrics_2.db")
+            )
+            key = metrics._key("foodgram_db_queries_total", {"route": "x"})
+            first.inc(key, 2)
+            second.inc(key, 3)
+            for index in range(5000):
+                first.inc(metrics._key("grow", {"n": str(index)}))
+            first.close()
+            second.close()
+
+            with override_settings(METRICS_DIR=directory):
+                totals = metrics.collect()
+            self.assertEqual(totals[key], 5)
+            self.assertEqual(len(totals), 5001)
+            reopened = metrics.MmapStore(
+                os.path.join(directory, "metrics_1.db")
+            )
+            reopened.inc(key)
+            reopened.close()
+            with override_settings(METRICS_DIR=directory):
+                self.assertEqual(metrics.collect()[key], 6)
+
+
+class AsyncReadPathTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="reader", password="password", email="r@example.com"
+        )
+        author = User.objects.create_user(
+            username="author", password="password", email="a@example.com"
+        )
+        Subscription.objects.create(user=self.user, author=author)
+        ingredient = Ingredient.objects.create(
+            name="Мука", measurement_unit="г"
+        )
+        for index in range(3):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f"Рецепт {index}",
+                text="Текст",
+                image="recipes/images/test.png",
+                cooking_time=10 + index,
+            )
+            recipe.ingredients.add(
+                ingredient, through_defaults={"amount": index + 1}
+            )
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        self.recipe = recipe
+        self.token = Token.objects.create(user=self.user).key
+
+    def test_async_responses_match_sync_viewsets(self):
+        """Асинхронные представления отдают те же данные, что и DRF."""
+        paths = [
+            "/api/recipes/",
+            "/api/recipes/?limit=2&offset=1",
+            "/api/recipes/?is_favorited=1",
+            f"/api/recipes/{self.recipe.id}/",
+            "/api/ingredients/?name=%D0%9C",
+            "/api/users/subscriptions/?recipes_limit=1",
+        ]
+        headers = {"authorization": f"Token {self.token}"}
+        for path in paths:
+            with self.subTest(path=path):
+                expected = self.client.get(path, headers=headers)
+                with override_settings(ROOT_URLCONF="config.urls_asgi"):
+                    actual = async_to_sync(self.async_client.get)(
+                        path, headers=headers
+                    )
+                    view = actual.resolver_match.func
+                self.assertTrue(iscoroutinefunction(view))
+                self.assertEqual(actual.status_code, expected.status_code)
+                self.assertEqual(actual.content, expected.content)
+                self.assertEqual(actual["Allow"], expected["Allow"])
+
+    def test_errors_fall_back_to_viewsets(self):
+        """Ошибки и запись обрабатываются синхронными вьюсетами."""
+        with override_settings(ROOT_URLCONF="config.urls_asgi"):
+            missing = async_to_sync(self.async_client.get)("/api/recipes/0/")
+            anonymous = async_to_sync(self.async_client.get)(
+                "/api/users/subscriptions/"
+            )
+            invalid = async_to_sync(self.async_client.get)(
+                "/api/recipes/", headers={"authorization": "Token nope"}
+            )
+            post = async_to_sync(self.async_client.post)("/api/recipes/")
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(anonymous.status_code, 401)
+        self.assertEqual(invalid.status_code, 401)
+        self.assertEqual(post.status_code, 401)
+
+
+@override_settings(REPLICA_PIN_SECONDS=5)
+class AsyncQueryCountTestCase(TransactionTestCase):
+    def test_queries_in_sync_threads_are_counted(self):
+        """ORM из sync_to_async считается в метриках ASGI-запроса."""
+        Ingredient.objects.create(name="Мука", measurement_unit="г")
+        counted = []
+        record_request = metrics.record_request
+
+        def capture(stats, *args):
+            counted.append(stats.queries)
+            return record_request(stats, *args)
+
+        def request():
+            # Новый поток — новое соединение, как у потока ASGI-запроса.
+            try:
+                with override_settings(ROOT_URLCONF="config.urls_asgi"):
+                    async_to_sync(self.async_client.get)(
+                        "/api/ingredients/?name=%D0%9C"
+                    )
+            finally:
+                connections.close_all()
+
+        with mock.patch("config.metrics.record_request", capture):
+            thread = threading.Thread(target=request)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(counted), 1)
+        self.assertGreater(counted[0], 0)
+
+
+class PrimaryReplicaRouterTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, method, token="first", cookies=None, write=False):
+        """Возвращает БД для чтения внутри запроса и сам ответ."""
+        request = self.factory.generic(
+            method, "/api/recipes/", HTTP_AUTHORIZATION=f"Token {token}"
+        )
+        request.COOKIES.update(cookies or {})
+        seen = {}
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Recipe)
+            seen["read"] = self.router.db_for_read(Recipe)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen["read"], response
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.route("GET")[0], "replica")
+        self.assertEqual(self.route("POST")[0], "default")
+        self.assertEqual(self.router.db_for_read(Recipe), "default")
+
+    def test_reads_stick_to_primary_after_write(self):
+        """После записи чтения того же пользователя идут в основную БД."""
+        read, response = self.route("POST", write=True)
+        self.assertEqual(read, "default")
+        self.assertIn("replica_pin", response.cookies)
+        self.assertEqual(self.route("GET")[0], "default")
+        self.assertEqual(self.route("GET", token="second")[0], "replica")
+
+    def test_pin_cookie_without_shared_cache(self):
+        _, response = self.route("POST", write=True)
+        cache.clear()
+        cookies = {"replica_pin": response.cookies["replica_pin"].value}
+        self.assertEqual(self.route("GET", cookies=cookies)[0], "default")
+        expired = {"replica_pin": "0"}
+        self.assertEqual(self.route("GET", cookies=expired)[0], "replica")
+
+    def test_writes_in_get_request_switch_to_primary(self):
+        read, _ = self.route("GET", write=True)
+        self.assertEqual(read, "default")
+        self.assertFalse(
+            self.router.allow_migrate("replica", "recipes")
+        )
+
+
+class BatchViewTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="batch", email="batch@example.com", password="password"
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name="Рецепт",
+            text="Текст",
+            image="recipes/images/test.png",
+            cooking_time=10,
+        )
+        Ingredient.objects.create(name="Сахар", measurement_unit="г")
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_responses_match_separate_requests(self):
+        paths = [
+            f"/api/recipes/{self.recipe.id}/",
+            "/api/users/me/",
+            "/api/ingredients/?name=Са",
+            "/api/recipes/999999/",
+        ]
+        response = self.client.post(
+            "/api/batch/",
+            {"requests": [{"path": path} for path in paths]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        for path, item in zip(paths, response.json()["responses"]):
+            single = self.client.get(path)
+            self.assertEqual(item["status"], single.status_code)
+            self.assertEqual(item["body"], single.json())
+
+    def test_rejects_unsafe_nested_and_foreign_paths(self):
+        response = self.client.post(
+            "/api/batch/",
+            {
+                "requests": [
+                    {"method": "DELETE", "path": "/api/recipes/1/"},
+                    {"path": "/api/batch/"},
+                    {"path": "/metrics"},
+                ]
+            },
+            format="json",
+        )
+        statuses = [item["status"] for item in response.json()["responses"]]
+        self.assertEqual(statuses, [405, 400, 400])
+
+
+class ToggleTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="toggle", email="toggle@example.com", password="password"
+        )
+        self.author = User.objects.create_user(
+            username="writer", email="writer@example.com", password="password"
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name="Рецепт",
+            text="Текст",
+            image="recipes/images/test.png",
+            cooking_time=10,
+        )
+
+    def toggle(self, function, model, field, target, fields=()):
+        with CaptureQueriesContext(connection) as queries:
+            result = function(self.user, model, field, target.pk, fields)
+        statements = [
+            query["sql"] for query in queries.captured_queries
+            if model._meta.db_table in query["sql"]
+        ]
+        return result, statements
+
+    def test_target_has_only_requested_columns(self):
+        (recipe, created), statements = self.toggle(
+            add_relation, Favorite, "recipe", self.recipe, ("name",)
+        )
+        self.assertTrue(created)
+        self.assertEqual(recipe.name, "Рецепт")
+        self.assertIn("minhash", recipe.get_deferred_fields())
+        self.assertFalse(any("minhash" in sql for sql in statements))
+        self.assertEqual(
+            add_relation(self.user, Favorite, "recipe", "999999"),
+            (None, False),
+        )
+        (_, created), _ = self.toggle(
+            add_relation, Favorite, "recipe", self.recipe
+        )
+        self.assertFalse(created)
+        (_, deleted), _ = self.toggle(
+            remove_relation, Favorite, "recipe", self.recipe
+        )
+        self.assertTrue(deleted)
+        (_, deleted), _ = self.toggle(
+            remove_relation, Favorite, "recipe", self.recipe
+        )
+        self.assertFalse(deleted)
+
+    @skipUnless(connection.vendor == "postgresql", "SQL только для PostgreSQL")
+    def test_postgres_toggle_is_one_statement(self):
+        (author, created), statements = self.toggle(
+            add_relation, Subscription, "author", self.author,
+            ("username", "email"),
+        )
+        self.assertTrue(created)
+        self.assertEqual(author.username, "writer")
+        self.assertEqual(len(statements), 1)
+        self.assertIn("ON CONFLICT", statements[0])
+        self.assertNotIn("password", statements[0])
+
+        (_, created), statements = self.toggle(
+            add_relation, Subscription, "author", self.author
+        )
+        self.assertFalse(created)
+        self.assertEqual(len(statements), 1)
+
+        (recipe, created), _ = self.toggle(
+            add_relation, Favorite, "recipe", self.recipe, ("name",)
+        )
+        self.assertTrue(created)
+        (recipe, deleted), statements = self.toggle(
+            remove_relation, Favorite, "recipe", self.recipe
+        )
+        self.assertTrue(deleted)
+        self.assertEqual(len(statements), 1)
+        self.assertIn("RETURNING", statements[0])
+        self.assertNotIn("minhash", statements[0])
+        (_, deleted), _ = self.toggle(
+            remove_relation, Favorite, "recipe", self.recipe
+        )
+        self.assertFalse(deleted)
+        # Сигналы отправлены вручную: журнал синхронизации заполнен.
+        self.assertEqual(
+            list(
+                self.user.relation_changes.order_by("id").values_list(
+                    "kind", "added"
+                )
+            ),
+            [
+                ("subscriptions", True),
+                ("favorites", True),
+                ("favorites", False),
+            ],
+        )
+
+
+class SyncViewTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="sync", email="sync@example.com", password="password"
+        )
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="password"
+        )
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author,
+                name=f"Рецепт {number}",
+                text="Текст",
+                image="recipes/images/test.png",
+                cooking_time=10,
+            )
+            for number in range(3)
+        ]
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def sync(self, since=None):
+        params = {"since": since} if since else {}
+        response = self.client.get("/api/sync/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_only_changes_since_token(self):
+        first, second, third = self.recipes
+        data = self.sync()
+        self.assertTrue(data["reset"])
+        self.assertEqual(data["favorites"]["added"], [first.id])
+
+        self.client.post(f"/api/recipes/{second.id}/favorite/")
+        self.client.delete(f"/api/recipes/{first.id}/favorite/")
+        self.client.post(
+            "/api/recipes/shopping_cart/bulk/",
+            {"ids": [second.id, third.id]},
+            format="json",
+        )
+        self.client.post(f"/api/users/{self.author.id}/subscribe/")
+        deleted_id = third.id
+        third.delete()
+
+        with override_settings(SYNC={"OVERLAP": 0}):
+            delta = self.sync(data["token"])
+        self.assertFalse(delta["reset"])
+        self.assertEqual(
+            delta["favorites"], {"added": [second.id], "removed": [first.id]}
+        )
+        self.assertEqual(
+            delta["shopping_cart"],
+            {"added": [second.id], "removed": [deleted_id]},
+        )
+        self.assertEqual(
+            delta["subscriptions"], {"added": [self.author.id], "removed": []}
+        )
+        self.assertEqual(
+            set(ShoppingCart.objects.values_list("recipe_id", flat=True)),
+            {second.id},
+        )
+
+        # Записи той же секунды, что и токен, приходят повторно, но с
+        # итоговым состоянием.
+        self.client.delete(f"/api/recipes/{second.id}/favorite/")
+        with override_settings(SYNC={"OVERLAP": 0}):
+            again = self.sync(delta["token"])
+        self.assertFalse(again["reset"])
+        self.assertEqual(again["favorites"]["added"], [])
+        self.assertIn(second.id, again["favorites"]["removed"])
+
+    def test_too_many_changes_and_bad_tokens(self):
+        token = self.sync()["token"]
+        self.client.post(f"/api/recipes/{self.recipes[1].id}/favorite/")
+        with override_settings(SYNC={"MAX_CHANGES": 0}):
+            data = changes_since(self.user, token)
+        self.assertTrue(data["reset"])
+        self.assertEqual(
+            data["favorites"]["added"],
+            [self.recipes[0].id, self.recipes[1].id],
+        )
+        response = self.client.get("/api/sync/", {"since": "garbage"})
+        self.assertEqual(response.status_code, 400)
+        # Пользователь удаляется вместе со связями и журналом.
+        self.user.delete()
+        self.assertFalse(User.objects.filter(username="sync").exists())
+
+
+class FastJSONTestCase(TestCase):
+    def test_renderer_output_matches_drf(self):
+        data = {
+            "name": "Щи \u2028 «суточные»\u2029\x01\t",
+            "when": datetime.datetime(2024, 5, 1, 12, 30, 15, 123456),
+            "day": datetime.date(2024, 5, 1),
+            "price": decimal.Decimal("10.50"),
+            "lazy": gettext_lazy("Избранное"),
+            1: [True, None, -0.5],
+            "nested": [{"id": 1, "amount": 100}],
+        }
+        cases = [
+            (data, None),
+            (data, "application/json; indent=4"),
+            # orjson не умеет int больше 64 бит — отдаёт stdlib.
+            ({"big": 2 ** 70}, None),
+        ]
+        for value, media_type in cases:
+            self.assertEqual(
+                FastJSONRenderer().render(value, media_type),
+                JSONRenderer().render(value, media_type),
+            )
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    @skipUnless(orjson, "нужен orjson")
+    def test_renderer_float_differences(self):
+        """Отличия от stdlib — только запись чисел с плавающей точкой."""
+        fast, stdlib = FastJSONRenderer(), JSONRenderer()
+        for value, expected in ((1e16, b"1e16"), (1e-7, b"1e-7")):
+            rendered = fast.render({"x": value})
+            self.assertEqual(rendered, b'{"x":' + expected + b"}")
+            self.assertNotEqual(rendered, stdlib.render({"x": value}))
+            self.assertEqual(json.loads(rendered), {"x": value})
+        self.assertEqual(fast.render({"x": 0.1}), stdlib.render({"x": 0.1}))
+        for value in (float("nan"), float("inf")):
+            self.assertEqual(fast.render({"x": value}), b'{"x":null}')
+            with self.assertRaises(ValueError):
+                stdlib.render({"x": value})
+
+    def test_parser_matches_drf(self):
+        body = '{"name": "Борщ", "ingredients": [{"id": 1}]}'.encode()
+        self.assertEqual(
+            FastJSONParser().parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(body)),
+        )
+        errors = []
+        for parser in (FastJSONParser(), JSONParser()):
+            with self.assertRaises(ParseError) as context:
+                parser.parse(io.BytesIO(b'{"name": NaN}'))
+            errors.append(str(context.exception))
+        self.assertEqual(errors[0], errors[1])
+
+
+class CompressionTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {index}", measurement_unit="г")
+            for index in range(200)
+        )
+
+    def test_negotiated_compression(self):
+        plain = self.client.get("/api/ingredients/")
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        response = self.client.get(
+            "/api/ingredients/", HTTP_ACCEPT_ENCODING="gzip;q=1, br;q=0"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        small = self.client.get(
+            "/api/ingredients/?name=Ингредиент 199",
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertNotIn("Content-Encoding", small)
+
+    def test_html_is_not_compressed(self):
+        response = self.client.get(
+            "/admin/login/", HTTP_ACCEPT_ENCODING="gzip, br"
+        )
+        self.assertTrue(response["Content-Type"].startswith("text/html"))
+        self.assertGreater(len(response.content), 1024)
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_catalogue_served_precompressed(self):
+        """Повторный запрос справочника берёт сжатые байты из кэша."""
+        self.client.get("/api/ingredients/", HTTP_ACCEPT_ENCODING="gzip")
+        with mock.patch("config.compression.compress") as compress:
+            response = self.client.get(
+                "/api/ingredients/", HTTP_ACCEPT_ENCODING="gzip"
+            )
+        compress.assert_not_called()
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+        Ingredient.objects.create(name="Абрикос", measurement_unit="г")
+        response = self.client.get("/api/ingredients/")
+        self.assertEqual(response.json()[0]["name"], "Абрикос")
+
+
+class CachedCountPaginationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="pages", email="pages@example.com", password="password"
+        )
+        self.recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=self.user,
+                name=f"Рецепт {index}",
+                text="Текст",
+                image="recipes/images/test.png",
+                cooking_time=10,
+            )
+            for index in range(3)
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_count_cached_until_tables_change(self):
+        path = "/api/recipes/?is_favorited=1&limit=2"
+        first = self.client.get(path)
+        self.assertEqual(first.data["count"], 0)
+        with mock.patch("django.db.models.query.QuerySet.count") as count:
+            repeated = self.client.get(path)
+        count.assert_not_called()
+        self.assertEqual(repeated.data["count"], 0)
+
+        self.client.post(f"/api/recipes/{self.recipes[0].id}/favorite/")
+        self.assertEqual(self.client.get(path).data["count"], 1)
+
+    def test_user_count_follows_signups_and_deletions(self):
+        path = "/api/users/?limit=1"
+        self.assertEqual(self.client.get(path).data["count"], 1)
+        other = User.objects.create_user(
+            username="other", email="other@example.com", password="password"
+        )
+        self.assertEqual(self.client.get(path).data["count"], 2)
+        other.delete()
+        self.assertEqual(self.client.get(path).data["count"], 1)
+
+    def test_skip_count(self):
+        response = self.client.get("/api/recipes/?limit=2&count=false")
+        self.assertNotIn("count", response.data)
+        self.assertTrue(response.data["has_next"])
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIn("offset=2", response.data["next"])
+
+        response = self.client.get("/api/recipes/?limit=2&offset=2&count=0")
+        self.assertFalse(response.data["has_next"])
+        self.assertIsNone(response.data["next"])
+
+
+class SingleFlightTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch("config.singleflight._record")
+        self.record = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def outcomes(self):
+        return [call.args[1] for call in self.record.call_args_list]
+
+    def test_miss_is_computed_once(self):
+        compute = mock.Mock(return_value="value")
+        for _ in range(3):
+            self.assertEqual(get_or_compute("key", compute, 60), "value")
+        compute.assert_called_once()
+        self.assertEqual(self.outcomes(), ["computed"])
+
+    def test_waiters_take_value_of_lock_holder(self):
+        make_lock("key").acquire()
+        compute = mock.Mock(return_value="own")
+
+        def holder_finishes(seconds):
+            cache.set("key", ("holder", time.time() + 60, 0.0))
+
+        with mock.patch("time.sleep", side_effect=holder_finishes):
+            value = get_or_compute("key", compute, 60)
+        self.assertEqual(value, "holder")
+        compute.assert_not_called()
+        self.assertEqual(self.outcomes(), ["coalesced"])
+
+    def test_stale_served_while_revalidating(self):
+        cache.set("key", ("old", time.time() - 1, 0.0))
+        lock = make_lock("key")
+        lock.acquire()
+        compute = mock.Mock(return_value="new")
+        self.assertEqual(get_or_compute("key", compute, 60), "old")
+        compute.assert_not_called()
+
+        lock.release()
+        self.assertEqual(get_or_compute("key", compute, 60), "new")
+        self.assertEqual(self.outcomes(), ["stale", "computed"])
+
+    def test_advisory_lock_only_with_shared_cache(self):
+        """Без общего кэша чужой результат не дождаться — БД не держим."""
+        with self.settings(
+            CACHE_SINGLE_FLIGHT={"LOCK": "db"}
+        ), mock.patch.object(
+            connection, "vendor", "postgresql"
+        ):
+            self.assertIsInstance(make_lock("key"), CacheLease)
+            with mock.patch(
+                "config.singleflight.is_shared", return_value=True
+            ):
+                self.assertIsInstance(make_lock("key"), AdvisoryLock)
+
+    def test_advisory_lock_lives_in_a_transaction(self):
+        lock = AdvisoryLock("key")
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchone.return_value = (True,)
+        depth = len(connection.atomic_blocks)
+        # Точки сохранения SQLite тут не нужны: проверяем только
+        # вложенность транзакции.
+        with mock.patch.object(
+            connection, "_savepoint_allowed", return_value=False
+        ):
+            with mock.patch.object(
+                lock.connection, "cursor", return_value=cursor
+            ):
+                self.assertTrue(lock.acquire())
+            sql = cursor.__enter__.return_value.execute.call_args.args[0]
+            self.assertIn("pg_try_advisory_xact_lock", sql)
+            self.assertEqual(len(connection.atomic_blocks), depth + 1)
+            lock.release()
+        self.assertEqual(len(connection.atomic_blocks), depth)
+
+    def test_early_expiration(self):
+        cache.set("key", ("old", time.time() + 5, 1.0))
+        compute = mock.Mock(return_value="new")
+        with self.settings(CACHE_SINGLE_FLIGHT={"BETA": 1000}):
+            self.assertEqual(get_or_compute("key", compute, 60), "new")
+        self.assertEqual(self.outcomes(), ["early"])
+
+
+class TieredCacheTestCase(TestCase):
+    def make_cache(self, location):
+        backend = TieredCache(
+            location,
+            {
+                "OPTIONS": {
+                    "L1_PREFIXES": ["hot:"],
+                    "CHANNEL": "cache",
+                    "CHECK_INTERVAL": 60,
+                }
+            },
+        )
+        backend.clear()
+        return backend
+
+    def test_channel_follows_shared_backend(self):
+        options = {"OPTIONS": {"SHARED": "shared"}}
+        self.assertEqual(TieredCache("auto-test", options).channel, "local")
+        with override_settings(CACHES={
+            "shared": {
+                "BACKEND": "django.core.cache.backends.filebased."
+                "FileBasedCache",
+                "LOCATION": tempfile.mkdtemp(),
+            },
+        }):
+            self.assertEqual(
+                TieredCache("auto-test", options).channel, "cache"
+            )
+
+    def test_tiers_and_cross_process_invalidation(self):
+        # Два L1 с общим L2 — как два воркера.
+        first = self.make_cache("tiered-test-1")
+        second = self.make_cache("tiered-test-2")
+        first.set("hot:value", 1)
+        first.set("cold:value", 1)
+        self.assertEqual(second.get("hot:value"), 1)
+        self.assertEqual(second.get("hot:value"), 1)
+        self.assertEqual(second.get("cold:value"), 1)
+        self.assertEqual(second.get("hot:missing", "default"), "default")
+        stats = second.stats()
+        self.assertEqual((stats["l1"]["hits"], stats["l1"]["misses"]), (1, 2))
+        self.assertEqual((stats["l2"]["hits"], stats["l2"]["misses"]), (2, 1))
+
+        first.set("hot:value", 2)
+        # До проверки журнала второй процесс видит свою копию.
+        self.assertEqual(second.get("hot:value"), 1)
+        second.local.checked_at = 0
+        self.assertEqual(second.get("hot:value"), 2)
+
+        first.delete("hot:value")
+        second.local.checked_at = 0
+        self.assertIsNone(second.get("hot:value"))
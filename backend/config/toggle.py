@@ -0,0 +1,179 @@
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+
+# Одиночные переключатели связей пользователя (избранное, корзина,
+# подписка). На PostgreSQL каждый — один запрос: CTE выбирает целевой
+# объект, INSERT ... SELECT FROM target ON CONFLICT DO NOTHING RETURNING
+# (или DELETE ... RETURNING) меняет связь, и в ответ приходят и строка
+# объекта, и признак изменения. Если объекта нет, вставлять нечего, а
+# повторные и одновременные запросы упираются в уникальный ключ, а не
+# в IntegrityError. На остальных СУБД — обычный ORM в транзакции.
+#
+# Сырой SQL не шлёт сигналов модели, поэтому post_save/post_delete
+# отправляются вручную: популярность и счётчики пагинации обновляются
+# там же, где и для изменений через ORM. Приёмникам хватает строки связи,
+# а из объекта читаются только pk и поля fields, нужные ответу, — не
+# minhash рецепта и не пароль автора.
+
+
+def _target_id(target_model, value):
+    try:
+        return target_model._meta.pk.to_python(value)
+    except ValidationError:
+        return None
+
+
+def _columns(model):
+    return [field.column for field in model._meta.concrete_fields]
+
+
+def _target_fields(target_model, fields):
+    meta = target_model._meta
+    return [meta.pk, *(meta.get_field(name) for name in fields)]
+
+
+def _target_cte(target_model, fields, quote):
+    meta = target_model._meta
+    columns = [f.column for f in _target_fields(target_model, fields)]
+    return (
+        f"WITH target AS (SELECT "
+        f"{', '.join(quote(column) for column in columns)} "
+        f"FROM {quote(meta.db_table)} WHERE {quote(meta.pk.column)} = %s)"
+    )
+
+
+def _split(row, model, target_model, fields, alias):
+    target_fields = _target_fields(target_model, fields)
+    size = len(target_fields)
+    # Остальные поля объекта отложены и догрузятся при обращении.
+    target = target_model.from_db(
+        alias, [f.attname for f in target_fields], row[:size]
+    )
+    relation = None
+    if row[size] is not None:
+        relation = model.from_db(
+            alias, [f.attname for f in model._meta.concrete_fields],
+            row[size:],
+        )
+    return target, relation
+
+
+def _fetch_target(target_model, fields, alias, target_id):
+    return target_model._default_manager.using(alias).filter(
+        pk=target_id
+    ).only(*fields).first()
+
+
+def add_relation(user, model, field, value, fields=()):
+    """Создаёт связь user → объект; возвращает (объект, создана ли).
+
+    У объекта загружены pk и fields. Если объекта нет, возвращает
+    (None, False).
+    """
+    target_model = model._meta.get_field(field).related_model
+    target_id = _target_id(target_model, value)
+    if target_id is None:
+        return None, False
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    relation = model(user=user, **{f"{field}_id": target_id})
+
+    if connection.vendor != "postgresql":
+        target = _fetch_target(target_model, fields, alias, target_id)
+        if target is None:
+            return None, False
+        try:
+            with transaction.atomic(using=alias):
+                relation.save(using=alias, force_insert=True)
+        except IntegrityError:
+            return target, False
+        return target, True
+
+    quote = connection.ops.quote_name
+    meta = model._meta
+    target_field = meta.get_field(field)
+    fields = [f for f in meta.concrete_fields if f is not meta.pk]
+    # Внешний ключ на объект берётся из target: нет строки — нет вставки.
+    values, params = [], []
+    for f in fields:
+        if f is target_field:
+            values.append("target." + quote(target_model._meta.pk.column))
+        else:
+            values.append("%s")
+            params.append(
+                f.get_db_prep_save(f.pre_save(relation, True), connection)
+            )
+    sql = (
+        f"{_target_cte(target_model, fields, quote)}, "
+        f"inserted AS (INSERT INTO {quote(meta.db_table)} "
+        f"({', '.join(quote(f.column) for f in fields)}) "
+        f"SELECT {', '.join(values)} FROM target "
+        f"ON CONFLICT ({quote(meta.get_field('user').column)}, "
+        f"{quote(target_field.column)}) DO NOTHING RETURNING "
+        f"{', '.join(quote(column) for column in _columns(model))}) "
+        f"SELECT * FROM target LEFT JOIN inserted ON TRUE"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [target_id, *params])
+        row = cursor.fetchone()
+    if row is None:
+        return None, False
+    target, relation = _split(row, model, target_model, fields, alias)
+    if relation is None:
+        return target, False
+    post_save.send(
+        sender=model, instance=relation, created=True,
+        update_fields=None, raw=False, using=alias,
+    )
+    return target, True
+
+
+def remove_relation(user, model, field, value, fields=()):
+    """Удаляет связь user → объект; возвращает (объект, удалена ли).
+
+    У объекта загружены pk и fields. Если объекта нет, возвращает
+    (None, False).
+    """
+    target_model = model._meta.get_field(field).related_model
+    target_id = _target_id(target_model, value)
+    if target_id is None:
+        return None, False
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+
+    if connection.vendor != "postgresql":
+        target = _fetch_target(target_model, fields, alias, target_id)
+        if target is None:
+            return None, False
+        deleted, _ = model._default_manager.using(alias).filter(
+            user=user, **{f"{field}_id": target_id}
+        ).delete()
+        return target, bool(deleted)
+
+    quote = connection.ops.quote_name
+    meta = model._meta
+    sql = (
+        f"{_target_cte(target_model, fields, quote)}, "
+        f"deleted AS (DELETE FROM {quote(meta.db_table)} "
+        f"WHERE {quote(meta.get_field('user').column)} = %s "
+        f"AND {quote(meta.get_field(field).column)} IN "
+        f"(SELECT {quote(target_model._meta.pk.column)} FROM target) "
+        f"RETURNING "
+        f"{', '.join(quote(column) for column in _columns(model))}) "
+        f"SELECT * FROM target LEFT JOIN deleted ON TRUE"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [target_id, user.pk])
+        row = cursor.fetchone()
+    if row is None:
+        return None, False
+    target, relation = _split(row, model, target_model, fields, alias)
+    if relation is None:
+        return target, False
+    # Связи ни на что не ссылаются, так что каскада, который сделал бы
+    # ORM, здесь нет.
+    post_delete.send(
+        sender=model, instance=relation, using=alias, origin=relation
+    )
+    return target, True
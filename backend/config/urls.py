@@ -5,6 +5,9 @@ from users.views import UserViewSet, LogoutView, CustomAuthToken
 from recipes.views import RecipeViewSet, IngredientViewSet
 from django.conf import settings
 from django.conf.urls.static import static
+from config.batch import BatchView
+from config.metrics import metrics_view
+from config.sync import SyncView
 
 router = DefaultRouter()
 router.register("users", UserViewSet, basename="user")
@@ -13,6 +16,9 @@ router.register("ingredients", IngredientViewSet, basename="ingredient")
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
+    path("api/batch/", BatchView.as_view(), name="batch"),
+    path("api/sync/", SyncView.as_view(), name="sync"),
     path("api/", include(router.urls)),
     path(
         "api/auth/token/login/",
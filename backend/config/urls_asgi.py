@@ -0,0 +1,29 @@
+from django.urls import re_path
+
+from config.async_views import async_read_path
+from config.urls import urlpatterns as sync_urlpatterns
+from recipes import async_views as recipe_views
+from users import async_views as user_views
+
+# Маршруты ASGI-режима: горячие GET-эндпоинты обслуживаются
+# асинхронными представлениями, всё остальное — как в config.urls.
+urlpatterns = [
+    re_path(
+        r"^api/recipes/$",
+        async_read_path(recipe_views.recipe_list, "/api/recipes/"),
+    ),
+    re_path(
+        r"^api/recipes/(?P<pk>[^/.]+)/$",
+        async_read_path(recipe_views.recipe_detail, "/api/recipes/1/"),
+    ),
+    re_path(
+        r"^api/ingredients/$",
+        async_read_path(recipe_views.ingredient_list, "/api/ingredients/"),
+    ),
+    re_path(
+        r"^api/users/subscriptions/$",
+        async_read_path(
+            user_views.subscriptions, "/api/users/subscriptions/"
+        ),
+    ),
+] + sync_urlpatterns
@@ -0,0 +1,17 @@
+import glob
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", 2))
+# Для ASGI-режима: GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker
+# и приложение config.asgi:application.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+
+
+def on_starting(server):
+    # Счётчики прошлого запуска не должны попасть в новые метрики.
+    directory = os.getenv("METRICS_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "metrics_*.db")):
+            os.remove(path)
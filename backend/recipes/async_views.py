@@ -0,0 +1,156 @@
+from asgiref.sync import sync_to_async
+
+from config.async_views import (
+    FallbackToSync,
+    api_headers,
+    authenticate,
+    image_url,
+    json_response,
+    query_params,
+    user_payload,
+)
+from config.pagination import CachedCountPagination, acount_queryset
+from users.models import Subscription, User
+from .models import (
+    Favorite,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from .catalogue import catalogue_response, ingredient_catalogue
+from .search import search_ingredients
+from .views import filter_recipes, is_typo_search
+from .views_counter import count_view, flush_views
+
+
+async def _values(queryset, field):
+    return {value async for value in queryset.values_list(field, flat=True)}
+
+
+async def recipe_payloads(request, user, recipes):
+    recipe_ids = [recipe.id for recipe in recipes]
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    rows = (
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .select_related("ingredient")
+        .order_by("id")
+    )
+    async for row in rows.aiterator():
+        ingredients[row.recipe_id].append(
+            {
+                # Как и RecipeIngredientSerializer, отдаём id строки связи.
+                "id": row.id,
+                "name": row.ingredient.name,
+                "measurement_unit": row.ingredient.measurement_unit,
+                "amount": row.amount,
+            }
+        )
+
+    favorited = in_cart = subscribed = set()
+    if user.is_authenticated:
+        favorited = await _values(
+            Favorite.objects.filter(user=user, recipe_id__in=recipe_ids),
+            "recipe_id",
+        )
+        in_cart = await _values(
+            ShoppingCart.objects.filter(user=user, recipe_id__in=recipe_ids),
+            "recipe_id",
+        )
+        subscribed = await _values(
+            Subscription.objects.filter(
+                user=user,
+                author_id__in={recipe.author_id for recipe in recipes},
+            ),
+            "author_id",
+        )
+
+    return [
+        {
+            "id": recipe.id,
+            "author": user_payload(
+                request, recipe.author, recipe.author_id in subscribed
+            ),
+            "ingredients": ingredients[recipe.id],
+            "is_favorited": recipe.id in favorited,
+            "is_in_shopping_cart": recipe.id in in_cart,
+            "name": recipe.name,
+            "image": image_url(request, recipe.image),
+            "text": recipe.text,
+            "cooking_time": recipe.cooking_time,
+        }
+        for recipe in recipes
+    ]
+
+
+async def recipe_list(request):
+    user = await authenticate(request)
+    params = request.GET
+    queryset = filter_recipes(Recipe.objects.all(), user, params)
+    author = params.get("author")
+    if author:
+        if not author.isdigit():
+            raise FallbackToSync
+        if not await User.objects.filter(pk=author).aexists():
+            raise FallbackToSync
+        queryset = queryset.filter(author_id=author)
+
+    paginator = CachedCountPagination()
+    shim = query_params(request)
+    paginator.request = shim
+    paginator.limit = paginator.get_limit(shim)
+    if paginator.limit is None:
+        raise FallbackToSync
+    paginator.offset = paginator.get_offset(shim)
+    paginator.count = await acount_queryset(queryset)
+
+    recipes = []
+    if paginator.count and paginator.offset <= paginator.count:
+        page = queryset.select_related("author").defer("minhash")[
+            paginator.offset:paginator.offset + paginator.limit
+        ]
+        recipes = [recipe async for recipe in page.aiterator()]
+
+    return json_response(
+        {
+            "count": paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "results": await recipe_payloads(request, user, recipes),
+        },
+        allow="GET, POST, HEAD, OPTIONS",
+    )
+
+
+async def recipe_detail(request, pk):
+    if not pk.isdigit():
+        raise FallbackToSync
+    user = await authenticate(request)
+    recipe = await (
+        filter_recipes(Recipe.objects.all(), user, request.GET)
+        .select_related("author").defer("minhash")
+        .filter(pk=pk)
+        .afirst()
+    )
+    if recipe is None:
+        raise FallbackToSync
+    payloads = await recipe_payloads(request, user, [recipe])
+    if count_view(recipe.id):
+        await sync_to_async(flush_views)()
+    return json_response(
+        payloads[0], allow="GET, PUT, PATCH, DELETE, HEAD, OPTIONS"
+    )
+
+
+async def ingredient_list(request):
+    await authenticate(request)
+    if "limit" in request.GET or "offset" in request.GET:
+        raise FallbackToSync
+    if not request.GET.get("name"):
+        payload = await sync_to_async(ingredient_catalogue)()
+        return api_headers(
+            catalogue_response(payload), allow="GET, POST, HEAD, OPTIONS"
+        )
+    found = await sync_to_async(search_ingredients)(
+        request.GET["name"], typo=is_typo_search(request.GET)
+    )
+    return json_response(found, allow="GET, POST, HEAD, OPTIONS")
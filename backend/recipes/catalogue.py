@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.settings import api_settings
+
+from config.compression import precompress
+from config.singleflight import get_or_compute
+from .models import Ingredient
+from .serializers import IngredientSerializer
+
+# Полный справочник ингредиентов (GET /api/ingredients/ без фильтра)
+# отдаётся готовыми байтами из кэша вместе со сжатыми вариантами.
+# Любое изменение ингредиентов увеличивает версию (см. recipes.signals),
+# старые записи просто перестают читаться и вытесняются по таймауту.
+
+VERSION_KEY = "ingredients:catalogue:version"
+
+
+def _timeout():
+    return getattr(settings, "INGREDIENT_CATALOGUE_TIMEOUT", 300)
+
+
+def catalogue_version():
+    # Начальная версия от времени, чтобы после вытеснения ключа версии
+    # не прочитать запись, оставшуюся от прежнего счётчика.
+    return cache.get_or_set(VERSION_KEY, time.time_ns(), None)
+
+
+def bump_catalogue_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def _build_catalogue():
+    data = IngredientSerializer(
+        Ingredient.objects.order_by("name"), many=True
+    ).data
+    body = api_settings.DEFAULT_RENDERER_CLASSES[0]().render(data)
+    return {
+        "data": list(data),
+        "body": body,
+        "encoded": precompress(body),
+        # Отметка сборки: по ней recipes.search видит пересборку.
+        "built": time.time_ns(),
+    }
+
+
+def ingredient_catalogue():
+    return get_or_compute(
+        f"ingredients:catalogue:{catalogue_version()}",
+        _build_catalogue,
+        _timeout(),
+        name="ingredients",
+    )
+
+
+def catalogue_response(payload):
+    response = HttpResponse(payload["body"], content_type="application/json")
+    response.precompressed = payload["encoded"]
+    # Как у Response DRF: пакетный эндпоинт и тесты читают .data.
+    response.data = payload["data"]
+    return response
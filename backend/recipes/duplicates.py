@@ -0,0 +1,208 @@
+import hashlib
+import random
+import re
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Recipe, RecipeIngredient, RecipeSignatureBand
+
+# Поиск почти одинаковых рецептов. Рецепт — множество признаков: id его
+# ингредиентов и нормализованные слова названия. MinHash-сигнатура из
+# PERMUTATIONS минимумов хэшей оценивает сходство Жаккара двух множеств
+# долей совпавших позиций. Сигнатура хранится в Recipe.minhash как
+# массив uint64 фиксированной длины, а её полосы (BANDS полос по
+# PERMUTATIONS / BANDS позиций) — в RecipeSignatureBand. Кандидаты в
+# дубликаты — рецепты, у которых совпала хотя бы одна полоса (LSH), так
+# что сравнивать все пары не нужно. При 64 позициях и 16 полосах пара
+# со сходством 0,8 становится кандидатом с вероятностью ~0,9999, а со
+# сходством 0,3 — ~0,12.
+
+DEFAULTS = {
+    "PERMUTATIONS": 64,
+    "BANDS": 16,
+    "THRESHOLD": 0.8,
+    # Проверка в RecipeSerializer.create: отклонять почти дубликаты.
+    "CHECK_ON_CREATE": False,
+    # Полосы, общие для слишком многих рецептов (например, один «соль»),
+    # ничего не различают — такие корзины пропускаются.
+    "MAX_BUCKET": 500,
+}
+
+_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "RECIPE_MINHASH", {})}
+
+
+_permutations = {}
+
+
+def _coefficients(count):
+    # Фиксированное зерно: сигнатуры должны совпадать между процессами
+    # и запусками.
+    if count not in _permutations:
+        generator = random.Random(count)
+        _permutations[count] = [
+            (generator.randrange(1, _PRIME), generator.randrange(_PRIME))
+            for _ in range(count)
+        ]
+    return _permutations[count]
+
+
+def _hash(feature):
+    digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % _PRIME
+
+
+def features(name, ingredient_ids):
+    words = _WORD_RE.findall(name.lower().replace("ё", "е"))
+    return {f"i:{pk}" for pk in ingredient_ids} | {f"w:{w}" for w in words}
+
+
+def signature(name, ingredient_ids):
+    """MinHash-сигнатура рецепта как array("Q")."""
+    config = _config()
+    hashed = [_hash(feature) for feature in features(name, ingredient_ids)]
+    if not hashed:
+        return array("Q", [_PRIME] * config["PERMUTATIONS"])
+    return array(
+        "Q",
+        (
+            min((a * x + b) % _PRIME for x in hashed)
+            for a, b in _coefficients(config["PERMUTATIONS"])
+        ),
+    )
+
+
+def unpack(data):
+    values = array("Q")
+    values.frombytes(bytes(data))
+    return values
+
+
+def similarity(first, second):
+    matches = sum(1 for a, b in zip(first, second) if a == b)
+    return matches / len(first)
+
+
+def band_keys(values):
+    config = _config()
+    width = len(values) // config["BANDS"]
+    keys = []
+    for band in range(config["BANDS"]):
+        chunk = values[band * width:(band + 1) * width].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+def check_on_create():
+    return _config()["CHECK_ON_CREATE"]
+
+
+def _ingredient_ids(recipe_ids):
+    grouped = defaultdict(list)
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list("recipe_id", "ingredient_id")
+    for recipe_id, ingredient_id in rows:
+        grouped[recipe_id].append(ingredient_id)
+    return grouped
+
+
+def store_signatures(recipes):
+    """Пересчитывает сигнатуры и полосы рецептов (объекты с id и name)."""
+    recipes = list(recipes)
+    ingredients = _ingredient_ids([recipe.id for recipe in recipes])
+    bands = []
+    for recipe in recipes:
+        values = signature(recipe.name, ingredients[recipe.id])
+        recipe.minhash = values.tobytes()
+        bands.extend(
+            RecipeSignatureBand(recipe_id=recipe.id, band=band, key=key)
+            for band, key in enumerate(band_keys(values))
+        )
+    Recipe.objects.bulk_update(recipes, ["minhash"])
+    RecipeSignatureBand.objects.filter(
+        recipe_id__in=[recipe.id for recipe in recipes]
+    ).delete()
+    RecipeSignatureBand.objects.bulk_create(bands)
+
+
+def find_similar(name, ingredient_ids, exclude=None, threshold=None):
+    """Рецепты, похожие на данный, как [(id, сходство)] по убыванию."""
+    if threshold is None:
+        threshold = _config()["THRESHOLD"]
+    values = signature(name, ingredient_ids)
+    condition = Q()
+    for band, key in enumerate(band_keys(values)):
+        condition |= Q(band=band, key=key)
+    recipe_ids = set(
+        RecipeSignatureBand.objects.filter(condition).values_list(
+            "recipe_id", flat=True
+        )
+    )
+    recipe_ids.discard(exclude)
+    found = []
+    rows = Recipe.objects.filter(pk__in=recipe_ids).values_list(
+        "id", "minhash"
+    )
+    for recipe_id, data in rows:
+        if data is None:
+            continue
+        score = similarity(values, unpack(data))
+        if score >= threshold:
+            found.append((recipe_id, score))
+    found.sort(key=lambda item: (-item[1], item[0]))
+    return found
+
+
+def duplicate_pairs(threshold=None, batch_size=2000):
+    """Все пары кандидатов со сходством не ниже порога.
+
+    Полосы читаются отсортированными по (band, key), поэтому корзины
+    LSH собираются потоком, а в памяти держатся только сигнатуры.
+    """
+    config = _config()
+    if threshold is None:
+        threshold = config["THRESHOLD"]
+    signatures = {
+        recipe_id: unpack(data)
+        for recipe_id, data in Recipe.objects.exclude(minhash=None)
+        .values_list("id", "minhash")
+        .iterator(chunk_size=batch_size)
+    }
+    rows = RecipeSignatureBand.objects.order_by(
+        "band", "key", "recipe_id"
+    ).values_list("band", "key", "recipe_id")
+
+    seen = set()
+    pairs = []
+
+    def flush(bucket):
+        if not 1 < len(bucket) <= config["MAX_BUCKET"]:
+            return
+        for i, first in enumerate(bucket):
+            for second in bucket[i + 1:]:
+                if (first, second) in seen:
+                    continue
+                seen.add((first, second))
+                score = similarity(signatures[first], signatures[second])
+                if score >= threshold:
+                    pairs.append((first, second, score))
+
+    current, bucket = None, []
+    for band, key, recipe_id in rows.iterator(chunk_size=batch_size):
+        if (band, key) != current:
+            flush(bucket)
+            current, bucket = (band, key), []
+        if recipe_id in signatures:
+            bucket.append(recipe_id)
+    flush(bucket)
+    pairs.sort(key=lambda pair: (-pair[2], pair[0], pair[1]))
+    return pairs
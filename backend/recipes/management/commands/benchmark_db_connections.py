@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from config.benchmark import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a fresh connection per request (CONN_MAX_AGE=0) with a "
+        "persistent connection, with and without health checks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        iterations = options["iterations"]
+        connection = connections[alias]
+        connection.close()
+
+        fresh = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            connection.ensure_connection()
+            self.query(connection)
+            connection.close()
+            fresh.append(time.perf_counter() - start)
+
+        persistent = []
+        connection.ensure_connection()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            self.query(connection)
+            persistent.append(time.perf_counter() - start)
+
+        checked = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            # То же, что делает CONN_HEALTH_CHECKS в начале запроса.
+            connection.is_usable()
+            self.query(connection)
+            checked.append(time.perf_counter() - start)
+        connection.close()
+
+        for name, durations in (
+            ("new connection per request", fresh),
+            ("persistent connection", persistent),
+            ("persistent + health check", checked),
+        ):
+            stats = summarize(durations)
+            self.stdout.write(
+                f"{name:28} p50={stats['p50_ms']}ms "
+                f"p95={stats['p95_ms']}ms mean={stats['mean_ms']}ms"
+            )
+        saved = summarize(fresh)["mean_ms"] - summarize(checked)["mean_ms"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Connection setup cost per request: {saved:.3f}ms "
+                f"({connection.vendor}, {alias})"
+            )
+        )
+
+    def query(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
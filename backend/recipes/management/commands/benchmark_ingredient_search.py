@@ -0,0 +1,111 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from config.benchmark import summarize
+from recipes.search import NgramIndex, ranked_queryset, search_limit
+from recipes.models import Ingredient
+
+QUERIES = ("молоко", "сах", "кокос", "мука пшеничная", "перец", "зе")
+TYPO_QUERIES = ("малоко", "сохар", "кокас")
+
+
+def scaled_catalogue(path, scale):
+    with open(path, encoding="utf-8") as source:
+        items = json.load(source)
+    rows = []
+    for copy in range(scale):
+        suffix = f" {copy}" if copy else ""
+        for item in items:
+            rows.append(
+                {
+                    "id": len(rows) + 1,
+                    "name": item["name"] + suffix,
+                    "measurement_unit": item["measurement_unit"],
+                }
+            )
+    return rows
+
+
+def linear_search(rows, query, limit):
+    """То, что делала бы СУБД без индекса: полный проход по строкам."""
+    def key(row):
+        return row["name"].lower()
+
+    query = query.lower()
+    prefix = [row for row in rows if row["name"].lower().startswith(query)]
+    rest = [
+        row for row in rows
+        if query in row["name"].lower()
+        and not row["name"].lower().startswith(query)
+    ]
+    return (sorted(prefix, key=key) + sorted(rest, key=key))[:limit]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the combined prefix/substring ingredient search and the "
+        "typo-tolerant mode on the ingredient catalogue scaled up N times"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default="../data/ingredients.json")
+        parser.add_argument("--scale", type=int, default=100)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument(
+            "--database",
+            action="store_true",
+            help="Also time ranked_queryset against the Ingredient table",
+        )
+
+    def handle(self, *args, **options):
+        rows = scaled_catalogue(options["file"], options["scale"])
+        start = time.perf_counter()
+        index = NgramIndex(rows)
+        self.stdout.write(
+            f"{len(rows)} rows, index built in "
+            f"{time.perf_counter() - start:.2f}s"
+        )
+        limit = search_limit()
+        iterations = options["iterations"]
+
+        for query in QUERIES:
+            expected = [row["id"] for row in linear_search(rows, query, limit)]
+            found = [row["id"] for row in index.search(query, limit)]
+            if found != expected:
+                self.stderr.write(f"results differ for {query!r}")
+            self.report(
+                f"search {query!r}",
+                linear=lambda: linear_search(rows, query, limit),
+                index=lambda: index.search(query, limit),
+                iterations=iterations,
+            )
+            if options["database"]:
+                queryset = ranked_queryset(Ingredient.objects.all(), query)
+                self.report(
+                    f"database {query!r}",
+                    database=lambda: list(queryset.values("id")[:limit]),
+                    iterations=iterations,
+                )
+
+        for query in TYPO_QUERIES:
+            self.report(
+                f"typo {query!r}",
+                index=lambda: index.similar(query, limit, 0.3),
+                iterations=iterations,
+            )
+
+    def report(self, name, iterations, **variants):
+        parts = []
+        for label, func in variants.items():
+            durations = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                func()
+                durations.append(time.perf_counter() - start)
+            stats = summarize(durations)
+            parts.append(
+                f"{label} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms"
+            )
+        self.stdout.write(f"{name:28} " + " | ".join(parts))
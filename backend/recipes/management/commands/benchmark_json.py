@@ -0,0 +1,137 @@
+import base64
+import io
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from config.benchmark import summarize
+from config.parsers import FastJSONParser
+from config.renderers import FastJSONRenderer, orjson
+
+
+def recipe_page(recipes, ingredients):
+    """Страница списка рецептов в форме ответа RecipeSerializer."""
+    author = {
+        "id": 1,
+        "username": "povar",
+        "first_name": "Анна",
+        "last_name": "Иванова",
+        "email": "anna@example.com",
+        "is_subscribed": True,
+        "avatar": "http://localhost/media/users/avatars/anna.png",
+    }
+    return {
+        "count": 1000,
+        "next": "http://localhost/api/recipes/?limit=6&offset=6",
+        "previous": None,
+        "results": [
+            {
+                "id": recipe_id,
+                "author": author,
+                "ingredients": [
+                    {
+                        "id": recipe_id * 100 + index,
+                        "name": f"Ингредиент номер {index}",
+                        "measurement_unit": "г",
+                        "amount": 50 + index,
+                    }
+                    for index in range(ingredients)
+                ],
+                "is_favorited": recipe_id % 2 == 0,
+                "is_in_shopping_cart": False,
+                "name": f"Рецепт {recipe_id}: суп с фрикадельками",
+                "image": (
+                    f"http://localhost/media/recipes/images/{recipe_id}.png"
+                ),
+                "text": "Нарезать, смешать и варить 20 минут. " * 20,
+                "cooking_time": 45,
+            }
+            for recipe_id in range(recipes)
+        ],
+    }
+
+
+def upload_body(image_kb):
+    """Тело POST /api/recipes/ с картинкой в base64."""
+    image = base64.b64encode(os.urandom(image_kb * 1024)).decode()
+    return json.dumps(
+        {
+            "ingredients": [{"id": 1, "amount": 10}, {"id": 2, "amount": 5}],
+            "image": f"data:image/png;base64,{image}",
+            "name": "Борщ",
+            "text": "Описание рецепта",
+            "cooking_time": 90,
+        },
+        ensure_ascii=False,
+    ).encode()
+
+
+def timed(func, iterations):
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the stdlib JSON renderer/parser with the orjson-backed "
+        "ones on recipe list pages and base64 image uploads"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--recipes", type=int, default=100)
+        parser.add_argument("--ingredients", type=int, default=12)
+        parser.add_argument("--image-kb", type=int, default=512)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(
+                self.style.WARNING(
+                    "orjson is not installed: the fast classes fall back "
+                    "to the stdlib, expect equal timings"
+                )
+            )
+        iterations = options["iterations"]
+        page = recipe_page(options["recipes"], options["ingredients"])
+        body = upload_body(options["image_kb"])
+
+        stdlib, fast = JSONRenderer(), FastJSONRenderer()
+        rendered = stdlib.render(page)
+        if fast.render(page) != rendered:
+            raise CommandError("Renderers produced different bytes")
+        slow_parser, fast_parser = JSONParser(), FastJSONParser()
+        if fast_parser.parse(io.BytesIO(body)) != slow_parser.parse(
+            io.BytesIO(body)
+        ):
+            raise CommandError("Parsers produced different data")
+
+        self.stdout.write(
+            f"recipe page: {len(rendered) // 1024} KiB, "
+            f"upload body: {len(body) // 1024} KiB"
+        )
+        cases = (
+            ("render page", stdlib, fast, lambda r: r.render(page)),
+            (
+                "parse upload",
+                slow_parser,
+                fast_parser,
+                lambda p: p.parse(io.BytesIO(body)),
+            ),
+        )
+        for name, slow, quick, run in cases:
+            before = timed(lambda: run(slow), iterations)
+            after = timed(lambda: run(quick), iterations)
+            speedup = before["mean_ms"] / max(after["mean_ms"], 1e-6)
+            self.stdout.write(
+                f"{name:13} stdlib p50={before['p50_ms']}ms "
+                f"p95={before['p95_ms']}ms | fast p50={after['p50_ms']}ms "
+                f"p95={after['p95_ms']}ms | x{speedup:.1f}"
+            )
@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from config.benchmark import HttpRunner, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure throughput of a running server under concurrent load, "
+        "e.g. WSGI (sync workers) against ASGI (uvicorn workers)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000")
+        parser.add_argument("--concurrency", type=int, nargs="+",
+                            default=[1, 16, 64])
+        parser.add_argument("--duration", type=float, default=10,
+                            help="Seconds per concurrency level")
+        parser.add_argument("--token", help="Authorization token")
+        parser.add_argument(
+            "--path", dest="paths", action="append",
+            help="Endpoint to request, may be repeated",
+        )
+        parser.add_argument("--label", default="",
+                            help="Name of the setup, e.g. wsgi or asgi")
+        parser.add_argument("--output", help="Append results to a JSON file")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or [
+            "/api/recipes/?limit=6",
+            "/api/ingredients/?name=%D0%B0",
+        ]
+        results = []
+        for concurrency in options["concurrency"]:
+            result = self.run_level(
+                options["base_url"], options["token"], paths,
+                concurrency, options["duration"],
+            )
+            result["label"] = options["label"]
+            results.append(result)
+            self.stdout.write(
+                f"{options['label']:8} c={concurrency:<4} "
+                f"rps={result['throughput_rps']:<8} "
+                f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                f"errors={result['errors']}"
+            )
+        if options["output"]:
+            try:
+                with open(options["output"], encoding="utf-8") as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                previous = []
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(previous + results, f, indent=2)
+
+    def run_level(self, base_url, token, paths, concurrency, duration):
+        durations = []
+        errors = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def worker(offset):
+            runner = HttpRunner(base_url, token)
+            index = offset
+            local_durations = []
+            local_errors = 0
+            while time.perf_counter() < deadline:
+                path = paths[index % len(paths)]
+                index += 1
+                try:
+                    status, elapsed, _ = runner.request("GET", path)
+                except OSError:
+                    local_errors += 1
+                    continue
+                if status >= 400:
+                    local_errors += 1
+                local_durations.append(elapsed)
+            with lock:
+                durations.extend(local_durations)
+                errors.append(local_errors)
+
+        threads = [
+            threading.Thread(target=worker, args=(offset,))
+            for offset in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            "concurrency": concurrency,
+            "requests": len(durations),
+            "errors": sum(errors),
+            "throughput_rps": round(len(durations) / elapsed, 1),
+            **summarize(durations),
+        }
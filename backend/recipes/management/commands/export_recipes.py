@@ -0,0 +1,38 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import export_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream all recipes with their ingredients to a JSONL file, one "
+        "recipe per line; authors and ingredients are referenced by "
+        "natural keys so the file can be loaded with import_recipes into "
+        "another database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output file, '-' for stdout")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options["path"] == "-":
+            # stdout занят данными, итог — в stderr.
+            count = export_recipes(
+                sys.stdout, chunk_size=options["chunk_size"]
+            )
+            report = self.stderr
+        else:
+            with open(options["path"], "w", encoding="utf-8") as out:
+                count = export_recipes(out, chunk_size=options["chunk_size"])
+            report = self.stdout
+        report.write(
+            self.style.SUCCESS(
+                f"Exported {count} recipes in "
+                f"{time.perf_counter() - start:.2f}s."
+            )
+        )
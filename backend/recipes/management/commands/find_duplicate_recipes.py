@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.duplicates import duplicate_pairs, store_signatures
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Find near-duplicate recipes by MinHash similarity of their "
+        "ingredient sets and names; candidate pairs come from LSH bands, "
+        "so the cost grows with the number of candidates, not N^2"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=None,
+            help="Minimum estimated Jaccard similarity "
+            "(default: RECIPE_MINHASH['THRESHOLD'])",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute signatures of all recipes, not only missing ones",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--limit", type=int, default=100, help="Pairs to print"
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        recipes = Recipe.objects.only("id", "name").order_by("id")
+        if not options["rebuild"]:
+            recipes = recipes.filter(minhash=None)
+        signed = 0
+        batch = []
+        for recipe in recipes.iterator(chunk_size=options["batch_size"]):
+            batch.append(recipe)
+            if len(batch) >= options["batch_size"]:
+                store_signatures(batch)
+                signed += len(batch)
+                batch = []
+        if batch:
+            store_signatures(batch)
+            signed += len(batch)
+        self.stdout.write(
+            f"Signed {signed} recipes in {time.perf_counter() - start:.2f}s."
+        )
+
+        start = time.perf_counter()
+        pairs = duplicate_pairs(
+            threshold=options["threshold"],
+            batch_size=options["batch_size"],
+        )
+        for first, second, score in pairs[:options["limit"]]:
+            self.stdout.write(f"{first}\t{second}\t{score:.2f}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Found {len(pairs)} near-duplicate pairs in "
+                f"{time.perf_counter() - start:.2f}s."
+            )
+        )
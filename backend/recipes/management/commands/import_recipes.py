@@ -0,0 +1,64 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import import_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        "Load recipes from a JSONL file written by export_recipes with "
+        "batched bulk inserts; recipes get new ids, missing ingredients "
+        "are created and recipes of unknown authors are skipped"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, '-' for stdin")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes inserting batches in parallel (PostgreSQL; "
+            "SQLite serialises writers anyway)",
+        )
+        parser.add_argument(
+            "--id-map",
+            help="Write 'old_id<TAB>new_id' lines to this file",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        id_map = None
+        if options["id_map"]:
+            id_map = open(options["id_map"], "w", encoding="utf-8")
+
+        def on_batch(pairs):
+            if id_map is not None:
+                id_map.writelines(f"{old}\t{new}\n" for old, new in pairs)
+
+        source = (
+            sys.stdin if options["path"] == "-"
+            else open(options["path"], encoding="utf-8")
+        )
+        try:
+            imported, skipped = import_recipes(
+                source,
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+                on_batch=on_batch,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if id_map is not None:
+                id_map.close()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported} recipes, skipped {skipped} of "
+                f"unknown authors in {time.perf_counter() - start:.2f}s."
+            )
+        )
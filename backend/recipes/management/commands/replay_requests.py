@@ -0,0 +1,232 @@
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import Resolver404, resolve
+from rest_framework.authtoken.models import Token
+
+from config.benchmark import (
+    HttpRunner,
+    InProcessRunner,
+    percentile,
+    quiet_sql_logging,
+)
+from config.metrics import route_label
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Replay a JSONL request log and report per-endpoint latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "log",
+            help=(
+                "JSONL file, one request per line: "
+                '{"method", "path", "status", "body", "user", "headers"}'
+            ),
+        )
+        parser.add_argument("--base-url",
+                            help="Replay against a running server")
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--rate", type=float, default=0,
+                            help="Requests per second, 0 means unlimited")
+        parser.add_argument("--limit", type=int,
+                            help="Replay only the first N requests")
+        parser.add_argument("--output", help="Save the report as JSON")
+
+    def handle(self, *args, **options):
+        quiet_sql_logging()
+        entries, skipped = self.read_log(options["log"], options["limit"])
+        if not entries:
+            raise CommandError("The log contains no replayable requests.")
+        self.tokens = self.resolve_tokens(entries)
+        self.base_url = options["base_url"]
+
+        self.results = []
+        self.results_lock = threading.Lock()
+        self.schedule_lock = threading.Lock()
+        self.next_index = 0
+        self.entries = entries
+        self.rate = options["rate"]
+
+        self.started = time.perf_counter()
+        concurrency = max(1, options["concurrency"])
+        if concurrency == 1:
+            self.worker(close_connections=False)
+        else:
+            threads = [
+                threading.Thread(target=self.worker)
+                for _ in range(concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - self.started
+
+        report = self.build_report(elapsed, skipped)
+        self.print_report(report)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    def read_log(self, path, limit):
+        entries = []
+        skipped = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if limit is not None and len(entries) >= limit:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if not isinstance(entry, dict) or "path" not in entry:
+                    skipped += 1
+                    continue
+                entry["method"] = entry.get("method", "GET").upper()
+                entry["endpoint"] = self.endpoint(
+                    entry["method"], entry["path"]
+                )
+                entries.append(entry)
+        return entries, skipped
+
+    def endpoint(self, method, path):
+        try:
+            match = resolve(urlsplit(path).path)
+        except Resolver404:
+            return "unmatched"
+        return route_label(match.func, method)
+
+    def resolve_tokens(self, entries):
+        # В логах нет секретов, только email пользователя; токены
+        # выдаются локально перед прогоном.
+        emails = {entry["user"] for entry in entries if entry.get("user")}
+        tokens = {}
+        for user in User.objects.filter(email__in=emails):
+            tokens[user.email] = Token.objects.get_or_create(user=user)[0].key
+        missing = emails - tokens.keys()
+        if missing:
+            self.stderr.write(
+                f"Unknown users, replayed anonymously: {len(missing)}"
+            )
+        return tokens
+
+    def make_runner(self):
+        if self.base_url:
+            return HttpRunner(self.base_url)
+        return InProcessRunner()
+
+    def next_entry(self):
+        with self.schedule_lock:
+            if self.next_index >= len(self.entries):
+                return None
+            index = self.next_index
+            self.next_index += 1
+        if self.rate:
+            delay = self.started + index / self.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return self.entries[index]
+
+    def worker(self, close_connections=True):
+        runner = self.make_runner()
+        try:
+            while True:
+                entry = self.next_entry()
+                if entry is None:
+                    break
+                headers = dict(entry.get("headers") or {})
+                token = self.tokens.get(entry.get("user"))
+                if token:
+                    headers["Authorization"] = f"Token {token}"
+                status, duration, queries = runner.request(
+                    entry["method"],
+                    entry["path"],
+                    data=entry.get("body"),
+                    headers=headers,
+                )
+                with self.results_lock:
+                    self.results.append(
+                        (entry, status, duration, queries)
+                    )
+        finally:
+            if close_connections:
+                connections.close_all()
+
+    def build_report(self, elapsed, skipped):
+        endpoints = {}
+        for entry, status, duration, queries in self.results:
+            stats = endpoints.setdefault(
+                entry["endpoint"],
+                {"durations": [], "queries": [], "mismatches": []},
+            )
+            stats["durations"].append(duration)
+            if queries is not None:
+                stats["queries"].append(queries)
+            expected = entry.get("status")
+            if expected is not None and expected != status:
+                stats["mismatches"].append(
+                    {
+                        "method": entry["method"],
+                        "path": entry["path"],
+                        "expected": expected,
+                        "actual": status,
+                    }
+                )
+
+        summary = {}
+        for name, stats in sorted(endpoints.items()):
+            durations = stats["durations"]
+            queries = stats["queries"]
+            summary[name] = {
+                "requests": len(durations),
+                "p50_ms": round(percentile(durations, 0.5) * 1000, 3),
+                "p95_ms": round(percentile(durations, 0.95) * 1000, 3),
+                "p99_ms": round(percentile(durations, 0.99) * 1000, 3),
+                "max_ms": round(max(durations) * 1000, 3),
+                "queries_per_request": (
+                    round(sum(queries) / len(queries), 2)
+                    if queries else None
+                ),
+                "status_mismatches": len(stats["mismatches"]),
+                "mismatch_samples": stats["mismatches"][:5],
+            }
+        return {
+            "requests": len(self.results),
+            "skipped_lines": skipped,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(self.results) / elapsed, 2),
+            "endpoints": summary,
+        }
+
+    def print_report(self, report):
+        for name, stats in report["endpoints"].items():
+            self.stdout.write(
+                f"{name:40} n={stats['requests']:<6} "
+                f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms "
+                f"p99={stats['p99_ms']}ms "
+                f"queries={stats['queries_per_request']} "
+                f"mismatches={stats['status_mismatches']}"
+            )
+        mismatches = sum(
+            stats["status_mismatches"]
+            for stats in report["endpoints"].values()
+        )
+        style = self.style.SUCCESS if not mismatches else self.style.WARNING
+        self.stdout.write(
+            style(
+                f"Replayed {report['requests']} requests in "
+                f"{report['elapsed_s']}s "
+                f"({report['throughput_rps']} rps), "
+                f"status mismatches: {mismatches}."
+            )
+        )
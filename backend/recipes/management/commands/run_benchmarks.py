@@ -0,0 +1,117 @@
+import json
+import os
+from urllib.parse import quote
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from config.benchmark import (
+    HttpRunner,
+    InProcessRunner,
+    peak_rss_kb,
+    quiet_sql_logging,
+    run_scenario,
+)
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Measure latency and query counts of the key API endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--output", default="benchmarks/baseline.json")
+        parser.add_argument(
+            "--base-url",
+            help="Benchmark a running server instead of the test client",
+        )
+        parser.add_argument(
+            "--email",
+            help="User to authenticate as (defaults to the most active one)",
+        )
+        parser.add_argument(
+            "--only", nargs="*", help="Run only the named scenarios"
+        )
+
+    def handle(self, *args, **options):
+        quiet_sql_logging()
+        user = self.get_user(options["email"])
+        token, _ = Token.objects.get_or_create(user=user)
+        if options["base_url"]:
+            runner = HttpRunner(options["base_url"], token.key)
+        else:
+            runner = InProcessRunner(token.key)
+
+        results = {}
+        for name, path in self.get_scenarios(user).items():
+            if options["only"] and name not in options["only"]:
+                continue
+            results[name] = run_scenario(
+                runner, path, options["iterations"], options["warmup"]
+            )
+            self.stdout.write(
+                f"{name:28} p50={results[name]['p50_ms']}ms "
+                f"p95={results[name]['p95_ms']}ms "
+                f"queries={results[name]['queries_per_request']}"
+            )
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "mode": runner.mode,
+            "user": user.email,
+            "recipes": Recipe.objects.count(),
+            "peak_rss_kb": peak_rss_kb() if not options["base_url"] else None,
+            "scenarios": results,
+        }
+        directory = os.path.dirname(options["output"])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f"Results saved to {options['output']}.")
+        )
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+        else:
+            user = (
+                User.objects.filter(shopping_cart__isnull=False)
+                .order_by("id")
+                .first()
+            )
+        if user is None:
+            raise CommandError(
+                "No suitable user found, run seed_benchmark_data first."
+            )
+        return user
+
+    def get_scenarios(self, user):
+        recipe = Recipe.objects.order_by("id").first()
+        ingredient = Ingredient.objects.order_by("id").first()
+        if recipe is None or ingredient is None:
+            raise CommandError("No recipes or ingredients to benchmark.")
+        prefix = quote(ingredient.name[:2])
+        return {
+            "recipe_list": "/api/recipes/?limit=6",
+            "recipe_list_page_100": "/api/recipes/?limit=6&offset=600",
+            "recipe_list_favorited": "/api/recipes/?is_favorited=1",
+            "recipe_list_not_favorited": "/api/recipes/?is_favorited=0",
+            "recipe_list_in_cart": "/api/recipes/?is_in_shopping_cart=1",
+            "recipe_list_by_author": (
+                f"/api/recipes/?author={recipe.author_id}"
+            ),
+            "recipe_detail": f"/api/recipes/{recipe.id}/",
+            "ingredient_list": "/api/ingredients/",
+            "ingredient_search": f"/api/ingredients/?name={prefix}",
+            "subscriptions": (
+                "/api/users/subscriptions/?limit=6&recipes_limit=3"
+            ),
+            "download_shopping_cart": (
+                "/api/recipes/download_shopping_cart/"
+            ),
+        }
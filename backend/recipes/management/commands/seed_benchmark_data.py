@@ -0,0 +1,173 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.catalogue import bump_catalogue_version
+from recipes.popularity import refresh_popularity
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from users.models import Subscription, User
+
+USERNAME_PREFIX = "bench_user_"
+IMAGE_NAME = "recipes/images/benchmark.png"
+# Прозрачный PNG 1x1: все синтетические рецепты ссылаются на один файл.
+PNG_PIXEL = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d00000000"
+    "49454e44ae426082"
+)
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users, recipes and relations for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument("--ingredients", type=int, default=2000,
+                            help="Minimum size of the ingredient catalogue")
+        parser.add_argument("--ingredients-per-recipe", type=int, default=8)
+        parser.add_argument("--favorites-per-user", type=int, default=20)
+        parser.add_argument("--cart-per-user", type=int, default=5)
+        parser.add_argument("--subscriptions-per-user", type=int, default=10)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--clear", action="store_true",
+                            help="Delete previously generated data first")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+
+        if options["clear"]:
+            deleted, _ = User.objects.filter(
+                username__startswith=USERNAME_PREFIX
+            ).delete()
+            self.stdout.write(f"Deleted {deleted} objects.")
+
+        if not default_storage.exists(IMAGE_NAME):
+            default_storage.save(IMAGE_NAME, ContentFile(PNG_PIXEL))
+
+        ingredient_ids = self.seed_ingredients(options["ingredients"])
+        user_ids = self.seed_users(options["users"])
+        recipe_ids = self.seed_recipes(
+            options["recipes"],
+            user_ids,
+            ingredient_ids,
+            options["ingredients_per_recipe"],
+        )
+        self.seed_relations(
+            Favorite, "recipe_id", user_ids, recipe_ids,
+            options["favorites_per_user"],
+        )
+        self.seed_relations(
+            ShoppingCart, "recipe_id", user_ids, recipe_ids,
+            options["cart_per_user"],
+        )
+        self.seed_relations(
+            Subscription, "author_id", user_ids, user_ids,
+            options["subscriptions_per_user"],
+        )
+        # Связи созданы bulk_create, сигналы популярности не сработали.
+        refresh_popularity(batch_size=self.batch_size)
+        self.stdout.write(self.style.SUCCESS("Benchmark data generated."))
+
+    def seed_ingredients(self, minimum):
+        existing = Ingredient.objects.count()
+        if existing < minimum:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(
+                        name=f"ингредиент {index}", measurement_unit="г"
+                    )
+                    for index in range(existing, minimum)
+                ),
+                batch_size=self.batch_size,
+            )
+            # bulk_create не шлёт post_save.
+            bump_catalogue_version()
+        return list(Ingredient.objects.values_list("id", flat=True))
+
+    def seed_users(self, count):
+        password = make_password("benchmark")
+        start = User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).count()
+        users = [
+            User(
+                username=f"{USERNAME_PREFIX}{index}",
+                email=f"{USERNAME_PREFIX}{index}@example.com",
+                first_name="Bench",
+                last_name=str(index),
+                password=password,
+            )
+            for index in range(start, start + count)
+        ]
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+        self.stdout.write(f"Users: {count}")
+        return list(
+            User.objects.filter(
+                username__startswith=USERNAME_PREFIX
+            ).values_list("id", flat=True)
+        )
+
+    def seed_recipes(self, count, user_ids, ingredient_ids, per_recipe):
+        per_recipe = min(per_recipe, len(ingredient_ids))
+        recipe_ids = []
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(
+                        author_id=self.rng.choice(user_ids),
+                        name=f"Рецепт {offset + index}",
+                        image=IMAGE_NAME,
+                        text="Синтетический рецепт для нагрузочных тестов.",
+                        cooking_time=self.rng.randint(1, 180),
+                    )
+                    for index in range(size)
+                )
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe_id=recipe.pk,
+                        ingredient_id=ingredient_id,
+                        amount=self.rng.randint(1, 500),
+                    )
+                    for recipe in recipes
+                    for ingredient_id in self.rng.sample(
+                        ingredient_ids, per_recipe
+                    )
+                )
+            recipe_ids.extend(recipe.pk for recipe in recipes)
+            self.stdout.write(f"Recipes: {offset + size}/{count}")
+        return recipe_ids
+
+    def seed_relations(self, model, target_field, user_ids, target_ids,
+                       per_user):
+        per_user = min(per_user, len(target_ids))
+        if not per_user:
+            return
+        batch = []
+        for user_id in user_ids:
+            for target_id in self.rng.sample(target_ids, per_user):
+                if model is Subscription and target_id == user_id:
+                    continue
+                batch.append(
+                    model(user_id=user_id, **{target_field: target_id})
+                )
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+        self.stdout.write(
+            f"{model._meta.verbose_name_plural}: {per_user} per user"
+        )
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+INDEX_NAME = "recipes_ingredient_name_trgm"
+
+
+def create_trigram_index(apps, schema_editor):
+    # Только PostgreSQL: на остальных СУБД поиск идёт по индексу в памяти
+    # (recipes.search). Выражение совпадает с тем, что Django строит для
+    # icontains/istartswith.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient "
+        "USING gin (UPPER(name::text) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0004_rename_title_recipe_name_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0005_ingredient_name_trgm"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="favorite",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="Добавлено"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="popularity",
+            field=models.FloatField(
+                db_index=True,
+                default=0,
+                editable=False,
+                verbose_name="Популярность",
+            ),
+        ),
+        migrations.AddField(
+            model_name="shoppingcart",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="Добавлено"
+            ),
+        ),
+    ]
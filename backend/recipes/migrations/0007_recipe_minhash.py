@@ -0,0 +1,59 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0006_recipe_popularity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="minhash",
+            field=models.BinaryField(
+                null=True, verbose_name="Сигнатура MinHash"
+            ),
+        ),
+        migrations.CreateModel(
+            name="RecipeSignatureBand",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "band",
+                    models.PositiveSmallIntegerField(verbose_name="Полоса"),
+                ),
+                ("key", models.BigIntegerField(verbose_name="Хэш полосы")),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="signature_bands",
+                        to="recipes.recipe",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Полоса сигнатуры",
+                "verbose_name_plural": "Полосы сигнатур",
+                "indexes": [
+                    models.Index(
+                        fields=["band", "key"],
+                        name="recipes_rec_band_186615_idx",
+                    )
+                ],
+                "unique_together": {("recipe", "band")},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.17 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0007_recipe_minhash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="views",
+            field=models.PositiveBigIntegerField(
+                default=0, editable=False, verbose_name="Просмотры"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="view_score",
+            field=models.FloatField(
+                default=0,
+                editable=False,
+                verbose_name="Вклад просмотров в популярность",
+            ),
+        ),
+    ]
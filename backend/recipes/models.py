@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Ingredient(models.Model):
@@ -43,6 +44,33 @@ class Recipe(models.Model):
     cooking_time = models.PositiveIntegerField(
         verbose_name="Время приготовления (мин)"
     )
+    # Сумма весов добавлений в избранное и корзину и просмотров с
+    # затуханием по времени (см. recipes.popularity).
+    popularity = models.FloatField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name="Популярность",
+    )
+    # Просмотры и их вклад в popularity; пишутся пачками
+    # (см. recipes.views_counter).
+    views = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Просмотры",
+    )
+    view_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name="Вклад просмотров в популярность",
+    )
+    # MinHash-сигнатура по ингредиентам и названию: массив uint64
+    # (см. recipes.duplicates).
+    minhash = models.BinaryField(
+        null=True,
+        editable=False,
+        verbose_name="Сигнатура MinHash",
+    )
 
     class Meta:
         verbose_name = "Рецепт"
@@ -79,6 +107,9 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name="favorited_by"
     )
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Добавлено"
+    )
 
     class Meta:
         unique_together = ("user", "recipe")
@@ -97,8 +128,29 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name="in_shopping_cart"
     )
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Добавлено"
+    )
 
     class Meta:
         unique_together = ("user", "recipe")
         verbose_name = "Список покупок"
         verbose_name_plural = "Списки покупок"
+
+
+class RecipeSignatureBand(models.Model):
+    """Полоса MinHash-сигнатуры рецепта для поиска кандидатов (LSH)."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="signature_bands"
+    )
+    band = models.PositiveSmallIntegerField(verbose_name="Полоса")
+    key = models.BigIntegerField(verbose_name="Хэш полосы")
+
+    class Meta:
+        unique_together = ("recipe", "band")
+        indexes = [models.Index(fields=["band", "key"])]
+        verbose_name = "Полоса сигнатуры"
+        verbose_name_plural = "Полосы сигнатур"
@@ -0,0 +1,121 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from .models import Favorite, Recipe, ShoppingCart
+
+# Популярность рецепта — сумма весов добавлений в избранное и корзину,
+# где вес затухает с периодом полураспада HALF_LIFE_DAYS. Чтобы не
+# пересчитывать все очки с течением времени, используется «прямое»
+# затухание: событие в момент t весит w * exp(λ(t - EPOCH)). Порядок
+# рецептов при этом тот же, что у w * exp(-λ(now - t)), а новые события
+# просто прибавляются к столбцу. Просмотры учитываются так же, пачками
+# (recipes.views_counter). Сигналы поддерживают столбец между
+# запусками refresh_recipe_popularity, который пересчитывает его
+# целиком и исправляет накопленную погрешность.
+#
+# Экспонента растёт: при полураспаде в 7 дней до переполнения float
+# около 19 лет. Задолго до этого EPOCH надо сдвинуть и пересчитать.
+
+DEFAULTS = {
+    "HALF_LIFE_DAYS": 7,
+    "FAVORITE_WEIGHT": 1.0,
+    "CART_WEIGHT": 0.5,
+    "VIEW_WEIGHT": 0.05,
+    "EPOCH": "2024-01-01",
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "RECIPE_POPULARITY", {})}
+
+
+def _weight(model):
+    config = _config()
+    if model is Favorite:
+        return config["FAVORITE_WEIGHT"]
+    return config["CART_WEIGHT"]
+
+
+def view_weight():
+    return _config()["VIEW_WEIGHT"]
+
+
+def decay_factor(when):
+    config = _config()
+    epoch = datetime.fromisoformat(config["EPOCH"])
+    if timezone.is_aware(when):
+        epoch = epoch.replace(tzinfo=dt_timezone.utc)
+    rate = math.log(2) / (config["HALF_LIFE_DAYS"] * 86400)
+    return math.exp(rate * (when - epoch).total_seconds())
+
+
+def _apply(deltas):
+    # Один UPDATE на все затронутые рецепты.
+    Recipe.objects.filter(pk__in=deltas).update(
+        popularity=F("popularity")
+        + Case(
+            *(
+                When(pk=recipe_id, then=Value(delta))
+                for recipe_id, delta in deltas.items()
+            ),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
+
+
+def record(model, relations, sign=1):
+    """Учитывает добавленные (sign=1) или удалённые (-1) связи."""
+    weight = _weight(model) * sign
+    deltas = defaultdict(float)
+    for relation in relations:
+        deltas[relation.recipe_id] += weight * decay_factor(
+            relation.created_at
+        )
+    if deltas:
+        # После фиксации транзакции, чтобы откат не оставил лишних очков.
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def forget_user(user):
+    """Снимает вклад всех связей удаляемого пользователя одним UPDATE."""
+    deltas = defaultdict(float)
+    for model in (Favorite, ShoppingCart):
+        weight = -_weight(model)
+        rows = model.objects.filter(user=user).values_list(
+            "recipe_id", "created_at"
+        )
+        for recipe_id, created_at in rows:
+            deltas[recipe_id] += weight * decay_factor(created_at)
+    if deltas:
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def refresh_popularity(batch_size=1000):
+    """Пересчитывает столбец по всем связям; возвращает число изменений."""
+    scores = defaultdict(float)
+    for model in (Favorite, ShoppingCart):
+        weight = _weight(model)
+        rows = model.objects.values_list("recipe_id", "created_at")
+        for recipe_id, created_at in rows.iterator(chunk_size=batch_size):
+            scores[recipe_id] += weight * decay_factor(created_at)
+
+    changed = []
+    current = Recipe.objects.only("id", "popularity", "view_score")
+    for recipe in current.iterator(chunk_size=batch_size):
+        # Время отдельных просмотров не хранится, их вклад с затуханием
+        # копится в view_score (см. recipes.views_counter).
+        score = scores.get(recipe.id, 0.0) + recipe.view_score
+        if not math.isclose(recipe.popularity, score, rel_tol=1e-9):
+            recipe.popularity = score
+            changed.append(recipe)
+    Recipe.objects.bulk_update(
+        changed, ["popularity"], batch_size=batch_size
+    )
+    return len(changed)
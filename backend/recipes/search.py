@@ -0,0 +1,253 @@
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import (
+    BooleanField, Case, F, FloatField, Func, IntegerField, Value, When,
+)
+
+from .catalogue import catalogue_version, ingredient_catalogue
+from .models import Ingredient
+
+# Поиск ингредиентов: сначала совпадения по началу названия, затем по
+# подстроке, в каждой группе — по алфавиту. На PostgreSQL его обслуживает
+# GIN-индекс pg_trgm (миграция 0005), на остальных СУБД и в режиме
+# INGREDIENT_SEARCH_BACKEND="memory" — n-граммный индекс в памяти,
+# построенный по кэшированному справочнику. Режим опечаток (?typo=1)
+# ищет по сходству триграмм, как similarity() из pg_trgm: на PostgreSQL
+# кандидатов отбирает оператор % по тому же индексу, а его порог
+# pg_trgm.similarity_threshold выставляется в транзакции запроса
+# (similarity_limit).
+
+FIELDS = ("id", "name", "measurement_unit")
+_WORD_RE = re.compile(r"\w+")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def search_limit():
+    return _setting("INGREDIENT_SEARCH_LIMIT", 50)
+
+
+def similarity_threshold():
+    return _setting("INGREDIENT_SIMILARITY_THRESHOLD", 0.3)
+
+
+def use_memory_index():
+    backend = _setting("INGREDIENT_SEARCH_BACKEND", "auto")
+    if backend == "auto":
+        return connection.vendor != "postgresql"
+    return backend == "memory"
+
+
+def word_trigrams(text):
+    # Как pg_trgm: каждое слово дополняется двумя пробелами слева и
+    # одним справа.
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NgramIndex:
+    """Индекс справочника для поиска по префиксу, подстроке и сходству.
+
+    Строки хранятся отсортированными по названию, поэтому префиксы
+    находятся бинарным поиском, а списки вхождений триграмм (номера строк
+    по возрастанию) сразу дают результат в алфавитном порядке.
+    """
+
+    def __init__(self, rows):
+        self.rows = sorted(
+            rows, key=lambda row: (row["name"].lower(), row["id"])
+        )
+        self.keys = [row["name"].lower() for row in self.rows]
+        substrings = defaultdict(lambda: array("I"))
+        words = defaultdict(lambda: array("I"))
+        self.word_counts = array("I")
+        for position, key in enumerate(self.keys):
+            for gram in {key[i:i + 3] for i in range(len(key) - 2)}:
+                substrings[gram].append(position)
+            grams = word_trigrams(key)
+            for gram in grams:
+                words[gram].append(position)
+            self.word_counts.append(len(grams))
+        self.substrings = dict(substrings)
+        self.words = dict(words)
+
+    def search(self, query, limit):
+        query = query.lower()
+        found = []
+        position = bisect_left(self.keys, query)
+        while (
+            len(found) < limit
+            and position < len(self.keys)
+            and self.keys[position].startswith(query)
+        ):
+            found.append(position)
+            position += 1
+        if len(found) >= limit:
+            return [self.rows[i] for i in found]
+
+        prefixed = set(found)
+        for candidate in self._substring_candidates(query):
+            if candidate in prefixed or query not in self.keys[candidate]:
+                continue
+            found.append(candidate)
+            if len(found) >= limit:
+                break
+        return [self.rows[i] for i in found]
+
+    def _substring_candidates(self, query):
+        if len(query) < 3:
+            return range(len(self.keys))
+        postings = []
+        for i in range(len(query) - 2):
+            posting = self.substrings.get(query[i:i + 3])
+            if posting is None:
+                return ()
+            postings.append(posting)
+        # Самый редкий список вхождений — остальное проверит подстрока.
+        return min(postings, key=len)
+
+    def similar(self, query, limit, threshold):
+        grams = word_trigrams(query)
+        if not grams:
+            return []
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.words.get(gram, ()))
+        scored = []
+        for position, common in shared.items():
+            total = len(grams) + self.word_counts[position] - common
+            score = common / total
+            if score >= threshold:
+                scored.append((-score, position))
+        scored.sort()
+        return [self.rows[position] for _, position in scored[:limit]]
+
+
+_index = None
+_index_version = None
+_index_built = None
+_index_checked = 0.0
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Индекс по текущему справочнику.
+
+    Версия справочника живёт в кэше процесса и не видит изменений из
+    других воркеров и команд, поэтому раз в
+    INGREDIENT_INDEX_CHECK_INTERVAL секунд индекс сверяется с отметкой
+    "built" самого справочника и перестраивается, если тот пересобран.
+    """
+    global _index, _index_version, _index_built, _index_checked
+    version = catalogue_version()
+    interval = _setting("INGREDIENT_INDEX_CHECK_INTERVAL", 5)
+    if (
+        _index_version != version
+        or time.monotonic() - _index_checked >= interval
+    ):
+        with _index_lock:
+            if (
+                _index_version != version
+                or time.monotonic() - _index_checked >= interval
+            ):
+                payload = ingredient_catalogue()
+                built = payload.get("built")
+                if _index is None or built is None or built != _index_built:
+                    _index = NgramIndex(payload["data"])
+                    _index_built = built
+                _index_version = version
+                _index_checked = time.monotonic()
+    return _index
+
+
+class Similarity(Func):
+    function = "SIMILARITY"
+    output_field = FloatField()
+
+
+class IndexedName(Func):
+    # Выражение GIN-индекса из миграции 0005.
+    template = "UPPER(%(expressions)s::text)"
+
+
+class TrigramMatch(Func):
+    # Оператор % pg_trgm; %% — экранирование для драйвера.
+    template = "%(expressions)s"
+    arg_joiner = " %% "
+    output_field = BooleanField()
+
+
+@contextmanager
+def similarity_limit(using, threshold=None):
+    """Порог оператора % на время транзакции (только PostgreSQL)."""
+    if connections[using].vendor != "postgresql":
+        yield
+        return
+    if threshold is None:
+        threshold = similarity_threshold()
+    # set_config(..., true) действует до конца транзакции: за pgbouncer
+    # сессионный SET мог бы остаться на чужом серверном соединении.
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+                [str(threshold)],
+            )
+        yield
+
+
+def ranked_queryset(queryset, query):
+    # icontains/istartswith на PostgreSQL — UPPER(name::text) LIKE ...,
+    # ровно выражение GIN-индекса из миграции 0005.
+    return (
+        queryset.filter(name__icontains=query)
+        .annotate(
+            prefix_rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by("prefix_rank", "name")
+    )
+
+
+def similar_queryset(queryset, query):
+    # Вычислять внутри similarity_limit: порог берётся оттуда, а
+    # SIMILARITY нужна только для сортировки.
+    return (
+        queryset.filter(TrigramMatch(IndexedName(F("name")), Value(query)))
+        .annotate(similarity=Similarity("name", Value(query)))
+        .order_by("-similarity", "name")
+    )
+
+
+def search_ingredients(query, limit=None, typo=False):
+    """Найденные ингредиенты как словари id/name/measurement_unit."""
+    if limit is None:
+        limit = search_limit()
+    if use_memory_index():
+        index = get_index()
+        if typo:
+            return index.similar(query, limit, similarity_threshold())
+        return index.search(query, limit)
+    queryset = Ingredient.objects.all()
+    if not typo:
+        queryset = ranked_queryset(queryset, query)
+        return list(queryset.values(*FIELDS)[:limit])
+    queryset = similar_queryset(queryset, query)
+    with similarity_limit(queryset.db):
+        return list(queryset.values(*FIELDS)[:limit])
@@ -8,6 +8,9 @@ from .models import (
     Favorite,
     ShoppingCart,
 )
+from config.pagination import bump_count_generation
+from config.sparse import SparseFieldsMixin
+from . import duplicates
 from users.serializers import UserSerializer
 from .omp_photo import Base64ImageField
 
@@ -33,7 +36,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "measurement_unit", "amount"]
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         many=True, source="recipeingredient_set"
@@ -51,6 +54,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         ]
 
     def get_is_favorited(self, obj):
+        annotated = getattr(obj, "is_favorited", None)
+        if annotated is not None:
+            return annotated
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             return Favorite.objects.filter(
@@ -59,6 +65,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        annotated = getattr(obj, "is_in_shopping_cart", None)
+        if annotated is not None:
+            return annotated
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             return ShoppingCart.objects.filter(
@@ -74,17 +83,29 @@ class RecipeSerializer(serializers.ModelSerializer):
                 {"ingredients": "Поле 'ingredients' не может быть пустым."}
             )
 
+        if duplicates.check_on_create():
+            similar = duplicates.find_similar(
+                validated_data.get("name", ""),
+                [ingr["id"].pk for ingr in ingredients_data],
+            )
+            if similar:
+                raise ValidationError(
+                    {"non_field_errors": "Похожий рецепт уже есть "
+                     f"(id {similar[0][0]})."}
+                )
+
         validated_data.pop("author", None)
         recipe = Recipe.objects.create(
             author=self.context["request"].user, **validated_data
         )
 
         try:
-            self._save_ingredients(recipe, ingredients_data)
+            self._save_ingredients(recipe, ingredients_data, new=True)
         except ValidationError as e:
             recipe.delete()
             raise e
 
+        duplicates.store_signatures([recipe])
         return recipe
 
     def update(self, instance, validated_data):
@@ -93,34 +114,51 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         ingredients_data = validated_data.pop("recipeingredient_set", None)
 
-        instance.name = validated_data.get("name", instance.name)
-        instance.text = validated_data.get("text", instance.text)
-        instance.cooking_time = validated_data.get(
-            "cooking_time", instance.cooking_time
-        )
-
+        # Счётчики (views, view_score, popularity) пишутся отдельными
+        # UPDATE в обход модели: сохраняем только изменившиеся колонки,
+        # иначе их старые значения из памяти затрут свежие. Без изменений
+        # save() не вызывается — post_save сдвинул бы поколение рецептов.
+        fields = [
+            field
+            for field in ("name", "text", "cooking_time")
+            if field in validated_data
+            and validated_data[field] != getattr(instance, field)
+        ]
+        for field in fields:
+            setattr(instance, field, validated_data[field])
         if "image" in validated_data:
             instance.image = validated_data["image"]
+            fields.append("image")
+        if fields:
+            instance.save(update_fields=fields)
+        renamed = "name" in fields
 
-        instance.save()
-
+        changed = False
         if ingredients_data is not None:
             if not ingredients_data:
                 raise ValidationError(
                     {"ingredients": "Поле 'ingredients' не может быть пустым."}
                 )
-            instance.recipeingredient_set.all().delete()
-            self._save_ingredients(instance, ingredients_data)
+            changed = self._save_ingredients(instance, ingredients_data)
+        if changed or renamed or instance.minhash is None:
+            duplicates.store_signatures([instance])
 
         return instance
 
-    def _save_ingredients(self, recipe, ingredients_data):
-        seen_ingredients = set()
+    def _save_ingredients(self, recipe, ingredients_data, new=False):
+        """Приводит ингредиенты рецепта к переданным по разнице.
+
+        Меняются только изменившиеся строки: новые вставляются одним
+        bulk_create, исчезнувшие удаляются одним DELETE, а у оставшихся
+        обновляется количество. new=True — у рецепта ещё нет строк.
+        Возвращает True, если что-то изменилось.
+        """
+        submitted = {}
         for ingr in ingredients_data:
             ingredient_obj = ingr["id"]
             amount = ingr["amount"]
 
-            if ingredient_obj in seen_ingredients:
+            if ingredient_obj.pk in submitted:
                 raise ValidationError(
                     {"ingredients": "Дубликаты запрещены."}
                 )
@@ -131,12 +169,44 @@ class RecipeSerializer(serializers.ModelSerializer):
                      "должно быть хотя бы 1."}
                 )
 
-            seen_ingredients.add(ingredient_obj)
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredient=ingredient_obj,
-                amount=amount
+            submitted[ingredient_obj.pk] = amount
+
+        stored = {}
+        if not new:
+            rows = RecipeIngredient.objects.filter(recipe=recipe).only(
+                "id", "ingredient_id", "amount"
             )
+            stored = {row.ingredient_id: row for row in rows}
+        removed = [
+            row.pk for ingredient_id, row in stored.items()
+            if ingredient_id not in submitted
+        ]
+        changed = []
+        added = []
+        for ingredient_id, amount in submitted.items():
+            row = stored.get(ingredient_id)
+            if row is None:
+                added.append(
+                    RecipeIngredient(
+                        recipe=recipe,
+                        ingredient_id=ingredient_id,
+                        amount=amount,
+                    )
+                )
+            elif row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        if removed or changed or added:
+            bump_count_generation(RecipeIngredient)
+            return True
+        return False
 
     def validate_recipeingredient_set(self, value):
         if not value:
@@ -0,0 +1,70 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from config import sync
+from config.bulk import is_bulk_delete
+from config.pagination import bump_count_generation
+from . import popularity
+from .catalogue import bump_catalogue_version
+from users.models import User
+from .models import Favorite, Ingredient, Recipe, ShoppingCart
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def refresh_catalogue(sender, **kwargs):
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def count_added(sender, instance, created, **kwargs):
+    if created:
+        popularity.record(sender, [instance])
+
+
+def _origin_model(origin):
+    if isinstance(origin, QuerySet):
+        return origin.model
+    return type(origin)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def count_removed(sender, instance, origin=None, **kwargs):
+    # Каскад от удаления рецепта или пользователя: рецепта уже нет, а
+    # вклад связей пользователя снят одним запросом в forget_user.
+    # Пакетное удаление снимает вклад само.
+    if _origin_model(origin) in (Recipe, User) or is_bulk_delete(origin):
+        return
+    popularity.record(sender, [instance], sign=-1)
+
+
+@receiver(pre_delete, sender=User)
+def drop_user_popularity(sender, instance, **kwargs):
+    popularity.forget_user(instance)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def log_added(sender, instance, created, **kwargs):
+    if created:
+        sync.record(sender, [instance])
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def log_removed(sender, instance, origin=None, **kwargs):
+    sync.record_removed(sender, instance, origin)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def refresh_page_counts(sender, origin=None, **kwargs):
+    if not is_bulk_delete(origin):
+        bump_count_generation(sender)
@@ -1,7 +1,30 @@
+import json
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
-from recipes.models import Recipe, Ingredient, Favorite, ShoppingCart
+from config.pagination import table_generations
+from recipes.models import (
+    Recipe, Ingredient, Favorite, RecipeIngredient, RecipeSignatureBand,
+    ShoppingCart,
+)
+from recipes.duplicates import store_signatures
+from recipes.catalogue import catalogue_version
+from recipes.popularity import refresh_popularity
+from recipes.search import similar_queryset
+from recipes.views_counter import flush_views
+from users.models import RelationChange
 
 User = get_user_model()
 
@@ -9,7 +32,9 @@ User = get_user_model()
 class RecipeAPITestCase(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
-            username="testuser", password="password"
+            username="testuser",
+            password="password",
+            email="testuser@example.com",
         )
         self.ingredient = Ingredient.objects.create(
             name="Сахар",
@@ -18,14 +43,16 @@ class RecipeAPITestCase(APITestCase):
 
         self.recipe = Recipe.objects.create(
             author=self.user,
-            title="Тестовый рецепт",
-            description="Описание рецепта",
+            name="Тестовый рецепт",
+            text="Описание рецепта",
+            image="recipes/images/test.png",
             cooking_time=15,
         )
         self.recipe.ingredients.add(
             self.ingredient, through_defaults={"amount": 100}
         )
-        self.client.login(username="testuser", password="password")
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
 
     def test_recipe_list(self):
         response = self.client.get("/api/recipes/")
@@ -36,7 +63,7 @@ class RecipeAPITestCase(APITestCase):
         response = self.client.post(
             f"/api/recipes/{self.recipe.id}/favorite/"
         )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(
             Favorite.objects.filter(user=self.user, recipe=self.recipe)
             .exists()
@@ -45,9 +72,9 @@ class RecipeAPITestCase(APITestCase):
     def test_remove_from_favorite(self):
         Favorite.objects.create(user=self.user, recipe=self.recipe)
         response = self.client.delete(
-            f"/api/recipes/{self.recipe.id}/unfavorite/"
+            f"/api/recipes/{self.recipe.id}/favorite/"
         )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(
             Favorite.objects.filter(user=self.user, recipe=self.recipe)
             .exists()
@@ -55,9 +82,9 @@ class RecipeAPITestCase(APITestCase):
 
     def test_add_to_shopping_cart(self):
         response = self.client.post(
-            f"/api/recipes/{self.recipe.id}/add_to_shopping_cart/"
+            f"/api/recipes/{self.recipe.id}/shopping_cart/"
         )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(
             ShoppingCart.objects.filter(user=self.user, recipe=self.recipe)
             .exists()
@@ -66,21 +93,682 @@ class RecipeAPITestCase(APITestCase):
     def test_remove_from_shopping_cart(self):
         ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
         response = self.client.delete(
-            f"/api/recipes/{self.recipe.id}/remove_from_shopping_cart/"
+            f"/api/recipes/{self.recipe.id}/shopping_cart/"
         )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(
             ShoppingCart.objects.filter(user=self.user, recipe=self.recipe)
             .exists()
         )
 
+    def test_shopping_list_follows_cart_and_recipe_changes(self):
+        url = "/api/recipes/download_shopping_cart/"
+        self.assertEqual(self.client.get(url).status_code, 400)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        response = self.client.get(url)
+        self.assertIn("Сахар (граммы): 100", response.content.decode())
+        self.client.patch(
+            f"/api/recipes/{self.recipe.id}/",
+            {"ingredients": [{"id": self.ingredient.id, "amount": 250}]},
+            format="json",
+        )
+        response = self.client.get(url)
+        self.assertIn("Сахар (граммы): 250", response.content.decode())
+
+    def test_shopping_list_is_not_cached_per_process(self):
+        """Без общего кэша поколения таблиц не видят чужих записей."""
+        url = "/api/recipes/download_shopping_cart/"
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        self.client.get(url)
+        # Запись без сигналов — как из другого воркера или команды.
+        RecipeIngredient.objects.update(amount=300)
+        response = self.client.get(url)
+        self.assertIn("Сахар (граммы): 300", response.content.decode())
+
+        with mock.patch("config.singleflight.is_shared", return_value=True):
+            self.client.get(url)
+            RecipeIngredient.objects.update(amount=400)
+            response = self.client.get(url)
+        self.assertIn("Сахар (граммы): 300", response.content.decode())
+
+    def test_toggle_repeats_and_missing_recipe(self):
+        url = f"/api/recipes/{self.recipe.id}/favorite/"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertGreater(self.recipe.popularity, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertAlmostEqual(self.recipe.popularity, 0)
+
+        for path in ("/api/recipes/999999/", "/api/recipes/abc/"):
+            for method in (self.client.post, self.client.delete):
+                response = method(path + "shopping_cart/")
+                self.assertEqual(response.status_code, 404)
+
+    def test_update_touches_only_changed_ingredients(self):
+        salt = Ingredient.objects.create(name="Соль", measurement_unit="г")
+        kept = self.recipe.recipeingredient_set.get()
+        url = f"/api/recipes/{self.recipe.id}/"
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                url,
+                {
+                    "text": "Исправленное описание",
+                    "ingredients": [{"id": self.ingredient.id, "amount": 100}],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statements = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse(
+            any(
+                '"recipes_recipeingredient"' in sql
+                and sql.startswith(("INSERT", "UPDATE", "DELETE"))
+                for sql in statements
+            )
+        )
+
+        self.client.patch(
+            url,
+            {
+                "ingredients": [
+                    {"id": self.ingredient.id, "amount": 150},
+                    {"id": salt.id, "amount": 5},
+                ]
+            },
+            format="json",
+        )
+        rows = {
+            row.ingredient_id: row
+            for row in self.recipe.recipeingredient_set.all()
+        }
+        self.assertEqual(rows[self.ingredient.id].pk, kept.pk)
+        self.assertEqual(rows[self.ingredient.id].amount, 150)
+        self.assertEqual(rows[salt.id].amount, 5)
+
+        self.client.patch(
+            url, {"ingredients": [{"id": salt.id, "amount": 5}]},
+            format="json",
+        )
+        remaining = self.recipe.recipeingredient_set.values_list(
+            "pk", flat=True
+        )
+        self.assertEqual(list(remaining), [rows[salt.id].pk])
+
+    def test_unchanged_update_saves_nothing(self):
+        store_signatures([self.recipe])
+        url = f"/api/recipes/{self.recipe.id}/"
+        before = table_generations(Recipe, RecipeIngredient)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                url,
+                {
+                    "name": self.recipe.name,
+                    "cooking_time": self.recipe.cooking_time,
+                    "ingredients": [{"id": self.ingredient.id, "amount": 100}],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any(
+                query["sql"].startswith("UPDATE")
+                and '"recipes_recipe"' in query["sql"]
+                for query in queries.captured_queries
+            )
+        )
+        self.assertEqual(table_generations(Recipe, RecipeIngredient), before)
+
+    def test_update_keeps_counters_written_meanwhile(self):
+        def bump_counters(sender, instance, **kwargs):
+            # Между чтением рецепта и сохранением счётчики меняет
+            # сброс просмотров или сигнал популярности.
+            Recipe.objects.filter(pk=instance.pk).update(
+                views=7, popularity=42
+            )
+
+        pre_save.connect(bump_counters, sender=Recipe)
+        try:
+            response = self.client.patch(
+                f"/api/recipes/{self.recipe.id}/",
+                {
+                    "name": "Новое название",
+                    "ingredients": [{"id": self.ingredient.id, "amount": 100}],
+                },
+                format="json",
+            )
+        finally:
+            pre_save.disconnect(bump_counters, sender=Recipe)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, "Новое название")
+        self.assertEqual(self.recipe.views, 7)
+        self.assertEqual(self.recipe.popularity, 42)
+
+    def test_sparse_fields(self):
+        response = self.client.get(
+            "/api/recipes/?fields=id,name,cooking_time,ingredients"
+            "&omit=ingredients"
+        )
+        self.assertEqual(
+            set(response.data["results"][0]), {"id", "name", "cooking_time"}
+        )
+        with CaptureQueriesContext(connection) as light:
+            self.client.get("/api/recipes/?fields=id,name")
+        with CaptureQueriesContext(connection) as full:
+            self.client.get("/api/recipes/")
+        self.assertLess(len(light), len(full))
+        self.assertNotIn('"text"', light.captured_queries[-1]["sql"])
+
+        response = self.client.get(
+            f"/api/users/{self.user.id}/?fields=id,is_subscribed"
+        )
+        self.assertEqual(
+            response.data, {"id": self.user.id, "is_subscribed": False}
+        )
+
+    def test_ordering_by_popularity(self):
+        quick = Recipe.objects.create(
+            author=self.user,
+            name="Быстрый рецепт",
+            text="Описание",
+            image="recipes/images/test.png",
+            cooking_time=1,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/recipes/{quick.id}/favorite/")
+            self.client.post(
+                "/api/recipes/shopping_cart/bulk/",
+                {"ids": [quick.id, self.recipe.id]},
+                format="json",
+            )
+        quick.refresh_from_db()
+        incremental = quick.popularity
+        self.assertGreater(incremental, 0)
+        refresh_popularity()
+        quick.refresh_from_db()
+        self.assertAlmostEqual(quick.popularity, incremental)
+
+        for ordering in ("popular", "quick", "new"):
+            response = self.client.get(f"/api/recipes/?ordering={ordering}")
+            self.assertEqual(response.data["results"][0]["id"], quick.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/recipes/{quick.id}/favorite/")
+            self.client.delete(f"/api/recipes/{quick.id}/shopping_cart/")
+        response = self.client.get("/api/recipes/?ordering=popular")
+        self.assertEqual(response.data["results"][0]["id"], self.recipe.id)
+
+    def test_cascades_update_popularity_in_one_statement(self):
+        other = Recipe.objects.create(
+            author=self.user,
+            name="Второй рецепт",
+            text="Описание",
+            image="recipes/images/test.png",
+            cooking_time=5,
+        )
+        fan = User.objects.create_user(
+            username="fan", password="password", email="fan@example.com"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            for recipe in (self.recipe, other):
+                Favorite.objects.create(user=fan, recipe=recipe)
+                ShoppingCart.objects.create(user=fan, recipe=recipe)
+        self.assertGreater(
+            Recipe.objects.get(pk=other.pk).popularity, 0
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                fan.delete()
+        updates = [
+            query for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "recipes_recipe"')
+        ]
+        self.assertEqual(len(updates), 1)
+        for recipe in Recipe.objects.all():
+            self.assertAlmostEqual(recipe.popularity, 0, places=6)
+
+    def test_views_are_buffered_and_flushed(self):
+        url = f"/api/recipes/{self.recipe.id}/"
+        with self.settings(
+            RECIPE_VIEWS={"FLUSH_INTERVAL": 3600, "BACKGROUND_FLUSH": False}
+        ):
+            # Буфер общий для процесса: сбросим то, что накопили другие
+            # тесты.
+            flush_views()
+            Recipe.objects.update(views=0, view_score=0, popularity=0)
+            for _ in range(3):
+                self.client.get(url)
+            self.recipe.refresh_from_db()
+            self.assertEqual(self.recipe.views, 0)
+
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(flush_views(), 1)
+        self.assertEqual(len(queries), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.views, 3)
+        self.assertGreater(self.recipe.popularity, 0)
+        self.assertEqual(self.recipe.popularity, self.recipe.view_score)
+
+        refresh_popularity()
+        self.recipe.refresh_from_db()
+        self.assertAlmostEqual(
+            self.recipe.popularity, self.recipe.view_score
+        )
+
+    def test_failed_flush_keeps_views_and_response(self):
+        url = f"/api/recipes/{self.recipe.id}/"
+        with self.settings(
+            RECIPE_VIEWS={"FLUSH_INTERVAL": 0, "BACKGROUND_FLUSH": False}
+        ):
+            flush_views()
+            Recipe.objects.update(views=0)
+            with mock.patch(
+                "recipes.views_counter._update_sql",
+                return_value="UPDATE нет_такой_таблицы SET views = 1",
+            ), self.assertLogs("recipes.views_counter", "ERROR"):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # Просмотр вернулся в буфер и записан следующим окном.
+            self.assertEqual(flush_views(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.views, 1)
+
+    def test_bulk_shopping_cart(self):
+        other = Recipe.objects.create(
+            author=self.user,
+            name="Второй рецепт",
+            text="Описание",
+            image="recipes/images/test.png",
+            cooking_time=5,
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        response = self.client.post(
+            "/api/recipes/shopping_cart/bulk/",
+            {"ids": [self.recipe.id, other.id, 999999]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(
+            [item["status"] for item in response.data["results"]],
+            ["exists", "created", "not_found"],
+        )
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), 2
+        )
+
+        response = self.client.delete(
+            "/api/recipes/shopping_cart/bulk/",
+            {"ids": [self.recipe.id, other.id]},
+            format="json",
+        )
+        self.assertEqual(response.data["deleted"], 2)
+        self.assertFalse(ShoppingCart.objects.filter(user=self.user).exists())
+
+    def test_bulk_insert_reports_only_rows_it_created(self):
+        other = Recipe.objects.create(
+            author=self.user,
+            name="Второй рецепт",
+            text="Описание",
+            image="recipes/images/test.png",
+            cooking_time=5,
+        )
+        bulk_create = QuerySet.bulk_create
+
+        def lose_race(queryset, objs, **kwargs):
+            # Параллельный запрос успевает добавить первый рецепт.
+            if queryset.model is Favorite:
+                Favorite.objects.create(user=self.user, recipe=self.recipe)
+            return bulk_create(queryset, objs, **kwargs)
+
+        with mock.patch.object(QuerySet, "bulk_create", lose_race):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    "/api/recipes/favorite/bulk/",
+                    {"ids": [self.recipe.id, other.id]},
+                    format="json",
+                )
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(
+            [item["status"] for item in response.data["results"]],
+            ["exists", "created"],
+        )
+        self.assertEqual(
+            RelationChange.objects.filter(
+                user=self.user, kind="favorites", target_id=self.recipe.id
+            ).count(),
+            1,
+        )
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        # Очки растут со временем добавления, поэтому сравниваем долю.
+        self.assertAlmostEqual(self.recipe.popularity / other.popularity, 1)
+
+    def test_bulk_delete_runs_constant_queries(self):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=self.user,
+                name=f"Рецепт {number}",
+                text="Описание",
+                image="recipes/images/test.png",
+                cooking_time=5,
+            )
+            for number in range(20)
+        )
+        ids = [recipe.id for recipe in recipes]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/api/recipes/favorite/bulk/", {"ids": ids}, format="json"
+            )
+        self.client.get("/api/users/me/")  # токен уже в кэше
+
+        # Рецепты, связи, выборка коллектора delete(), DELETE, журнал
+        # и UPDATE популярности — от числа id не зависит.
+        with self.assertNumQueries(6):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(
+                    "/api/recipes/favorite/bulk/", {"ids": ids},
+                    format="json",
+                )
+        self.assertEqual(response.data["deleted"], 20)
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            RelationChange.objects.filter(
+                user=self.user, kind="favorites", added=False
+            ).count(),
+            20,
+        )
+        popularity = Recipe.objects.filter(pk__in=ids).values_list(
+            "popularity", flat=True
+        )
+        self.assertTrue(all(abs(value) < 1e-6 for value in popularity))
+
+    def test_bulk_rejects_invalid_ids(self):
+        for ids in (["abc"], [1.9], [True], [" 1"], ["-1"], [None]):
+            with self.subTest(ids=ids):
+                response = self.client.post(
+                    "/api/recipes/favorite/bulk/", {"ids": ids},
+                    format="json",
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST
+                )
+        self.assertFalse(Favorite.objects.exists())
+        response = self.client.post(
+            "/api/recipes/favorite/bulk/",
+            {"ids": [self.recipe.id, str(self.recipe.id)]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_ingredient_list(self):
         response = self.client.get("/api/ingredients/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(len(response.data) > 0)
 
+    @override_settings(INGREDIENT_SEARCH_LIMIT=3)
+    def test_ingredient_pagination_and_cap(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"Сахар {index}", measurement_unit="г")
+            for index in range(5)
+        )
+        response = self.client.get("/api/ingredients/?name=Сах")
+        self.assertEqual(len(response.data), 3)
+
+        response = self.client.get("/api/ingredients/?limit=2&offset=1")
+        self.assertEqual(response.data["count"], 6)
+        self.assertEqual(
+            [item["name"] for item in response.data["results"]],
+            ["Сахар 0", "Сахар 1"],
+        )
+
+    def test_combined_and_typo_search(self):
+        for name in ("кокосовое молоко", "молоко", "молочный шоколад"):
+            Ingredient.objects.create(name=name, measurement_unit="мл")
+        expected = ["молоко", "кокосовое молоко"]
+        # LIKE в SQLite не сворачивает регистр кириллицы, поэтому запрос
+        # в нижнем регистре.
+        for backend in ("memory", "database"):
+            with self.settings(INGREDIENT_SEARCH_BACKEND=backend):
+                response = self.client.get("/api/ingredients/?name=молок")
+                self.assertEqual(
+                    [item["name"] for item in response.data], expected
+                )
+        response = self.client.get("/api/ingredients/?name=малоко&typo=1")
+        self.assertEqual(response.data[0]["name"], "молоко")
+
+    @override_settings(
+        INGREDIENT_SEARCH_BACKEND="memory",
+        INGREDIENT_INDEX_CHECK_INTERVAL=3600,
+    )
+    def test_memory_index_follows_rebuilt_catalogue(self):
+        """Изменения без сигналов видны после пересборки справочника."""
+        url = "/api/ingredients/?name=мёд"
+        self.assertEqual(len(self.client.get(url).data), 0)
+        # Как из другого воркера: версия в кэше процесса не меняется.
+        Ingredient.objects.filter(pk=self.ingredient.pk).update(name="Мёд")
+        cache.delete(f"ingredients:catalogue:{catalogue_version()}")
+        self.assertEqual(len(self.client.get(url).data), 0)
+        with self.settings(INGREDIENT_INDEX_CHECK_INTERVAL=0):
+            response = self.client.get(url)
+        self.assertEqual([item["name"] for item in response.data], ["Мёд"])
+
+    def test_typo_search_filters_on_indexed_expression(self):
+        """Отбор — оператором % по выражению индекса, без SIMILARITY."""
+        queryset = similar_queryset(Ingredient.objects.all(), "малоко")
+        sql, _ = queryset.query.sql_with_params()
+        where = sql.split(" WHERE ")[1].split(" ORDER BY ")[0]
+        self.assertEqual(
+            where, 'UPPER("recipes_ingredient"."name"::text) %% %s'
+        )
+
     def test_search_ingredient(self):
         response = self.client.get("/api/ingredients/?name=Са")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreater(response.data["count"], 0)
-        self.assertEqual(response.data["results"][0]["name"], "Сахар")
+        self.assertGreater(len(response.data), 0)
+        self.assertEqual(response.data[0]["name"], "Сахар")
+
+
+PIXEL = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA"
+    "DUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DuplicateRecipesTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="cook", password="password", email="cook@example.com"
+        )
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {index}", measurement_unit="г")
+            for index in range(12)
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def post_recipe(self, name, ingredients):
+        return self.client.post(
+            "/api/recipes/",
+            {
+                "name": name,
+                "text": "Описание",
+                "cooking_time": 10,
+                "image": PIXEL,
+                "ingredients": [
+                    {"id": ingredient.id, "amount": 10}
+                    for ingredient in ingredients
+                ],
+            },
+            format="json",
+        )
+
+    def test_near_duplicates_found_and_rejected(self):
+        first = self.post_recipe("Борщ украинский", self.ingredients[:10])
+        self.post_recipe("Борщ Украинский!", self.ingredients[:10])
+        self.post_recipe("Салат", self.ingredients[8:])
+        Recipe.objects.update(minhash=None)
+
+        out = StringIO()
+        call_command("find_duplicate_recipes", stdout=out)
+        pairs = [
+            line.split("\t") for line in out.getvalue().splitlines()
+            if "\t" in line
+        ]
+        self.assertEqual(len(pairs), 1)
+        self.assertEqual(int(pairs[0][0]), first.data["id"])
+
+        with self.settings(RECIPE_MINHASH={"CHECK_ON_CREATE": True}):
+            response = self.post_recipe(
+                "Борщ украинский", self.ingredients[1:10]
+            )
+            self.assertEqual(response.status_code, 400)
+            response = self.post_recipe("Суп", self.ingredients[:3])
+            self.assertEqual(response.status_code, 201)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BenchmarkDataTestCase(APITestCase):
+    def test_seed_benchmark_data(self):
+        """Генератор создаёт заданные объёмы данных."""
+        Ingredient.objects.create(name="Соль", measurement_unit="г")
+        call_command(
+            "seed_benchmark_data",
+            users=5,
+            recipes=30,
+            ingredients=20,
+            ingredients_per_recipe=3,
+            favorites_per_user=4,
+            cart_per_user=2,
+            subscriptions_per_user=2,
+            batch_size=7,
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Ingredient.objects.count(), 20)
+        self.assertEqual(Recipe.objects.count(), 30)
+        self.assertEqual(Favorite.objects.count(), 20)
+        self.assertEqual(ShoppingCart.objects.count(), 10)
+        self.assertTrue(
+            all(
+                recipe.ingredients.count() == 3
+                for recipe in Recipe.objects.all()
+            )
+        )
+
+
+class RecipeTransferTestCase(APITestCase):
+    def test_export_and_import_round_trip(self):
+        """Выгрузка и загрузка сохраняют рецепты и их ингредиенты."""
+        author = User.objects.create_user(
+            username="cook", password="password", email="cook@example.com"
+        )
+        stranger = User.objects.create_user(
+            username="gone", password="password", email="gone@example.com"
+        )
+        salt = Ingredient.objects.create(name="Соль", measurement_unit="г")
+        milk = Ingredient.objects.create(name="Молоко", measurement_unit="мл")
+        for number, owner in enumerate((author, author, stranger)):
+            recipe = Recipe.objects.create(
+                author=owner,
+                name=f"Рецепт {number}",
+                text="Текст",
+                image="recipes/images/test.png",
+                cooking_time=10 + number,
+            )
+            recipe.ingredients.add(salt, through_defaults={"amount": 5})
+            recipe.ingredients.add(milk, through_defaults={"amount": number})
+        old_ids = list(
+            Recipe.objects.order_by("id").values_list("id", flat=True)
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            dump_path = f"{directory}/recipes.jsonl"
+            map_path = f"{directory}/ids.tsv"
+            call_command(
+                "export_recipes", dump_path, chunk_size=2, stdout=StringIO()
+            )
+            Recipe.objects.all().delete()
+            stranger.delete()
+            milk.delete()
+            call_command(
+                "import_recipes", dump_path, batch_size=2, id_map=map_path,
+                stdout=StringIO(),
+            )
+            with open(map_path, encoding="utf-8") as f:
+                pairs = [line.split() for line in f]
+
+        self.assertEqual([int(old) for old, _ in pairs], old_ids[:2])
+        recipes = Recipe.objects.order_by("id")
+        self.assertEqual([str(r.id) for r in recipes], [n for _, n in pairs])
+        self.assertEqual(
+            [(r.name, r.cooking_time, r.author) for r in recipes],
+            [("Рецепт 0", 10, author), ("Рецепт 1", 11, author)],
+        )
+        self.assertEqual(
+            sorted(
+                recipes[1].recipeingredient_set.values_list(
+                    "ingredient__name", "ingredient__measurement_unit",
+                    "amount",
+                )
+            ),
+            [("Молоко", "мл", 1), ("Соль", "г", 5)],
+        )
+        self.assertEqual(Ingredient.objects.filter(name="Молоко").count(), 1)
+        # Загруженные рецепты сразу участвуют в поиске дубликатов,
+        # а популярность уже совпадает с полным пересчётом.
+        self.assertFalse(recipes.filter(minhash=None).exists())
+        self.assertEqual(
+            RecipeSignatureBand.objects.filter(
+                recipe__in=recipes
+            ).values("recipe").distinct().count(),
+            2,
+        )
+        self.assertEqual(refresh_popularity(), 0)
+
+
+class ReplayRequestsTestCase(APITestCase):
+    def test_replay_reports_endpoints_and_mismatches(self):
+        """Прогон лога группирует запросы по действиям вьюсетов."""
+        User.objects.create_user(
+            username="reader", password="password", email="reader@example.com"
+        )
+        Ingredient.objects.create(name="Соль", measurement_unit="г")
+        lines = [
+            {"method": "GET", "path": "/api/ingredients/", "status": 200},
+            {"method": "GET", "path": "/api/ingredients/?name=%D0%A1",
+             "status": 200},
+            {"method": "GET", "path": "/api/users/me/",
+             "user": "reader@example.com", "status": 200},
+            {"method": "GET", "path": "/api/users/me/", "status": 200},
+            {"request_id": "not-a-request"},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = f"{directory}/requests.jsonl"
+            report_path = f"{directory}/report.json"
+            with open(log_path, "w", encoding="utf-8") as f:
+                for line in lines:
+                    f.write(json.dumps(line) + "\n")
+            call_command(
+                "replay_requests", log_path, output=report_path,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+            with open(report_path, encoding="utf-8") as f:
+                report = json.load(f)
+
+        self.assertEqual(report["requests"], 4)
+        self.assertEqual(report["skipped_lines"], 1)
+        ingredients = report["endpoints"]["IngredientViewSet.list"]
+        self.assertEqual(ingredients["requests"], 2)
+        self.assertEqual(ingredients["status_mismatches"], 0)
+        me = report["endpoints"]["UserViewSet.me"]
+        self.assertEqual(me["status_mismatches"], 1)
+        self.assertEqual(me["mismatch_samples"][0]["actual"], 401)
@@ -0,0 +1,243 @@
+import itertools
+import json
+import multiprocessing
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+
+from config.pagination import bump_count_generation
+from users.models import User
+from . import duplicates
+from .catalogue import bump_catalogue_version
+from .models import Ingredient, Recipe, RecipeIngredient
+
+# Выгрузка и загрузка рецептов в JSONL: строка на рецепт,
+# {"id": 1, "author": "<email>", "name": ..., "text": ..., "image": ...,
+#  "cooking_time": ..., "ingredients": [[название, единица, количество]]}.
+#
+# Автор и ингредиенты указаны естественными ключами (email, название с
+# единицей измерения), поэтому файл переносим между базами: при загрузке
+# рецепты получают новые id, а соответствие старых и новых передаётся в
+# on_batch. Недостающие ингредиенты создаются, рецепты неизвестных
+# авторов пропускаются. Файлы изображений не переносятся — в строке
+# только путь в хранилище. Популярность и сигнатуры MinHash не
+# выгружаются: сигнатуры каждой пачки считаются в её транзакции, как в
+# RecipeSerializer.create, а популярность загруженных рецептов без
+# избранного, корзины и просмотров — ноль, то же, что даст
+# refresh_recipe_popularity.
+#
+# Выгрузка идёт потоком через iterator(chunk_size) с одним запросом
+# ингредиентов на пачку; загрузка — пачками bulk_create, каждая в своей
+# транзакции. С workers > 1 пачки вставляют дочерние процессы (fork),
+# а ключи разрешает основной, чтобы ингредиенты не создавались дважды.
+
+FIELDS = ("name", "text", "image", "cooking_time")
+REQUIRED = ("id", "author", *FIELDS, "ingredients")
+
+
+def recipe_records(queryset=None, chunk_size=1000):
+    """Рецепты queryset словарями формата выгрузки, потоком."""
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    rows = queryset.order_by("id").values_list(
+        "id", "author__email", *FIELDS
+    ).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        ingredients = defaultdict(list)
+        amounts = RecipeIngredient.objects.filter(
+            recipe_id__in=[row[0] for row in chunk]
+        ).order_by("id").values_list(
+            "recipe_id",
+            "ingredient__name",
+            "ingredient__measurement_unit",
+            "amount",
+        )
+        for recipe_id, *ingredient in amounts:
+            ingredients[recipe_id].append(ingredient)
+        for recipe_id, author, *values in chunk:
+            yield {
+                "id": recipe_id,
+                "author": author,
+                **dict(zip(FIELDS, values)),
+                "ingredients": ingredients[recipe_id],
+            }
+
+
+def dump_line(record):
+    return json.dumps(
+        record,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        cls=DjangoJSONEncoder,
+    )
+
+
+def export_recipes(out, queryset=None, chunk_size=1000):
+    """Пишет рецепты queryset в поток out; возвращает их число."""
+    count = 0
+    for record in recipe_records(queryset, chunk_size):
+        out.write(dump_line(record))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def read_batches(lines, batch_size):
+    """Разбирает строки JSONL в пачки словарей."""
+    batch = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Строка {number}: некорректный JSON.")
+        missing = [key for key in REQUIRED if key not in record]
+        if missing:
+            raise ValueError(
+                f"Строка {number}: нет полей {', '.join(missing)}."
+            )
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Resolver:
+    """Переводит email авторов и ингредиенты файла в id этой базы."""
+
+    def __init__(self):
+        self.authors = {}
+        self.ingredients = {
+            (name, unit): pk
+            for pk, name, unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            )
+        }
+
+    def _resolve_authors(self, emails):
+        emails = set(emails) - self.authors.keys()
+        if not emails:
+            return
+        found = dict(
+            User.objects.filter(email__in=emails).values_list("email", "id")
+        )
+        for email in emails:
+            self.authors[email] = found.get(email)
+
+    def _resolve_ingredients(self, keys):
+        missing = set(keys) - self.ingredients.keys()
+        if not missing:
+            return
+        created = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in missing
+        )
+        for ingredient in created:
+            key = (ingredient.name, ingredient.measurement_unit)
+            self.ingredients[key] = ingredient.pk
+        # bulk_create не шлёт post_save.
+        bump_catalogue_version()
+
+    def prepare(self, records):
+        """Возвращает (строки для insert_batch, число пропущенных)."""
+        self._resolve_authors(record["author"] for record in records)
+        self._resolve_ingredients(
+            (name, unit)
+            for record in records
+            for name, unit, _ in record["ingredients"]
+        )
+        rows = []
+        for record in records:
+            author_id = self.authors[record["author"]]
+            if author_id is None:
+                continue
+            rows.append((
+                record["id"],
+                author_id,
+                *(record[field] for field in FIELDS),
+                [
+                    (self.ingredients[name, unit], amount)
+                    for name, unit, amount in record["ingredients"]
+                ],
+            ))
+        return rows, len(records) - len(rows)
+
+
+def insert_batch(rows):
+    """Вставляет пачку в одной транзакции; возвращает [(старый, новый)]."""
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author_id=author_id,
+                **dict(zip(FIELDS, values)),
+            )
+            for _, author_id, *values, _ in rows
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe.pk,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for recipe, row in zip(recipes, rows)
+            for ingredient_id, amount in row[-1]
+        )
+        # Иначе рецепты не видны find_similar до первой правки.
+        duplicates.store_signatures(recipes)
+    return [(row[0], recipe.pk) for recipe, row in zip(recipes, rows)]
+
+
+def import_recipes(lines, batch_size=500, workers=1, on_batch=None):
+    """Загружает рецепты из строк JSONL; возвращает (загружено, пропущено).
+
+    on_batch(pairs) вызывается после каждой пачки со списком пар
+    (старый id, новый id) в порядке файла.
+    """
+    imported = skipped = 0
+
+    def done(pairs):
+        nonlocal imported
+        imported += len(pairs)
+        if on_batch is not None:
+            on_batch(pairs)
+
+    if workers <= 1:
+        resolver = Resolver()
+        for records in read_batches(lines, batch_size):
+            rows, missed = resolver.prepare(records)
+            skipped += missed
+            done(insert_batch(rows))
+    else:
+        # Дочерние процессы не должны унаследовать открытые соединения:
+        # при fork все они запускаются на первом submit, поэтому пул
+        # поднимается до первого запроса основного процесса.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            pool.submit(int).result()
+            resolver = Resolver()
+            pending = deque()
+            for records in read_batches(lines, batch_size):
+                rows, missed = resolver.prepare(records)
+                skipped += missed
+                pending.append(pool.submit(insert_batch, rows))
+                # Не больше двух пачек на процесс в очереди — файл не
+                # читается в память целиком.
+                while len(pending) > workers * 2:
+                    done(pending.popleft().result())
+            while pending:
+                done(pending.popleft().result())
+
+    if imported:
+        # bulk_create не шлёт post_save.
+        bump_count_generation(Recipe)
+        bump_count_generation(RecipeIngredient)
+    return imported, skipped
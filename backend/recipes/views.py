@@ -1,3 +1,5 @@
+from functools import partial
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -7,23 +9,162 @@ from django_filters.rest_framework import (
     DjangoFilterBackend,
 )
 from django.conf import settings
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import Exists, OuterRef, Prefetch, Sum
+from django.http import Http404, HttpResponse
 from rest_framework.permissions import IsAuthenticated
-from django.shortcuts import get_object_or_404
 from django.utils.crypto import get_random_string
 
-from .models import Recipe, Ingredient, Favorite, ShoppingCart
+from config.bulk import bulk_relation
+from config.pagination import table_generations
+from config.singleflight import get_or_compute
+from config.sparse import selected_fields
+from config.toggle import add_relation, remove_relation
+from users.models import User
+from users.views import annotate_subscribed
+from . import popularity
+from .catalogue import (
+    catalogue_response,
+    catalogue_version,
+    ingredient_catalogue,
+)
+from .models import (
+    Recipe,
+    Ingredient,
+    RecipeIngredient,
+    Favorite,
+    ShoppingCart,
+)
+from .search import (
+    ranked_queryset, search_ingredients, similar_queryset, similarity_limit,
+)
 from .serializers import RecipeSerializer, IngredientSerializer
+from .views_counter import record_view
+
+# Поля RecipeSerializer, которые читаются прямо из колонок рецепта.
+RECIPE_COLUMNS = ("author", "name", "image", "text", "cooking_time")
+
+# Поля рецепта в ответе на добавление в избранное и корзину.
+PREVIEW_COLUMNS = ("name", "image", "cooking_time")
+
+
+# Значения ?ordering= для списка рецептов.
+RECIPE_ORDERINGS = {
+    "popular": ("-popularity", "-id"),
+    "new": ("-id",),
+    "quick": ("cooking_time", "-id"),
+}
+
+
+def filter_recipes(queryset, user, params):
+    is_in_shopping_cart = params.get("is_in_shopping_cart")
+    if is_in_shopping_cart is not None and user.is_authenticated:
+        if is_in_shopping_cart == "1":
+            queryset = queryset.filter(in_shopping_cart__user=user)
+        elif is_in_shopping_cart == "0":
+            queryset = queryset.exclude(in_shopping_cart__user=user)
+
+    is_favorited = params.get("is_favorited")
+    if is_favorited is not None and user.is_authenticated:
+        if is_favorited == "1":
+            queryset = queryset.filter(favorited_by__user=user)
+        elif is_favorited == "0":
+            queryset = queryset.exclude(favorited_by__user=user)
+
+    ordering = RECIPE_ORDERINGS.get(params.get("ordering"))
+    if ordering:
+        queryset = queryset.order_by(*ordering)
+
+    return queryset
+
+
+def read_recipes(queryset, user, fields=None):
+    """Загружает для RecipeSerializer только нужное полям fields.
+
+    Связанные объекты подтягиваются пачкой, флаги избранного и корзины
+    вычисляются в том же запросе через Exists.
+    """
+    if fields is None:
+        fields = set(RecipeSerializer.Meta.fields)
+        queryset = queryset.defer("minhash")
+    else:
+        queryset = queryset.only(
+            "id", *(name for name in RECIPE_COLUMNS if name in fields)
+        )
+
+    if "author" in fields:
+        queryset = queryset.prefetch_related(
+            Prefetch(
+                "author",
+                queryset=annotate_subscribed(User.objects.all(), user),
+            )
+        )
+    if "ingredients" in fields:
+        queryset = queryset.prefetch_related(
+            Prefetch(
+                "recipeingredient_set",
+                queryset=RecipeIngredient.objects.select_related(
+                    "ingredient"
+                ).order_by("id"),
+            )
+        )
+    if user.is_authenticated:
+        if "is_favorited" in fields:
+            queryset = queryset.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+                )
+            )
+        if "is_in_shopping_cart" in fields:
+            queryset = queryset.annotate(
+                is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef("pk")
+                    )
+                )
+            )
+    return queryset
+
+
+def shopping_list(user):
+    """Текст списка покупок или None, если корзина пуста."""
+    shopping_cart = ShoppingCart.objects.filter(
+        user=user
+    ).select_related("recipe__ingredients")
+
+    if not shopping_cart.exists():
+        return None
+
+    ingredients = shopping_cart.values(
+        "recipe__ingredients__name",
+        "recipe__ingredients__measurement_unit"
+    ).annotate(amount=Sum("recipe__recipeingredient__amount"))
+
+    shopping_list_text = "Список покупок:\n\n"
+    for item in ingredients:
+        shopping_list_text += (
+            f"{item['recipe__ingredients__name']} "
+            f"({item['recipe__ingredients__measurement_unit']}): "
+            f"{item['amount']}\n"
+        )
+    return shopping_list_text
 
 
 class IngredientFilter(FilterSet):
-    name = CharFilter(field_name="name", lookup_expr="istartswith")
+    name = CharFilter(method="filter_name")
 
     class Meta:
         model = Ingredient
         fields = ["name"]
 
+    def filter_name(self, queryset, name, value):
+        if is_typo_search(self.data):
+            return similar_queryset(queryset, value)
+        return ranked_queryset(queryset, value)
+
+
+def is_typo_search(params):
+    return params.get("typo") in ("1", "true")
+
 
 class IngredientViewSet(viewsets.ModelViewSet):
     queryset = Ingredient.objects.all().order_by("name")
@@ -56,6 +197,25 @@ class IngredientViewSet(viewsets.ModelViewSet):
         )
 
     def list(self, request, *args, **kwargs):
+        # Пагинация включается только явными ?limit=/?offset=: фронтенд
+        # ждёт простой список.
+        params = request.query_params
+        if "limit" in params or "offset" in params:
+            if params.get("name") and is_typo_search(params):
+                with similarity_limit(self.get_queryset().db):
+                    return super().list(request, *args, **kwargs)
+            return super().list(request, *args, **kwargs)
+        if (
+            not params.get("name")
+            and request.accepted_renderer.format == "json"
+        ):
+            return catalogue_response(ingredient_catalogue())
+        if params.get("name"):
+            return Response(
+                search_ingredients(
+                    params["name"], typo=is_typo_search(params)
+                )
+            )
         queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
@@ -91,6 +251,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
         return super().update(request, *args, **kwargs)
 
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        record_view(int(self.kwargs["pk"]))
+        return response
+
     def destroy(self, request, *args, **kwargs):
         recipe = self.get_object()
         if recipe.author != request.user:
@@ -101,25 +266,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-
-        is_in_shopping_cart = self.request.query_params.get(
-            "is_in_shopping_cart"
+        queryset = filter_recipes(
+            super().get_queryset(),
+            self.request.user,
+            self.request.query_params,
         )
-        if is_in_shopping_cart is not None and user.is_authenticated:
-            if is_in_shopping_cart == "1":
-                queryset = queryset.filter(in_shopping_cart__user=user)
-            elif is_in_shopping_cart == "0":
-                queryset = queryset.exclude(in_shopping_cart__user=user)
-
-        is_favorited = self.request.query_params.get("is_favorited")
-        if is_favorited is not None and user.is_authenticated:
-            if is_favorited == "1":
-                queryset = queryset.filter(favorited_by__user=user)
-            elif is_favorited == "0":
-                queryset = queryset.exclude(favorited_by__user=user)
-
+        if self.action in ("list", "retrieve"):
+            queryset = read_recipes(
+                queryset,
+                self.request.user,
+                selected_fields(self.request, RecipeSerializer.Meta.fields),
+            )
         return queryset
 
     @action(detail=True, methods=["get"], url_path="get-link")
@@ -132,12 +289,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-
         if request.method == "POST":
-            favorite, created = Favorite.objects.get_or_create(
-                user=request.user, recipe=recipe
+            recipe, created = add_relation(
+                request.user, Favorite, "recipe", pk, PREVIEW_COLUMNS
             )
+            if recipe is None:
+                raise Http404
             if not created:
                 return Response(
                     {"error": "Этот рецепт уже в избранном."},
@@ -152,9 +309,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
             }
             return Response(data, status=status.HTTP_201_CREATED)
 
-        deleted, _ = Favorite.objects.filter(
-            user=request.user, recipe=recipe
-        ).delete()
+        recipe, deleted = remove_relation(
+            request.user, Favorite, "recipe", pk
+        )
+        if recipe is None:
+            raise Http404
         if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
@@ -167,12 +326,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-
         if request.method == "POST":
-            cart_item, created = ShoppingCart.objects.get_or_create(
-                user=request.user, recipe=recipe
+            recipe, created = add_relation(
+                request.user, ShoppingCart, "recipe", pk, PREVIEW_COLUMNS
             )
+            if recipe is None:
+                raise Http404
             if not created:
                 return Response(
                     {"error": "Этот рецепт уже есть в корзине."},
@@ -187,9 +346,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
             }
             return Response(data, status=status.HTTP_201_CREATED)
 
-        deleted, _ = ShoppingCart.objects.filter(
-            user=request.user, recipe=recipe
-        ).delete()
+        recipe, deleted = remove_relation(
+            request.user, ShoppingCart, "recipe", pk
+        )
+        if recipe is None:
+            raise Http404
         if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
@@ -197,32 +358,48 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @action(
+        detail=False, methods=["post", "delete"], url_path="favorite/bulk",
+        url_name="favorite-bulk", permission_classes=[IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        return bulk_relation(
+            request, Favorite, Recipe, "recipe",
+            on_create=partial(popularity.record, Favorite),
+            on_delete=partial(popularity.record, Favorite, sign=-1),
+        )
+
+    @action(
+        detail=False, methods=["post", "delete"],
+        url_path="shopping_cart/bulk", url_name="shopping-cart-bulk",
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_bulk(self, request):
+        return bulk_relation(
+            request, ShoppingCart, Recipe, "recipe",
+            on_create=partial(popularity.record, ShoppingCart),
+            on_delete=partial(popularity.record, ShoppingCart, sign=-1),
+        )
+
     @action(detail=False, methods=["get"], url_path="download_shopping_cart")
     def download_shopping_cart(self, request):
         user = request.user
-        shopping_cart = ShoppingCart.objects.filter(
-            user=user
-        ).select_related("recipe__ingredients")
-
-        if not shopping_cart.exists():
+        # Поколения таблиц меняются при любой записи в них, версия
+        # справочника — при переименовании ингредиентов.
+        generations = table_generations(ShoppingCart, Recipe, RecipeIngredient)
+        shopping_list_text = get_or_compute(
+            f"shopping_list:{user.pk}:{generations}:{catalogue_version()}",
+            partial(shopping_list, user),
+            getattr(settings, "SHOPPING_LIST_CACHE_TIMEOUT", 300),
+            name="shopping_list",
+            shared_only=True,
+        )
+        if shopping_list_text is None:
             return Response(
                 {"error": "Корзина покупок пуста."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        ingredients = shopping_cart.values(
-            "recipe__ingredients__name",
-            "recipe__ingredients__measurement_unit"
-        ).annotate(amount=Sum("recipe__recipeingredient__amount"))
-
-        shopping_list_text = "Список покупок:\n\n"
-        for item in ingredients:
-            shopping_list_text += (
-                f"{item['recipe__ingredients__name']} "
-                f"({item['recipe__ingredients__measurement_unit']}): "
-                f"{item['amount']}\n"
-            )
-
         response = HttpResponse(shopping_list_text, content_type="text/plain")
         response["Content-Disposition"] = (
             'attachment; filename="shopping_list.txt"'
@@ -0,0 +1,150 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from . import popularity
+from .models import Recipe
+
+# Счётчик просмотров рецептов с отложенной записью. Просмотры копятся в
+# памяти процесса и раз в FLUSH_INTERVAL секунд (или по MAX_PENDING
+# рецептов) записываются одним UPDATE ... FROM (VALUES ...), а не UPDATE
+# горячей строки на каждый GET. Окно ограничено и без новых просмотров:
+# фоновый поток процесса проверяет его раз в секунду. При падении
+# процесса теряется не больше одного окна; при штатном завершении буфер
+# сбрасывается в atexit. Ошибка записи не роняет запрос: просмотры
+# возвращаются в буфер и уходят со следующим окном.
+#
+# Вместе с views растут view_score и popularity: просмотры весят
+# VIEW_WEIGHT с тем же «прямым» затуханием, что и избранное (момент
+# записи окна считается моментом просмотров).
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "FLUSH_INTERVAL": 10,
+    "MAX_PENDING": 1000,
+    "BACKGROUND_FLUSH": True,
+}
+TICK = 1.0
+
+_pending = Counter()
+_lock = threading.Lock()
+_flushed_at = time.monotonic()
+# Поток не переживает fork, поэтому запоминаем, в каком процессе он
+# запущен.
+_flusher_pid = None
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "RECIPE_VIEWS", {})}
+
+
+def _flush_due(config):
+    return time.monotonic() - _flushed_at >= config["FLUSH_INTERVAL"]
+
+
+def _background_flush():
+    while True:
+        time.sleep(TICK)
+        config = _config()
+        if config["BACKGROUND_FLUSH"] and _pending and _flush_due(config):
+            flush_views()
+            # Соединение этого потока между окнами не держим.
+            connections.close_all()
+
+
+def _start_flusher():
+    global _flusher_pid
+    pid = os.getpid()
+    with _lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+    threading.Thread(
+        target=_background_flush, name="recipe-views-flush", daemon=True
+    ).start()
+
+
+def count_view(recipe_id):
+    """Учитывает просмотр в буфере; True — пора вызвать flush_views."""
+    config = _config()
+    if config["BACKGROUND_FLUSH"] and _flusher_pid != os.getpid():
+        _start_flusher()
+    with _lock:
+        _pending[recipe_id] += 1
+        return (
+            len(_pending) >= config["MAX_PENDING"] or _flush_due(config)
+        )
+
+
+def record_view(recipe_id):
+    if count_view(recipe_id):
+        flush_views()
+
+
+def _update_sql(rows):
+    table = connection.ops.quote_name(Recipe._meta.db_table)
+    values = ", ".join(["(%s, %s)"] * len(rows))
+    # CTE со списком колонок понимают и PostgreSQL, и SQLite 3.33+.
+    return (
+        f"WITH v(id, delta) AS (VALUES {values}) "
+        f"UPDATE {table} SET views = views + v.delta, "
+        f"view_score = view_score + v.delta * %s, "
+        f"popularity = popularity + v.delta * %s "
+        f"FROM v WHERE {table}.id = v.id"
+    )
+
+
+def flush_views():
+    """Записывает накопленные просмотры; возвращает число рецептов."""
+    global _flushed_at
+    with _lock:
+        rows = list(_pending.items())
+        _pending.clear()
+        _flushed_at = time.monotonic()
+    if not rows:
+        return 0
+
+    weight = popularity.view_weight() * popularity.decay_factor(
+        timezone.now()
+    )
+    try:
+        if connection.vendor in ("postgresql", "sqlite"):
+            params = [value for row in rows for value in row]
+            with connection.cursor() as cursor:
+                cursor.execute(_update_sql(rows), [*params, weight, weight])
+        else:
+            _update_orm(dict(rows), weight)
+    except DatabaseError as exc:
+        # Вернём просмотры в буфер: запишутся со следующим окном.
+        with _lock:
+            _pending.update(dict(rows))
+        logger.error(f"Просмотры рецептов не записаны: {exc}")
+        return 0
+    return len(rows)
+
+
+def _update_orm(deltas, weight):
+    delta = Case(
+        *(
+            When(pk=recipe_id, then=Value(count))
+            for recipe_id, count in deltas.items()
+        ),
+        default=Value(0),
+    )
+    Recipe.objects.filter(pk__in=deltas).update(
+        views=F("views") + delta,
+        view_score=F("view_score") + delta * weight,
+        popularity=F("popularity") + delta * weight,
+    )
+
+
+atexit.register(flush_views)
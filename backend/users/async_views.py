@@ -0,0 +1,70 @@
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.db.models import Count
+
+from config.async_views import (
+    FallbackToSync,
+    authenticate,
+    json_response,
+    query_params,
+    user_payload,
+)
+from config.pagination import acount_queryset
+from .models import User
+from .views import CustomPagination, authors_recipes
+
+
+async def subscriptions(request):
+    user = await authenticate(request)
+    if not user.is_authenticated:
+        raise FallbackToSync
+
+    queryset = User.objects.filter(subscribers__user=user).annotate(
+        recipes_count=Count("recipes")
+    ).order_by("id")
+    paginator = CustomPagination()
+    shim = query_params(request)
+    paginator.request = shim
+    django_paginator = paginator.django_paginator_class(
+        queryset, paginator.get_page_size(shim)
+    )
+    # Заранее подставляем count, чтобы Paginator не считал синхронно.
+    django_paginator.count = await acount_queryset(queryset)
+    try:
+        paginator.page = django_paginator.page(
+            request.GET.get(paginator.page_query_param) or 1
+        )
+    except InvalidPage:
+        raise FallbackToSync
+
+    recipes_limit = request.GET.get("recipes_limit")
+    try:
+        recipes_limit = (
+            int(recipes_limit) if recipes_limit is not None else None
+        )
+    except ValueError:
+        recipes_limit = None
+
+    authors = [
+        author async for author in paginator.page.object_list.aiterator()
+    ]
+    # Те же превью, что у синхронного представления.
+    previews = await sync_to_async(authors_recipes)(
+        request, authors, recipes_limit
+    )
+    results = []
+    for author in authors:
+        author_data = user_payload(request, author, True)
+        author_data["recipes_count"] = author.recipes_count
+        author_data["recipes"] = previews[author.pk]
+        results.append(author_data)
+
+    return json_response(
+        {
+            "count": django_paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "results": results,
+        },
+        allow="GET, HEAD, OPTIONS",
+    )
@@ -0,0 +1,158 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from config import metrics
+from config.cache_backends import is_shared
+
+SHARED_KEY_PREFIX = "auth:token:"
+
+
+class TokenCache:
+    """LRU-кэш «ключ токена → токен с пользователем» с временем жизни.
+
+    Живёт в памяти процесса и используется, только когда общего кэша
+    нет (см. CachedTokenAuthentication).
+    """
+
+    def __init__(self, max_entries=10000, timeout=5):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                token, expires = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return token
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, token):
+        with self._lock:
+            self._entries[key] = (token, time.monotonic() + self.timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+        }
+
+
+def _config():
+    return getattr(settings, "TOKEN_CACHE", {})
+
+
+def _shared():
+    return _config().get("SHARED", True) and is_shared()
+
+
+token_cache = TokenCache(
+    max_entries=_config().get("MAX_ENTRIES", 10000),
+    timeout=_config().get("LOCAL_TIMEOUT", 5),
+)
+
+
+def invalidate_token(key):
+    token_cache.delete(key)
+    if _shared():
+        cache.delete(SHARED_KEY_PREFIX + key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к authtoken_token на каждый вызов.
+
+    Токены хранятся в общем кэше Django: его L1 в памяти процесса
+    сбрасывается каналом инвалидации TieredCache, так что удаление
+    токена и сохранение пользователя (см. users.signals) видны всем
+    воркерам. Без общего кэша (TOKEN_CACHE["SHARED"] выключен или L2 —
+    LocMemCache) остаётся LRU процесса, и в других воркерах выход и
+    деактивация видны через TOKEN_CACHE["LOCAL_TIMEOUT"] секунд.
+    """
+
+    def authenticate_credentials(self, key):
+        if _shared():
+            token = cache.get(SHARED_KEY_PREFIX + key)
+        else:
+            token = token_cache.get(key)
+        metrics.record_cache(token is not None, cache="token")
+
+        if token is None:
+            model = self.get_model()
+            try:
+                token = self._queryset(model).get(key=key)
+            except model.DoesNotExist:
+                raise AuthenticationFailed(_("Invalid token."))
+            if _shared():
+                cache.set(SHARED_KEY_PREFIX + key, token, self._timeout())
+            else:
+                token_cache.set(key, token)
+        return self._credentials(token)
+
+    async def aauthenticate_credentials(self, key):
+        if _shared():
+            token = await cache.aget(SHARED_KEY_PREFIX + key)
+        else:
+            token = token_cache.get(key)
+        metrics.record_cache(token is not None, cache="token")
+
+        if token is None:
+            model = self.get_model()
+            try:
+                token = await self._queryset(model).aget(key=key)
+            except model.DoesNotExist:
+                raise AuthenticationFailed(_("Invalid token."))
+            if _shared():
+                await cache.aset(
+                    SHARED_KEY_PREFIX + key, token, self._timeout()
+                )
+            else:
+                token_cache.set(key, token)
+        return self._credentials(token)
+
+    def _queryset(self, model):
+        # Токен с пользователем уходит в общий кэш: хеш пароля туда не
+        # кладём, при обращении user.password догрузится из базы.
+        return model.objects.select_related("user").defer("user__password")
+
+    def _timeout(self):
+        return _config().get("TIMEOUT", 60)
+
+    def _credentials(self, token):
+        if not token.user.is_active:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+
+        # Копия, чтобы изменения request.user в одном запросе не
+        # протекали в другие через общий кэш.
+        return (copy.copy(token.user), token)
@@ -0,0 +1,151 @@
+import time
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.transfer import dump_line, recipe_records
+from .models import Subscription
+
+# Архив с данными пользователя (GET /api/users/me/export/): профиль,
+# рецепты, избранное, корзина, подписки и файлы изображений. Архив
+# пишется потоком: ZipFile работает поверх приёмника без seek и tell
+# (размеры и CRC идут в дескрипторах данных после каждого файла), а
+# накопившиеся байты отдаются клиенту порциями по CHUNK_SIZE. Строки
+# читаются через iterator(), файлы — кусками, так что память не зависит
+# от размера аккаунта.
+#
+# В ASGI-режиме StreamingHttpResponse собрал бы синхронный итератор в
+# список целиком, поэтому там порции забираются по одной через
+# sync_to_async.
+
+CHUNK_SIZE = 64 * 1024
+
+
+class StreamSink:
+    """Приёмник для ZipFile: копит записанное до следующей выдачи."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def _ready(sink):
+    if sink.size >= CHUNK_SIZE:
+        yield sink.drain()
+
+
+def _write_lines(archive, sink, name, records):
+    with archive.open(name, "w") as entry:
+        for record in records:
+            entry.write(dump_line(record).encode())
+            entry.write(b"\n")
+            yield from _ready(sink)
+
+
+def _write_file(archive, sink, name):
+    try:
+        source = default_storage.open(name, "rb")
+    except OSError:
+        # Файл пропал из хранилища — в архиве остаётся только путь.
+        return
+    info = zipfile.ZipInfo(f"media/{name}", time.localtime()[:6])
+    # Изображения уже сжаты.
+    info.compress_type = zipfile.ZIP_STORED
+    info.file_size = source.size
+    with source, archive.open(info, "w") as entry:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            entry.write(chunk)
+            yield from _ready(sink)
+
+
+def _relations(model, user, field, *columns):
+    rows = model.objects.filter(user=user).order_by("id").values_list(
+        f"{field}_id", *(f"{field}__{column}" for column in columns),
+        "created_at",
+    )
+    for target_id, *values, created_at in rows.iterator():
+        yield {
+            field: target_id,
+            **dict(zip(columns, values)),
+            "created_at": created_at,
+        }
+
+
+def export_archive(user):
+    """Итератор байтов zip-архива с данными user."""
+    sink = StreamSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        profile = {
+            "id": user.pk,
+            "username": user.username,
+            "email": user.email,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "date_joined": user.date_joined,
+            "avatar": user.avatar.name or None,
+        }
+        yield from _write_lines(archive, sink, "profile.json", [profile])
+        recipes = Recipe.objects.filter(author=user)
+        yield from _write_lines(
+            archive, sink, "recipes.jsonl", recipe_records(recipes)
+        )
+        for name, model in (
+            ("favorites.jsonl", Favorite),
+            ("shopping_cart.jsonl", ShoppingCart),
+        ):
+            yield from _write_lines(
+                archive, sink, name, _relations(model, user, "recipe", "name")
+            )
+        yield from _write_lines(
+            archive, sink, "subscriptions.jsonl",
+            _relations(Subscription, user, "author", "username"),
+        )
+        if user.avatar:
+            yield from _write_file(archive, sink, user.avatar.name)
+        images = recipes.order_by("image").values_list(
+            "image", flat=True
+        ).distinct()
+        for name in images.iterator():
+            if name:
+                yield from _write_file(archive, sink, name)
+    yield sink.drain()
+
+
+async def _aiterate(chunks):
+    while True:
+        chunk = await sync_to_async(next)(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def archive_response(request, user):
+    chunks = export_archive(user)
+    if isinstance(request, ASGIRequest):
+        chunks = _aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type="application/zip")
+    response["Content-Disposition"] = (
+        f'attachment; filename="foodgram-{user.pk}.zip"'
+    )
+    return response
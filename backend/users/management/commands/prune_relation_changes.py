@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from config.sync import prune_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete sync change log entries older than the retention period; "
+        "clients with older tokens get a full snapshot on their next sync"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Retention in days (default: SYNC['RETENTION_DAYS'])",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        deleted = prune_changes(options["days"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} change log entries in "
+                f"{time.perf_counter() - start:.2f}s."
+            )
+        )
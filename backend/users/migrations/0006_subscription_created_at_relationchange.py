@@ -0,0 +1,76 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_alter_subscription_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subscription",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="Добавлено"
+            ),
+        ),
+        migrations.CreateModel(
+            name="RelationChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(max_length=16, verbose_name="Тип связи"),
+                ),
+                (
+                    "target_id",
+                    models.BigIntegerField(verbose_name="Id объекта"),
+                ),
+                ("added", models.BooleanField(verbose_name="Добавлено")),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="Время изменения",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="relation_changes",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Изменение связи",
+                "verbose_name_plural": "Изменения связей",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "id"],
+                        name="users_relat_user_id_eafa63_idx",
+                    ),
+                    models.Index(
+                        fields=["user", "created_at"],
+                        name="users_relat_user_id_ca0af7_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -49,8 +50,40 @@ class Subscription(models.Model):
         related_name="subscribers",
         verbose_name="Автор",
     )
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Добавлено"
+    )
 
     class Meta:
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
         unique_together = ("user", "author")
+
+
+class RelationChange(models.Model):
+    """Запись журнала изменений избранного, корзины и подписок.
+
+    added=False — «надгробие» удалённой связи. Номер записи служит
+    токеном синхронизации (config.sync).
+    """
+
+    user = models.ForeignKey(
+        "users.User",
+        on_delete=models.CASCADE,
+        related_name="relation_changes",
+        verbose_name="Пользователь",
+    )
+    kind = models.CharField(max_length=16, verbose_name="Тип связи")
+    target_id = models.BigIntegerField(verbose_name="Id объекта")
+    added = models.BooleanField(verbose_name="Добавлено")
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Время изменения"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"]),
+            models.Index(fields=["user", "created_at"]),
+        ]
+        verbose_name = "Изменение связи"
+        verbose_name_plural = "Изменения связей"
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 
+from config.sparse import SparseFieldsMixin
 from .models import User, Subscription
 from .omp_photo import Base64ImageField
 
@@ -38,7 +39,7 @@ class EmailAuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     avatar = Base64ImageField(required=False, allow_null=True)
     is_subscribed = serializers.SerializerMethodField()
 
@@ -58,6 +59,11 @@ class UserSerializer(serializers.ModelSerializer):
         return None
 
     def get_is_subscribed(self, obj):
+        # Вьюсеты аннотируют подписку через Exists (annotate_subscribed),
+        # чтобы не делать запрос на каждого пользователя в списке.
+        annotated = getattr(obj, "viewer_subscribed", None)
+        if annotated is not None:
+            return annotated
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             return Subscription.objects.filter(
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from config import sync
+from config.bulk import is_bulk_delete
+from config.pagination import bump_count_generation
+from .authentication import invalidate_token
+from .models import Subscription, User
+
+
+@receiver(post_delete, sender=Token)
+def drop_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def drop_user_tokens(sender, instance, update_fields=None, **kwargs):
+    # Вход обновляет только last_login — кэш от этого не устаревает.
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+        "key", flat=True
+    ):
+        invalidate_token(key)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def refresh_page_counts(sender, origin=None, **kwargs):
+    if not is_bulk_delete(origin):
+        bump_count_generation(sender)
+
+
+@receiver(post_save, sender=User)
+def count_new_user(sender, created, **kwargs):
+    # Правка профиля число пользователей не меняет.
+    if created:
+        bump_count_generation(sender)
+
+
+@receiver(post_delete, sender=User)
+def count_removed_user(sender, **kwargs):
+    bump_count_generation(sender)
+
+
+@receiver(post_save, sender=Subscription)
+def log_added(sender, instance, created, **kwargs):
+    if created:
+        sync.record(sender, [instance])
+
+
+@receiver(post_delete, sender=Subscription)
+def log_removed(sender, instance, origin=None, **kwargs):
+    sync.record_removed(sender, instance, origin)
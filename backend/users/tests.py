@@ -1,6 +1,22 @@
+import io
+import json
+import pickle
+import tempfile
+import zipfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework.authtoken.models import Token
+from users.authentication import SHARED_KEY_PREFIX, token_cache
+from recipes.models import Favorite, Ingredient, Recipe
 from users.models import User, Subscription
 
 
@@ -30,7 +46,7 @@ class SubscriptionAPITestCase(APITestCase):
         response = self.client.post(
             f"/api/users/{self.author.id}/subscribe/"
         )
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(
             Subscription.objects.filter(
                 user=self.user, author=self.author
@@ -48,6 +64,76 @@ class SubscriptionAPITestCase(APITestCase):
             "Вы не можете подписаться на самого себя.",
         )
 
+    def test_subscriptions_reuse_annotated_recipe_count(self):
+        """Без общего кэша число рецептов автора не считается заново."""
+        for index in range(3):
+            author = User.objects.create_user(
+                username=f"writer{index}",
+                password="password",
+                email=f"writer{index}@example.com",
+            )
+            Recipe.objects.create(
+                author=author,
+                name=f"Рецепт {index}",
+                text="Текст",
+                image="recipes/images/test.png",
+                cooking_time=5,
+            )
+            Subscription.objects.create(user=self.user, author=author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/users/subscriptions/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [author["recipes_count"] for author in response.data["results"]],
+            [1, 1, 1],
+        )
+        self.assertFalse(
+            any(
+                query["sql"].startswith("SELECT COUNT(*)")
+                and 'FROM "recipes_recipe"' in query["sql"]
+                for query in queries.captured_queries
+            )
+        )
+
+    def test_subscription_previews_in_one_query(self):
+        """Синхронный и асинхронный пути отдают одни превью без N+1."""
+        for index in range(3):
+            author = User.objects.create_user(
+                username=f"cook{index}",
+                password="password",
+                email=f"cook{index}@example.com",
+            )
+            for number in range(3):
+                Recipe.objects.create(
+                    author=author,
+                    name=f"Рецепт {index}.{number}",
+                    text="Текст",
+                    image="recipes/images/test.png",
+                    cooking_time=5,
+                )
+            Subscription.objects.create(user=self.user, author=author)
+        path = "/api/users/subscriptions/?recipes_limit=2"
+        expected = self.client.get(path)
+        self.assertEqual(
+            [
+                [recipe["name"] for recipe in author["recipes"]]
+                for author in expected.data["results"]
+            ],
+            [[f"Рецепт {index}.0", f"Рецепт {index}.1"] for index in range(3)],
+        )
+        headers = {"authorization": f"Token {self.auth_token}"}
+        with override_settings(ROOT_URLCONF="config.urls_asgi"):
+            with CaptureQueriesContext(connection) as queries:
+                actual = async_to_sync(self.async_client.get)(
+                    path, headers=headers
+                )
+        self.assertEqual(actual.content, expected.content)
+        previews = [
+            query["sql"] for query in queries.captured_queries
+            if 'FROM "recipes_recipe"' in query["sql"]
+        ]
+        self.assertEqual(len(previews), 1)
+
     def test_logout(self):
         """Тест выхода пользователя с использованием DRF-токена."""
         response = self.client.post("/api/auth/token/logout/")
@@ -82,3 +168,133 @@ class SubscriptionAPITestCase(APITestCase):
         response = self.client.get("/api/users/?limit=3")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 3)
+
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(
+            username="cached",
+            password="password",
+            email="cached@example.com",
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Token {self.token.key}"
+        )
+
+    def test_token_lookup_is_cached(self):
+        """Повторный запрос не обращается к таблице токенов."""
+        self.client.get("/api/users/me/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/users/me/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any("authtoken_token" in query["sql"] for query in queries)
+        )
+        self.assertEqual(token_cache.stats()["hits"], 1)
+
+    def test_deactivated_user_is_rejected(self):
+        """Деактивация пользователя сбрасывает закэшированный токен."""
+        self.client.get("/api/users/me/")
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get("/api/users/me/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_changes_are_visible(self):
+        """Изменение профиля не отдаётся из устаревшего кэша."""
+        self.client.get("/api/users/me/")
+        self.user.first_name = "Новое"
+        self.user.save()
+        response = self.client.get("/api/users/me/")
+        self.assertEqual(response.data["first_name"], "Новое")
+
+    def test_logout_reaches_shared_cache(self):
+        """С общим кэшем токен не оседает в памяти процесса."""
+        with mock.patch("users.authentication.is_shared", return_value=True):
+            self.client.get("/api/users/me/")
+            self.assertEqual(token_cache.stats()["entries"], 0)
+            key = SHARED_KEY_PREFIX + self.token.key
+            self.assertIsNotNone(caches["shared"].get(key))
+
+            cached = caches["shared"].get(key)
+            self.assertIn("password", cached.user.get_deferred_fields())
+            self.assertNotIn(
+                self.user.password.encode(),
+                pickle.dumps(cached, pickle.HIGHEST_PROTOCOL),
+            )
+
+            response = self.client.post("/api/auth/token/logout/")
+            self.assertEqual(response.status_code, 204)
+            # Другие воркеры читают L2 — записи там больше нет.
+            self.assertIsNone(caches["shared"].get(key))
+            response = self.client.get("/api/users/me/")
+            self.assertEqual(response.status_code, 401)
+
+    def test_password_change_with_cached_token(self):
+        """Хеш пароля не кэшируется, но смена пароля работает."""
+        self.client.get("/api/users/me/")
+        response = self.client.post(
+            "/api/users/set_password/",
+            {"current_password": "password", "new_password": "Nov0e-parol"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("Nov0e-parol"))
+
+    def test_local_cache_is_short_lived(self):
+        """Без общего кэша копия токена в процессе живёт секунды."""
+        self.client.get("/api/users/me/")
+        self.assertEqual(token_cache.stats()["entries"], 1)
+        self.assertLessEqual(token_cache.timeout, 5)
+
+
+class DataExportTestCase(APITestCase):
+    def test_archive_is_streamed_with_all_user_data(self):
+        """Архив отдаётся потоком и содержит данные и файлы."""
+        user = User.objects.create_user(
+            username="owner", password="password", email="owner@example.com"
+        )
+        author = User.objects.create_user(
+            username="author", password="password", email="author@example.com"
+        )
+        Subscription.objects.create(user=user, author=author)
+        salt = Ingredient.objects.create(name="Соль", measurement_unit="г")
+        image = bytes(range(256)) * 1000
+        with tempfile.TemporaryDirectory() as media:
+            with override_settings(MEDIA_ROOT=media):
+                name = default_storage.save(
+                    "recipes/images/export.png", ContentFile(image)
+                )
+                recipe = Recipe.objects.create(
+                    author=user,
+                    name="Мой рецепт",
+                    text="Текст",
+                    image=name,
+                    cooking_time=5,
+                )
+                recipe.ingredients.add(salt, through_defaults={"amount": 3})
+                Favorite.objects.create(user=user, recipe=recipe)
+                self.client.force_authenticate(user)
+                response = self.client.get("/api/users/me/export/")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response.streaming)
+                chunks = list(response.streaming_content)
+
+        self.assertGreater(len(chunks), 1)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        self.assertIsNone(archive.testzip())
+        profile = json.loads(archive.read("profile.json"))
+        self.assertEqual(profile["email"], "owner@example.com")
+        recipes = archive.read("recipes.jsonl").decode().splitlines()
+        self.assertEqual(
+            json.loads(recipes[0])["ingredients"], [["Соль", "г", 3]]
+        )
+        favorites = archive.read("favorites.jsonl").decode().splitlines()
+        self.assertEqual(json.loads(favorites[0])["recipe"], recipe.id)
+        self.assertEqual(archive.read("shopping_cart.jsonl"), b"")
+        subscriptions = archive.read("subscriptions.jsonl").decode()
+        self.assertEqual(json.loads(subscriptions)["username"], "author")
+        self.assertEqual(archive.read(f"media/{name}"), image)
@@ -1,9 +1,13 @@
 import logging
 import base64
 import uuid
+from functools import partial
 
+from django.conf import settings
 from django.core.files.base import ContentFile
-from django.db.models import Count
+from django.db.models import Count, Exists, F, OuterRef, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404
 from django.contrib.auth.hashers import check_password
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
@@ -14,7 +18,14 @@ from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.pagination import PageNumberPagination
 
+from config.bulk import bulk_relation
+from config.cache_backends import is_shared
+from config.pagination import CachedCountPaginator, table_generations
+from config.singleflight import get_or_compute
+from config.sparse import selected_fields
+from config.toggle import add_relation, remove_relation
 from recipes.models import Recipe
+from .export import archive_response
 from .models import User, Subscription
 from .serializers import (
     UserSerializer,
@@ -24,8 +35,105 @@ from .serializers import (
 
 logger = logging.getLogger(__name__)
 
+# Поля UserSerializer, которые читаются прямо из колонок пользователя.
+USER_COLUMNS = ("username", "first_name", "last_name", "email", "avatar")
+
+# Поля рецепта в превью автора.
+PREVIEW_FIELDS = ("id", "name", "image", "cooking_time")
+
+
+def annotate_subscribed(queryset, user):
+    if not user.is_authenticated:
+        return queryset
+    # Поле модели is_subscribed не используется, поэтому другое имя.
+    return queryset.annotate(
+        viewer_subscribed=Exists(
+            Subscription.objects.filter(user=user, author=OuterRef("pk"))
+        )
+    )
+
+
+def _preview(recipe):
+    return {
+        "id": recipe.id,
+        "name": recipe.name,
+        "image": recipe.image.url,
+        "cooking_time": recipe.cooking_time,
+    }
+
+
+def _author_recipes(author_id, recipes_limit, count=None):
+    recipes = Recipe.objects.filter(author_id=author_id).order_by("id")
+    if count is None:
+        count = recipes.count()
+    if recipes_limit is not None:
+        recipes = recipes[:recipes_limit]
+    return {
+        "count": count,
+        "recipes": [
+            _preview(recipe) for recipe in recipes.only(*PREVIEW_FIELDS)
+        ],
+    }
+
+
+def author_recipes(request, author_id, recipes_limit=None, count=None):
+    """Число рецептов автора и их превью для подписок.
+
+    Популярных авторов запрашивают многие подписчики сразу, поэтому
+    превью общее и при общем кэше хранится до любого изменения рецептов.
+    count — уже известное число рецептов (аннотация списка подписок):
+    без кэша отдельный COUNT тогда не нужен.
+    """
+    if not is_shared():
+        preview = _author_recipes(author_id, recipes_limit, count)
+    else:
+        preview = get_or_compute(
+            f"author_recipes:{author_id}:{recipes_limit}:"
+            f"{table_generations(Recipe)}",
+            partial(_author_recipes, author_id, recipes_limit, count),
+            getattr(settings, "AUTHOR_RECIPES_CACHE_TIMEOUT", 300),
+            name="author_recipes",
+        )
+    return {
+        "count": preview["count"],
+        "recipes": [
+            {**recipe, "image": request.build_absolute_uri(recipe["image"])}
+            for recipe in preview["recipes"]
+        ],
+    }
+
+
+def authors_recipes(request, authors, recipes_limit=None):
+    """Превью рецептов для страницы подписок: {id автора: [...]}.
+
+    С общим кэшем превью каждого автора берётся из author_recipes, без
+    него — одним запросом на всю страницу (первые recipes_limit рецептов
+    каждого автора по окну ROW_NUMBER).
+    """
+    if is_shared():
+        return {
+            author.pk: author_recipes(
+                request, author.pk, recipes_limit, author.recipes_count
+            )["recipes"]
+            for author in authors
+        }
+    previews = {author.pk: [] for author in authors}
+    recipes = Recipe.objects.filter(author_id__in=previews)
+    if recipes_limit is not None:
+        recipes = recipes.annotate(
+            position=Window(
+                RowNumber(), partition_by=F("author_id"), order_by="id"
+            )
+        ).filter(position__lte=recipes_limit)
+    for recipe in recipes.order_by("id").only("author", *PREVIEW_FIELDS):
+        preview = _preview(recipe)
+        preview["image"] = request.build_absolute_uri(preview["image"])
+        previews[recipe.author_id].append(preview)
+    return previews
+
 
 class CustomPagination(PageNumberPagination):
+    django_paginator_class = CachedCountPaginator
     page_size = 6
     page_size_query_param = "limit"
     max_page_size = 100
@@ -43,6 +151,19 @@ class UserViewSet(viewsets.ModelViewSet):
     def get_serializer_context(self):
         return {"request": self.request}
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ("list", "retrieve"):
+            return queryset
+        fields = selected_fields(self.request, UserSerializer.Meta.fields)
+        if fields is not None:
+            queryset = queryset.only(
+                "id", *(name for name in USER_COLUMNS if name in fields)
+            )
+        if fields is None or "is_subscribed" in fields:
+            queryset = annotate_subscribed(queryset, self.request.user)
+        return queryset
+
     @action(
         detail=False,
         methods=["get"],
@@ -56,6 +177,16 @@ class UserViewSet(viewsets.ModelViewSet):
             status=200
         )
 
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="me/export",
+        url_name="me-export",
+        permission_classes=[IsAuthenticated],
+    )
+    def export(self, request):
+        return archive_response(request._request, request.user)
+
     @action(
         detail=False,
         methods=["post"],
@@ -150,31 +281,31 @@ class UserViewSet(viewsets.ModelViewSet):
     )
     def subscribe(self, request, pk=None):
         user = request.user
-        author = self.get_object()
 
         if request.method == "DELETE":
-            subscription = Subscription.objects.filter(
-                user=user,
-                author=author
+            author, deleted = remove_relation(
+                user, Subscription, "author", pk
             )
-            if not subscription.exists():
+            if author is None:
+                raise Http404
+            if not deleted:
                 return Response(
                     {"error": "Вы не подписаны на этого пользователя."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            subscription.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        if user == author:
+        if pk.isdigit() and int(pk) == user.pk:
             return Response(
                 {"error": "Вы не можете подписаться на самого себя."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        subscription, created = Subscription.objects.get_or_create(
-            user=user,
-            author=author
+        author, created = add_relation(
+            user, Subscription, "author", pk, USER_COLUMNS
         )
+        if author is None:
+            raise Http404
         if not created:
             return Response(
                 {"error": "Вы уже подписаны на этого пользователя."},
@@ -195,28 +326,25 @@ class UserViewSet(viewsets.ModelViewSet):
             author,
             context={"request": request}
         ).data
-        author_data["recipes_count"] = Recipe.objects.filter(
-            author=author
-        ).count()
-
-        recipes_queryset = Recipe.objects.filter(author=author)
-        if recipes_limit is not None:
-            recipes_queryset = recipes_queryset[:recipes_limit]
-
-        author_data["recipes"] = [
-            {
-                "id": recipe.id,
-                "name": recipe.name,
-                "image": request.build_absolute_uri(
-                    recipe.image.url
-                ),
-                "cooking_time": recipe.cooking_time,
-            }
-            for recipe in recipes_queryset
-        ]
+        preview = author_recipes(request, author.pk, recipes_limit)
+        author_data["recipes_count"] = preview["count"]
+        author_data["recipes"] = preview["recipes"]
 
         return Response(author_data, status=status.HTTP_201_CREATED)
 
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="subscribe/bulk",
+        url_name="subscribe-bulk",
+        permission_classes=[IsAuthenticated],
+    )
+    def subscribe_bulk(self, request):
+        return bulk_relation(
+            request, Subscription, User, "author",
+            forbidden={request.user.pk},
+        )
+
     @action(detail=True, methods=["delete"])
     def unsubscribe(self, request, pk=None):
         user = request.user
@@ -233,7 +361,7 @@ class UserViewSet(viewsets.ModelViewSet):
         user = request.user
         subscriptions = User.objects.filter(
             subscribers__user=user
-        ).annotate(recipes_count=Count("recipes"))
+        ).annotate(recipes_count=Count("recipes")).order_by("id")
 
         paginator = CustomPagination()
         result_page = paginator.paginate_queryset(subscriptions, request)
@@ -249,27 +377,14 @@ class UserViewSet(viewsets.ModelViewSet):
         except ValueError:
             recipes_limit = None
 
+        previews = authors_recipes(request, result_page, recipes_limit)
         for author in result_page:
             author_data = UserSerializer(
                 author,
                 context={"request": request}
             ).data
             author_data["recipes_count"] = author.recipes_count
-            recipes_queryset = Recipe.objects.filter(author=author)
-            if recipes_limit is not None:
-                recipes_queryset = recipes_queryset[:recipes_limit]
-
-            author_data["recipes"] = [
-                {
-                    "id": recipe.id,
-                    "name": recipe.name,
-                    "image": request.build_absolute_uri(
-                        recipe.image.url
-                    ),
-                    "cooking_time": recipe.cooking_time,
-                }
-                for recipe in recipes_queryset
-            ]
+            author_data["recipes"] = previews[author.pk]
             response_data.append(author_data)
 
         return paginator.get_paginated_response(response_data)